@@ -1,7 +1,12 @@
 """Product aggregator - combines results from multiple providers"""
 
-from typing import List
+from collections import defaultdict, deque
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 import asyncio
+import time
+import httpx
+import numpy as np
 from loguru import logger
 
 from app.domain.entities.product import Product as ProductEntity
@@ -9,17 +14,119 @@ from app.domain.entities.garment import GarmentPrediction
 from app.infrastructure.external_apis.product_provider import ProductProvider
 from app.infrastructure.external_apis.amazon import AmazonProvider
 from app.infrastructure.external_apis.zalando import ZalandoProvider
+from app.infrastructure.external_apis.resilience import ResilientProvider, ProviderUnavailableError
+from app.infrastructure.external_apis.catalog_sync import CatalogMirror, SOURCE_MIRROR
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.database.product_repository import fetch_by_ids, fetch_by_external_ids
+from app.infrastructure.cache.provider_cache import ProviderSearchCache, CACHE_MISS
+from app.core.singleflight import SingleFlight
+from app.core.dataloader import DataLoader
+from app.domain.services.deduplication import ProductDeduplicator
+from app.domain.services.ranking import RelevanceRanker
+from app.core.config import settings
+
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"  # circuit open or concurrency limit reached, nothing cached
+
+
+@dataclass
+class ProviderOutcome:
+    """How one provider did within a fan-out"""
+    provider: str
+    status: str
+    latency_ms: float
+    products: int = 0
+    hedged: bool = False
+    cache: Optional[str] = None  # mirror, or fresh / stale / miss / fallback from the provider cache
+    error: Optional[str] = None
+
+
+@dataclass
+class AggregatedSearch:
+    """Merged products plus which providers made it into them"""
+    products: List[ProductEntity]
+    providers: List[ProviderOutcome] = field(default_factory=list)
+
+    @property
+    def partial(self) -> bool:
+        return any(outcome.status != STATUS_OK for outcome in self.providers)
+
+    def report(self) -> Dict[str, Any]:
+        return {"partial": self.partial, "providers": [asdict(outcome) for outcome in self.providers]}
+
+
+class ProviderLatency:
+    """Rolling latency window and counters for one provider"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.counters = {"calls": 0, "timeouts": 0, "errors": 0, "skipped": 0, "hedges": 0, "hedge_wins": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data"""
+        if not settings.PROVIDER_HEDGE_ENABLED or len(self.samples) < settings.PROVIDER_HEDGE_MIN_SAMPLES:
+            return None
+        return max(float(np.percentile(self.samples, 95)), settings.PROVIDER_HEDGE_MIN_DELAY_MS / 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = np.percentile(self.samples, [50, 95]) if self.samples else (0.0, 0.0)
+        return {**self.counters, "p50_ms": round(float(p50) * 1000, 1), "p95_ms": round(float(p95) * 1000, 1)}
 
 
 class ProductAggregator:
     """Aggregates products from multiple e-commerce providers"""
     
-    def __init__(self):
-        """Initialize aggregator with providers"""
-        self.providers: List[ProductProvider] = [
-            AmazonProvider(),
-            ZalandoProvider(),
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ProviderSearchCache] = None,
+        providers: Optional[List[ProductProvider]] = None,
+        mirror: Optional[CatalogMirror] = None,
+        session_factory=AsyncSessionLocal,
+    ):
+        """
+        Initialize aggregator with providers
+
+        Args:
+            http_client: Shared pooled client injected into every provider
+            cache: Per-provider search cache (stale-while-revalidate)
+            providers: Providers to search instead of the built-in ones (e.g.
+                FakeProvider in tests)
+            mirror: Local catalog mirror searched before going to the providers
+            session_factory: Async session factory for product lookups
+        """
+        self.cache = cache
+        self.mirror = mirror
+        self.session_factory = session_factory
+        self.providers: List[ProductProvider] = providers or [
+            AmazonProvider(http_client),
+            ZalandoProvider(http_client),
         ]
+        if settings.PROVIDER_RESILIENCE_ENABLED:
+            # Breaker + adaptive limit per provider; skipped calls fall back to the cache
+            self.providers = [
+                p if isinstance(p, ResilientProvider) else ResilientProvider(p) for p in self.providers
+            ]
+        self._latency: Dict[str, ProviderLatency] = {
+            provider.name: ProviderLatency(settings.PROVIDER_LATENCY_WINDOW) for provider in self.providers
+        }
+        self.deduplicator = ProductDeduplicator()
+        self.ranker = RelevanceRanker()
+        # Resolves product ids to image embeddings for ranking (set once an index is loaded)
+        self.embedding_lookup: Optional[Callable[[List[str]], Dict[str, np.ndarray]]] = None
+        # Identical concurrent searches (same normalized query) share one fan-out
+        self.flight: SingleFlight[AggregatedSearch] = SingleFlight("provider_search")
+        # Lookups by id from concurrent requests share one query per tick
+        self.product_loader: DataLoader[str, ProductEntity] = DataLoader(
+            self._load_products,
+            "products",
+            max_batch_size=settings.PRODUCT_LOOKUP_MAX_BATCH,
+            cache_ttl_s=settings.PRODUCT_LOOKUP_TTL_S,
+            cache_size=settings.PRODUCT_LOOKUP_CACHE_SIZE,
+        )
         logger.info(f"Initialized ProductAggregator with {len(self.providers)} providers")
     
     async def search_products(
@@ -37,45 +144,294 @@ class ProductAggregator:
         Returns:
             Aggregated and deduplicated list of products
         """
+        return (await self.search(prediction, limit)).products
+    
+    async def search(
+        self,
+        prediction: GarmentPrediction,
+        limit: int = 20,
+        budget_s: Optional[float] = None,
+        on_provider: Optional[Callable[[ProviderOutcome, List[ProductEntity]], None]] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> AggregatedSearch:
+        """
+        Search all providers within a latency budget
+        
+        Providers that have not answered by the deadline are cancelled and
+        the response is built from the ones that did. A provider running past
+        its own p95 gets a duplicate (hedged) request; the first to answer wins.
+        
+        Args:
+            prediction: Garment prediction
+            limit: Max total results
+            budget_s: Deadline in seconds (defaults to PROVIDER_BUDGET_MS)
+            on_provider: Called with each provider's outcome and raw products as
+                soon as it answers or times out (for streaming responses)
+            query_embedding: Embedding of the photo, used for relevance ranking
+            
+        Returns:
+            Products plus a per-provider report (included, timed out, failed)
+        """
+        budget_s = settings.PROVIDER_BUDGET_MS / 1000 if budget_s is None else budget_s
+        if on_provider is not None:
+            # Per-caller callbacks cannot be shared, so streaming callers don't coalesce
+            candidates = await self._search(prediction, limit, budget_s, on_provider)
+        else:
+            candidates = await self.flight.do(
+                (self.query_key(prediction, limit), budget_s),
+                lambda: self._search(prediction, limit, budget_s),
+            )
+        # Ranking depends on the caller's photo, so it runs after the shared fan-out
+        return AggregatedSearch(
+            products=self.rank(candidates.products, prediction, limit, query_embedding),
+            providers=candidates.providers,
+        )
+    
+    async def get_products(self, product_ids: List[str]) -> Dict[str, ProductEntity]:
+        """
+        Products by id, batched across concurrent callers
+        
+        Served from the TTL cache, then the products table; "provider:external_id"
+        ids not in the table are asked from the provider (one batch per provider).
+        
+        Args:
+            product_ids: products-table ids or "provider:external_id"
+            
+        Returns:
+            Found products by id
+        """
+        return await self.product_loader.load_many(str(product_id) for product_id in product_ids)
+    
+    def rank(
+        self,
+        products: List[ProductEntity],
+        prediction: GarmentPrediction,
+        limit: int,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[ProductEntity]:
+        """
+        Top products by relevance to the photo
+        
+        Args:
+            products: Candidates
+            prediction: Garment prediction
+            limit: Max results
+            query_embedding: Embedding of the photo, compared with the
+                embeddings embedding_lookup knows for the candidates
+            
+        Returns:
+            Up to limit products, best first
+        """
+        product_embeddings = None
+        if query_embedding is not None and self.embedding_lookup is not None:
+            product_embeddings = self.embedding_lookup([str(p.id) for p in products])
+        return self.ranker.rank(products, prediction, limit, query_embedding, product_embeddings)
+    
+    async def _search(
+        self,
+        prediction: GarmentPrediction,
+        limit: int,
+        budget_s: float,
+        on_provider: Optional[Callable[[ProviderOutcome, List[ProductEntity]], None]] = None,
+    ) -> AggregatedSearch:
+        started = time.monotonic()
+        
         # Search all providers in parallel
-        tasks = [
-            provider.search_products(prediction, limit=limit) 
+        tasks = {
+            asyncio.create_task(self._fetch(provider, prediction, limit, started + budget_s)): provider
             for provider in self.providers
-        ]
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        }
         
-        # Flatten results and handle errors
+        # Handle each provider as it answers, until the deadline
         all_products = []
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Error from provider: {result}")
-                continue
-            all_products.extend(result)
+        outcomes = []
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = started + budget_s - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outcome, products = self._outcome(tasks[task], task, time.monotonic() - started)
+                    outcomes.append(outcome)
+                    all_products.extend(products)
+                    if on_provider is not None:
+                        on_provider(outcome, products)
+        finally:
+            for task in pending:
+                task.cancel()
         
-        # Deduplicate (simple approach - by name similarity)
-        deduplicated = self._deduplicate_products(all_products)
+        for task in pending:
+            provider = tasks[task]
+            latency = self._latency[provider.name]
+            latency.counters["calls"] += 1
+            latency.counters["timeouts"] += 1
+            # Count the budget as a (censored) sample so p95 reflects slowness
+            latency.samples.append(budget_s)
+            outcome = ProviderOutcome(provider.name, STATUS_TIMEOUT, round((time.monotonic() - started) * 1000, 1))
+            outcomes.append(outcome)
+            logger.warning(f"Provider {provider.name} missed the {budget_s * 1000:.0f}ms budget")
+            if on_provider is not None:
+                on_provider(outcome, [])
+        order = {provider.name: i for i, provider in enumerate(self.providers)}
+        outcomes.sort(key=lambda outcome: order[outcome.provider])
         
-        # Sort by relevance (for MVP: by price or random)
-        sorted_products = sorted(deduplicated, key=lambda p: p.price or 999999)
+        # Merge the same item listed by several providers; ranking happens per caller
+        embeddings = None
+        if self.embedding_lookup is not None and all_products:
+            embeddings = self.embedding_lookup([str(p.id) for p in all_products])
+        deduplicated = self._deduplicate_products(all_products, embeddings)
+        return AggregatedSearch(products=deduplicated, providers=outcomes)
+    
+    def _outcome(
+        self,
+        provider: ProductProvider,
+        task: asyncio.Task,
+        elapsed_s: float,
+    ) -> Tuple[ProviderOutcome, List[ProductEntity]]:
+        """Outcome and products of a finished provider task"""
+        latency = self._latency[provider.name]
+        latency.counters["calls"] += 1
+        if isinstance(task.exception(), ProviderUnavailableError):
+            latency.counters["skipped"] += 1
+            return ProviderOutcome(
+                provider.name, STATUS_SKIPPED, round(elapsed_s * 1000, 1), error=str(task.exception())
+            ), []
+        if task.exception() is not None:
+            latency.counters["errors"] += 1
+            logger.error(f"Error from provider {provider.name}: {task.exception()}")
+            return ProviderOutcome(
+                provider.name, STATUS_ERROR, round(elapsed_s * 1000, 1), error=str(task.exception())
+            ), []
+        products, seconds, hedged, cache_status = task.result()
+        # Cache hits say nothing about the provider's own latency
+        if cache_status in (None, CACHE_MISS):
+            latency.samples.append(seconds)
+        return ProviderOutcome(
+            provider.name, STATUS_OK, round(seconds * 1000, 1), len(products), hedged, cache_status
+        ), products
+    
+    async def _fetch(
+        self,
+        provider: ProductProvider,
+        prediction: GarmentPrediction,
+        limit: int,
+        deadline: float,
+    ) -> Tuple[List[ProductEntity], float, bool, Optional[str]]:
+        """Provider results from the mirror, else through the cache; misses make a (hedged) live call"""
+        if self.mirror is not None:
+            started = time.monotonic()
+            products = await self.mirror.search(provider.name, prediction, limit)
+            if products:
+                return products, time.monotonic() - started, False, SOURCE_MIRROR
+
+        if self.cache is None:
+            return (*await self._call(provider, prediction, limit, deadline), None)
+
+        started = time.monotonic()
+        hedged = False
+
+        async def fetch() -> List[ProductEntity]:
+            nonlocal hedged
+            products, _, hedged = await self._call(provider, prediction, limit, deadline)
+            return products
+
+        key = self.cache.key_for(provider.name, self.query_key(prediction, limit))
+        products, status = await self.cache.get_or_fetch(
+            key, fetch, refresh=lambda: provider.search_products(prediction, limit=limit)
+        )
+        return products, time.monotonic() - started, hedged, status
+    
+    async def _call(
+        self,
+        provider: ProductProvider,
+        prediction: GarmentPrediction,
+        limit: int,
+        deadline: float,
+    ) -> Tuple[List[ProductEntity], float, bool]:
+        """One provider call, hedged once it runs past the provider's p95"""
+        latency = self._latency[provider.name]
+        started = time.monotonic()
+        attempts = [asyncio.create_task(provider.search_products(prediction, limit=limit))]
+        try:
+            delay = latency.hedge_delay()
+            if delay is not None and started + delay < deadline:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done:
+                    latency.counters["hedges"] += 1
+                    attempts.append(asyncio.create_task(provider.search_products(prediction, limit=limit)))
+            
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A failed attempt only loses if the other one also fails
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    if task.exception() is None or not pending:
+                        if task is not attempts[0]:
+                            latency.counters["hedge_wins"] += 1
+                        return task.result(), time.monotonic() - started, len(attempts) > 1
+        finally:
+            for task in attempts:
+                task.cancel()
+    
+    async def _load_products(self, keys: List[str]) -> Dict[str, ProductEntity]:
+        """One DataLoader batch: one table query, then per-provider lookups for the rest"""
+        found = await fetch_by_ids(self.session_factory, keys)
+        by_provider: Dict[str, List[str]] = defaultdict(list)
+        for key in keys:
+            if key not in found and ":" in key:
+                provider_name, external_id = key.split(":", 1)
+                by_provider[provider_name].append(external_id)
+        providers = {provider.name: provider for provider in self.providers}
         
-        # Return top N
-        return sorted_products[:limit]
+        async def lookup(provider_name: str, external_ids: List[str]) -> Dict[str, ProductEntity]:
+            products = await fetch_by_external_ids(self.session_factory, provider_name, external_ids)
+            missing = [external_id for external_id in external_ids if external_id not in products]
+            if missing and provider_name in providers:
+                products.update(await providers[provider_name].get_products(missing))
+            return {f"{provider_name}:{external_id}": p for external_id, p in products.items()}
+        
+        for products in await asyncio.gather(*(lookup(name, ids) for name, ids in by_provider.items())):
+            found.update(products)
+        return found
     
-    def _deduplicate_products(self, products: List[ProductEntity]) -> List[ProductEntity]:
-        """
-        Deduplicate products (simple approach for MVP)
-        In production, use more sophisticated similarity matching
+    def stats(self) -> Dict[str, Any]:
+        """Per-provider latency percentiles, fan-out counters, breaker state and limits"""
+        resilience = {p.name: p.stats() for p in self.providers if isinstance(p, ResilientProvider)}
+        return {
+            **{
+                name: {**latency.stats(), **resilience.get(name, {})}
+                for name, latency in self._latency.items()
+            },
+            "singleflight": self.flight.stats(),
+            "product_lookup": self.product_loader.stats(),
+        }
+    
+    @staticmethod
+    def query_key(prediction: GarmentPrediction, limit: int) -> Tuple:
+        """Normalized key of the provider query a prediction turns into"""
+        def norm(value):
+            return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+        return (
+            prediction.category.value,
+            norm(prediction.color),
+            norm(prediction.pattern),
+            norm(prediction.style),
+            limit,
+        )
+    
+    def _deduplicate_products(
+        self,
+        products: List[ProductEntity],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[ProductEntity]:
         """
-        seen = set()
-        unique = []
+        Merge near-duplicate listings across providers
         
-        for product in products:
-            # Simple dedup by name + provider
-            key = (product.name.lower(), product.provider)
-            if key not in seen:
-                seen.add(key)
-                unique.append(product)
-        
-        return unique
+        Similar titles (MinHash/LSH) or, when given, near-identical image
+        embeddings put products in one cluster; the cheapest offer is kept.
+        """
+        return self.deduplicator.deduplicate(products, embeddings)
 
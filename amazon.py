@@ -1,6 +1,7 @@
 """Amazon Product Advertising API integration"""
 
-from typing import List
+from typing import List, Optional
+import httpx
 from loguru import logger
 
 from app.domain.entities.product import Product as ProductEntity
@@ -13,8 +14,11 @@ import uuid
 class AmazonProvider(ProductProvider):
     """Amazon Product Advertising API provider"""
     
-    def __init__(self):
+    name = "amazon"
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         """Initialize Amazon provider"""
+        super().__init__(http_client)
         self.access_key = settings.AMAZON_ACCESS_KEY
         self.secret_key = settings.AMAZON_SECRET_KEY
         self.associate_tag = settings.AMAZON_ASSOCIATE_TAG
@@ -24,7 +28,7 @@ class AmazonProvider(ProductProvider):
             self._mock_mode = True
         else:
             self._mock_mode = False
-            # TODO: Initialize boto3 or PA-API client
+            # PA-API requests go through the shared self.http_client
     
     async def search_products(
         self, 
@@ -76,6 +80,7 @@ class AmazonProvider(ProductProvider):
                 affiliate_link=f"https://amazon.com/mock-product-{i+1}?tag={self.associate_tag}",
                 category=prediction.category.value,
                 attributes={
+                    "external_id": f"mock-{prediction.category.value}-{i+1}",
                     "color": prediction.color,
                     "pattern": prediction.pattern,
                     "style": prediction.style
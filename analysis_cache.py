@@ -0,0 +1,181 @@
+"""
+Content-addressed cache for complete analysis results
+Keyed by a hash of the uploaded image so re-uploads skip CLIP and the provider fan-out
+"""
+
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from app.domain.entities.garment import GarmentPrediction
+from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.cache.redis_client import get_redis
+from app.core.config import settings
+
+
+KEY_MODE_SHA256 = "sha256"
+KEY_MODE_PHASH = "phash"
+
+
+@dataclass
+class CachedAnalysis:
+    """Cached result of analyzing one image"""
+    embedding: np.ndarray
+    prediction: GarmentPrediction
+    products: List[ProductEntity]
+
+
+def content_hash(contents: bytes) -> str:
+    """Exact content hash of the uploaded bytes"""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def perceptual_hash(image: Union[Image.Image, np.ndarray], hash_size: int = 8) -> str:
+    """
+    Difference hash (dHash) of an image
+
+    Stable across re-encoding, resizing and metadata changes, so shared or
+    re-compressed copies of the same photo map to the same key.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+class AnalysisCache:
+    """Two-tier (in-process LRU + Redis) cache of analysis results"""
+
+    def __init__(
+        self,
+        key_mode: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+        redis_client: Any = None,
+        use_redis: bool = True,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            key_mode: "sha256" (exact bytes) or "phash" (perceptual)
+            max_entries: Max entries kept in the in-process tier
+            ttl: Entry lifetime in seconds for both tiers
+            redis_client: Optional Redis client (defaults to the shared one)
+            use_redis: Disable to run with the in-process tier only
+        """
+        self.key_mode = key_mode or settings.ANALYSIS_CACHE_KEY_MODE
+        if self.key_mode not in (KEY_MODE_SHA256, KEY_MODE_PHASH):
+            raise ValueError(f"Unknown analysis cache key mode: {self.key_mode}")
+        self.max_entries = settings.ANALYSIS_CACHE_L1_SIZE if max_entries is None else max_entries
+        self.ttl = settings.REDIS_CACHE_TTL if ttl is None else ttl
+        self._redis = redis_client
+        self._use_redis = use_redis
+
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters = {"l1_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0, "sets": 0}
+
+    @property
+    def needs_image(self) -> bool:
+        """Whether the key can only be computed from the decoded image"""
+        return self.key_mode == KEY_MODE_PHASH
+
+    def key_for(self, contents: bytes, image: Union[Image.Image, np.ndarray, None] = None) -> str:
+        """Build the cache key for an upload"""
+        if self.key_mode == KEY_MODE_PHASH:
+            if image is None:
+                raise ValueError("Perceptual cache keys need the decoded image")
+            return f"analysis:phash:{perceptual_hash(image)}"
+        return f"analysis:sha256:{content_hash(contents)}"
+
+    async def get(self, key: str) -> Optional[CachedAnalysis]:
+        """Look up a cached analysis"""
+        entry = self._local.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self._counters["l1_hits"] += 1
+                return value
+            del self._local[key]
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                payload = await redis.get(key)
+                value = self._deserialize(payload) if payload is not None else None
+            except Exception as e:
+                self._counters["redis_errors"] += 1
+                logger.warning(f"Analysis cache read failed: {e}")
+                value = None
+            if value is not None:
+                self._store_local(key, value)
+                self._counters["redis_hits"] += 1
+                return value
+
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: CachedAnalysis):
+        """Store an analysis in both tiers"""
+        self._store_local(key, value)
+        self._counters["sets"] += 1
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, self._serialize(value), ex=self.ttl)
+            except Exception as e:
+                self._counters["redis_errors"] += 1
+                logger.warning(f"Analysis cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        hits = self._counters["l1_hits"] + self._counters["redis_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "l1_entries": len(self._local),
+            "key_mode": self.key_mode,
+        }
+
+    def _get_redis(self):
+        if not self._use_redis:
+            return None
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def _store_local(self, key: str, value: CachedAnalysis):
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    @staticmethod
+    def _serialize(value: CachedAnalysis) -> bytes:
+        embedding = np.asarray(value.embedding, dtype=np.float32)
+        return json.dumps({
+            "embedding": base64.b64encode(embedding.tobytes()).decode("ascii"),
+            "prediction": value.prediction.model_dump(mode="json"),
+            "products": [p.model_dump(mode="json") for p in value.products],
+        }).encode("utf-8")
+
+    @staticmethod
+    def _deserialize(payload: bytes) -> CachedAnalysis:
+        data = json.loads(payload)
+        return CachedAnalysis(
+            embedding=np.frombuffer(base64.b64decode(data["embedding"]), dtype=np.float32),
+            prediction=GarmentPrediction.model_validate(data["prediction"]),
+            products=[ProductEntity.model_validate(p) for p in data["products"]],
+        )
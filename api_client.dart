@@ -1,3 +1,4 @@
+import 'dart:convert';
 import 'dart:io';
 import 'package:dio/dio.dart';
 import '../../core/config/app_config.dart';
@@ -37,5 +38,51 @@ class ApiClient {
       throw Exception('Error analyzing image: $e');
     }
   }
+
+  /// Streams the analysis as it progresses.
+  ///
+  /// Each event is `{'event': ..., 'data': ...}`, in the order `prediction`,
+  /// one `provider` per marketplace, `products`, `outfits`, `done`. An `error`
+  /// event ends the stream early.
+  Stream<Map<String, dynamic>> analyzeImageStream(File imageFile) async* {
+    final formData = FormData.fromMap({
+      'file': await MultipartFile.fromFile(
+        imageFile.path,
+        filename: imageFile.path.split('/').last,
+      ),
+    });
+
+    final Response<ResponseBody> response;
+    try {
+      response = await _dio.post<ResponseBody>(
+        _config.recognizeStreamEndpoint,
+        data: formData,
+        options: Options(
+          contentType: 'multipart/form-data',
+          responseType: ResponseType.stream,
+          headers: {'Accept': 'application/x-ndjson'},
+          receiveTimeout: const Duration(seconds: 60),
+        ),
+      );
+    } on DioException catch (e) {
+      throw Exception('Network error: ${e.message}');
+    }
+
+    // One JSON object per line (NDJSON)
+    final lines = response.data!.stream
+        .cast<List<int>>()
+        .transform(utf8.decoder)
+        .transform(const LineSplitter());
+
+    await for (final line in lines) {
+      if (line.trim().isEmpty) continue;
+      final event = jsonDecode(line) as Map<String, dynamic>;
+      yield event;
+      if (event['event'] == 'error') {
+        throw Exception('Error analyzing image: ${event['data']['detail']}');
+      }
+      if (event['event'] == 'done') return;
+    }
+  }
 }
 
@@ -10,6 +10,7 @@ class AppConfig {
   
   // API Endpoints
   String get recognizeEndpoint => '$apiBaseUrl/api/v1/complete/analyze';
+  String get recognizeStreamEndpoint => '$apiBaseUrl/api/v1/complete/analyze/stream';
   String get productsEndpoint => '$apiBaseUrl/api/v1/products/search';
   String get outfitsEndpoint => '$apiBaseUrl/api/v1/outfits/generate';
   
@@ -0,0 +1,37 @@
+"""Add products.embedding with an HNSW cosine index
+
+Revision ID: b7e2c4d19a3f
+Revises:
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e2c4d19a3f"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding vector(512)")
+
+    # Built concurrently so the catalog stays writable; this cannot run in a transaction.
+    # For very large catalogs where build time matters more than recall, an IVFFlat index
+    # (USING ivfflat (embedding vector_cosine_ops) WITH (lists = ...)) is the alternative;
+    # VectorSearchService sets ivfflat.probes per query for it.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_embedding_hnsw "
+            "ON products USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_embedding_hnsw")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS embedding")
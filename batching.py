@@ -0,0 +1,195 @@
+"""
+Dynamic micro-batching for model inference
+Collects concurrent requests into batches and runs one forward pass per batch
+"""
+
+import asyncio
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+class InferenceBatcher:
+    """Groups concurrent inference calls into batched forward passes"""
+
+    def __init__(
+        self,
+        infer_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+    ):
+        """
+        Initialize the batcher
+
+        Args:
+            infer_fn: Blocking function mapping a list of inputs to a list of
+                outputs of the same length. Runs in a worker thread.
+            max_batch_size: Max number of items per forward pass
+            max_wait_ms: Max time to wait for a batch to fill up after the
+                first item arrives
+            max_concurrent_batches: Number of batches allowed in flight at once
+        """
+        self._infer_fn = infer_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: set = set()
+
+        # Stats
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+        self._batch_sizes: Counter = Counter()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Submit one item and wait for its result
+
+        Args:
+            item: Model input
+
+        Returns:
+            The output for this item
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """
+        Submit several items at once and wait for all results
+
+        Items are queued together, so they are batched with each other
+        (and with concurrent callers) up to max_batch_size.
+        """
+        if not items:
+            return []
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future))
+            futures.append(future)
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return list(await asyncio.gather(*futures))
+
+    async def close(self):
+        """Stop the background worker and fail pending requests"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        if self._queue is not None:
+            self._fail_pending([])
+            self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch size statistics for tuning"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self._max_queue_depth,
+            "batches_in_flight": len(self._in_flight),
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+    def _ensure_started(self):
+        """Lazily start the worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Worker loop: collect a batch, dispatch it, repeat"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait_ms / 1000
+
+                while len(batch) < self.max_batch_size:
+                    # Drain whatever is already queued without waiting
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Drop callers that went away while waiting
+                batch = [(item, future) for item, future in batch if not future.done()]
+                if not batch:
+                    continue
+
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                # Collected but not dispatched yet: nobody else would resolve these
+                self._fail_pending(batch)
+                raise
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    def _fail_pending(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Fail a collected batch and everything still queued"""
+        pending = list(batch)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher closed"))
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run one batched forward pass off the event loop"""
+        try:
+            items = [item for item, _ in batch]
+            self._batches += 1
+            self._items += len(items)
+            self._batch_sizes[len(items)] += 1
+
+            try:
+                results = await asyncio.to_thread(self._infer_fn, items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"Inference returned {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Batched inference failed for {len(items)} items: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,130 @@
+"""
+Benchmark pgvector similarity search
+
+Usage:
+    python -m app.scripts.benchmark_vector_search [--queries 200] [--k 10] [--ef-search 20 40 80 160]
+    python -m app.scripts.benchmark_vector_search --store-report [--sample 100000]
+
+Compares index-backed search at several ef_search (or --probes) values
+against an exact scan and reports latency percentiles and recall@k.
+With --store-report, compares compact embedding store codecs (float16, PQ)
+against float32 instead: memory saved and recall@k lost.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import select, func
+
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.database.models.product import Product
+from app.infrastructure.ml.embedding_store import compare_codecs
+from app.services.vector_search import VectorSearchService
+
+
+async def sample_queries(count: int, noise: float, seed: int) -> List[List[float]]:
+    """Perturbed embeddings of random catalog products, so queries look realistic"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Product.embedding)
+            .where(Product.embedding.isnot(None))
+            .order_by(func.random())
+            .limit(count)
+        )
+        embeddings = np.array([np.asarray(e, dtype=np.float32) for e in result.scalars()])
+
+    rng = np.random.default_rng(seed)
+    queries = embeddings + noise * rng.standard_normal(embeddings.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.tolist()
+
+
+async def run(
+    service: VectorSearchService,
+    queries: List[List[float]],
+    k: int,
+    category: Optional[str],
+    **params,
+) -> Dict[str, object]:
+    latencies, ids = [], []
+    for query in queries:
+        started = time.perf_counter()
+        products = await service.find_similar_products(query, limit=k, category=category, **params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ids.append([p.id for p in products])
+    return {"latencies": np.array(latencies), "ids": ids}
+
+
+async def store_report(sample: int, queries: List[List[float]], k: int):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Product.id, Product.embedding)
+            .where(Product.embedding.isnot(None))
+            .order_by(func.random())
+            .limit(sample)
+        )
+        rows = result.all()
+    ids = [str(r.id) for r in rows]
+    embeddings = np.array([np.asarray(r.embedding, dtype=np.float32) for r in rows])
+    reports = await asyncio.to_thread(compare_codecs, ids, embeddings, np.array(queries, dtype=np.float32), k)
+
+    print(f"{len(ids)} embeddings, {len(queries)} queries, k={k}")
+    print(f"{'codec':<10} {'MB':>9} {'fp32 MB':>9} {'ratio':>7} {'recall':>8} {'score err':>10}")
+    for r in reports:
+        recall_at_k = r[f"recall@{r['k']}"]
+        print(
+            f"{r['codec']:<10} {r['bytes'] / 2**20:9.1f} {r['float32_bytes'] / 2**20:9.1f} "
+            f"{r['compression']:7.2f} {recall_at_k:8.4f} {r['mean_abs_score_error']:10.6f}"
+        )
+
+
+def recall(results: List[list], truth: List[list], k: int) -> float:
+    hits = sum(len(set(r[:k]) & set(t[:k])) for r, t in zip(results, truth))
+    total = sum(min(k, len(t)) for t in truth)
+    return hits / total if total else 0.0
+
+
+def row(label: str, latencies: np.ndarray, recall_at_k: Optional[float]) -> str:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    recall_text = f"{recall_at_k:8.4f}" if recall_at_k is not None else "   exact"
+    return f"{label:<16} {p50:9.2f} {p95:9.2f} {p99:9.2f} {recall_text}"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark pgvector search latency and recall")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[20, 40, 80, 160])
+    parser.add_argument("--probes", type=int, nargs="*", default=[], help="IVFFlat probes to try instead")
+    parser.add_argument("--category", help="Benchmark with a category pre-filter")
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-report", action="store_true", help="Compare compact store codecs to float32")
+    parser.add_argument("--sample", type=int, default=100_000, help="Embeddings used for --store-report")
+    args = parser.parse_args()
+
+    service = VectorSearchService()
+    queries = await sample_queries(args.queries, args.noise, args.seed)
+    if not queries:
+        print("No embedded products found")
+        return
+
+    if args.store_report:
+        await store_report(args.sample, queries, args.k)
+        return
+
+    exact = await run(service, queries, args.k, args.category, exact=True)
+    print(f"{len(queries)} queries, k={args.k}, category={args.category or 'any'}")
+    print(f"{'mode':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'recall':>8}")
+    print(row("exact", exact["latencies"], None))
+
+    variants = [("probes", p) for p in args.probes] or [("ef_search", ef) for ef in args.ef_search]
+    for name, value in variants:
+        result = await run(service, queries, args.k, args.category, **{name: value})
+        print(row(f"{name}={value}", result["latencies"], recall(result["ids"], exact["ids"], args.k)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
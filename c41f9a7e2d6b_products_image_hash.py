@@ -0,0 +1,24 @@
+"""Add products.image_hash for incremental embedding ingestion
+
+Revision ID: c41f9a7e2d6b
+Revises: b7e2c4d19a3f
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c41f9a7e2d6b"
+down_revision = "b7e2c4d19a3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("products", sa.Column("image_hash", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("products", "image_hash")
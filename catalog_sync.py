@@ -0,0 +1,356 @@
+"""
+Local catalog mirror
+
+CatalogSync crawls every provider by category in the background and upserts
+the results into the products table in bulk. Rows whose content hash did not
+change are left untouched, so their embeddings and updated_at survive.
+CatalogMirror serves provider searches from that table while the last sync of
+a provider/category is recent enough. ProductAggregator only calls providers
+live when the mirror is stale or has nothing.
+
+Runs as its own job rather than inside every API process (CATALOG_SYNC_ENABLED
+is off by default):
+
+Usage:
+    python -m app.infrastructure.external_apis.catalog_sync [--provider amazon] [--category shirt]
+    python -m app.infrastructure.external_apis.catalog_sync --loop
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import case, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.entities.garment import GarmentPrediction, GarmentCategory
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.database.models.product import Product, CatalogSyncState
+from app.infrastructure.database.product_repository import ENTITY_COLUMNS, to_entity
+from app.infrastructure.external_apis.product_provider import ProductProvider
+from app.infrastructure.external_apis.amazon import AmazonProvider
+from app.infrastructure.external_apis.zalando import ZalandoProvider
+from app.core.config import settings
+
+
+# Catalog fields covered by the content hash (and rewritten when it changes)
+SYNCED_COLUMNS = (
+    "name", "description", "price", "currency", "image_url", "product_url",
+    "affiliate_link", "category", "attributes",
+)
+
+# Arbitrary key for pg_try_advisory_lock so only one process crawls at a time
+_SYNC_LOCK_KEY = 0x4C4F4F51
+
+# ProviderOutcome.cache value for results served from the mirror
+SOURCE_MIRROR = "mirror"
+
+
+def external_id_for(product: ProductEntity) -> Optional[str]:
+    """
+    Stable provider-side id (providers mint a fresh entity id on every call)
+
+    Providers put it in attributes["external_id"]. There is no fallback: a URL
+    is not an identity (it can change, and mock URLs repeat across categories).
+    """
+    external_id = (product.attributes or {}).get("external_id")
+    return str(external_id) if external_id else None
+
+
+def content_hash(row: Dict[str, Any]) -> str:
+    """sha256 over the synced columns of a row"""
+    payload = json.dumps({c: row.get(c) for c in SYNCED_COLUMNS}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _row(product: ProductEntity) -> Dict[str, Any]:
+    row = {
+        c: v for c, v in product.model_dump(mode="json").items() if c in SYNCED_COLUMNS
+    }
+    row["provider"] = product.provider
+    row["external_id"] = external_id_for(product)
+    row["content_hash"] = content_hash(row)
+    return row
+
+
+class CatalogSync:
+    """Crawls provider catalogs by category into the products table"""
+
+    def __init__(
+        self,
+        providers: Optional[List[ProductProvider]] = None,
+        http_client=None,
+        session_factory=AsyncSessionLocal,
+        categories: Optional[List[str]] = None,
+        page_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        """
+        Initialize the sync
+
+        Args:
+            providers: Providers to crawl (defaults to Amazon and Zalando on http_client)
+            http_client: Shared pooled client for the default providers
+            session_factory: Async session factory
+            categories: Category values to crawl (defaults to CATALOG_SYNC_CATEGORIES,
+                or every GarmentCategory when that is empty)
+            page_size: Products requested per provider and category
+            concurrency: Crawls running at once
+        """
+        self.providers = providers or [AmazonProvider(http_client), ZalandoProvider(http_client)]
+        self.session_factory = session_factory
+        self.categories = categories or settings.CATALOG_SYNC_CATEGORIES or [c.value for c in GarmentCategory]
+        self.page_size = settings.CATALOG_SYNC_PAGE_SIZE if page_size is None else page_size
+        self.concurrency = settings.CATALOG_SYNC_CONCURRENCY if concurrency is None else concurrency
+        self._counters = {"runs": 0, "skipped_runs": 0, "crawls": 0, "crawl_errors": 0,
+                          "seen": 0, "inserted": 0, "updated": 0, "unchanged": 0, "skipped_no_id": 0}
+        self._last_run: Optional[Dict[str, Any]] = None
+
+    async def run(self, interval_s: Optional[float] = None):
+        """Sync forever, every interval_s (defaults to CATALOG_SYNC_INTERVAL_S)"""
+        interval_s = settings.CATALOG_SYNC_INTERVAL_S if interval_s is None else interval_s
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.error(f"Catalog sync failed: {e}")
+            await asyncio.sleep(interval_s)
+
+    async def sync_once(self) -> Dict[str, Any]:
+        """
+        Crawl every provider/category once
+
+        Returns:
+            Summary of the run (also kept for stats())
+        """
+        async with self.session_factory() as lock_session:
+            # Several processes may run the loop; one crawl per interval is enough.
+            # The session-level lock is held by the connection, which stays in
+            # autocommit so no transaction is left open for the whole crawl.
+            lock_conn = await lock_session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _SYNC_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                self._counters["skipped_runs"] += 1
+                logger.info("Catalog sync already running elsewhere, skipping")
+                return {"skipped": True}
+            try:
+                return await self._sync()
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _SYNC_LOCK_KEY})
+
+    async def sync_category(self, provider: ProductProvider, category: str) -> Dict[str, int]:
+        """Crawl one provider/category and upsert what changed"""
+        prediction = GarmentPrediction(category=GarmentCategory(category), confidence=1.0)
+        products = await provider.search_products(prediction, limit=self.page_size)
+
+        identified = [p for p in products if external_id_for(p)]
+        if len(identified) < len(products):
+            self._counters["skipped_no_id"] += len(products) - len(identified)
+            logger.warning(
+                f"Catalog sync of {provider.name}/{category}: skipping "
+                f"{len(products) - len(identified)} products without a provider id"
+            )
+        # ON CONFLICT cannot touch the same row twice in one statement
+        rows = list({(r["provider"], r["external_id"]): r for r in map(_row, identified)}.values())
+        inserted, updated = await self.upsert(rows) if rows else (0, 0)
+
+        now = datetime.utcnow()
+        stmt = insert(CatalogSyncState).values(
+            provider=provider.name, category=category, synced_at=now, items=len(rows), changed=inserted + updated
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["provider", "category"],
+            set_={"synced_at": now, "items": len(rows), "changed": inserted + updated},
+        )
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(stmt)
+        return {"seen": len(rows), "inserted": inserted, "updated": updated,
+                "unchanged": len(rows) - inserted - updated}
+
+    async def upsert(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Bulk upsert on (provider, external_id), skipping unchanged rows
+
+        Returns:
+            (inserted, updated)
+        """
+        now = datetime.utcnow()
+        stmt = insert(Product).values([{**row, "created_at": now, "updated_at": now} for row in rows])
+        excluded = stmt.excluded
+        update = {c: excluded[c] for c in SYNCED_COLUMNS}
+        update["content_hash"] = excluded.content_hash
+        update["updated_at"] = now
+        # A new image invalidates the embedding; ingestion picks the row up again
+        image_changed = Product.image_url.is_distinct_from(excluded.image_url)
+        update["embedding"] = case((image_changed, None), else_=Product.embedding)
+        update["image_hash"] = case((image_changed, None), else_=Product.image_hash)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_product_provider_external",
+            set_=update,
+            where=Product.content_hash.is_distinct_from(excluded.content_hash),
+        ).returning(literal_column("xmax = 0").label("inserted"))
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                written = (await session.execute(stmt)).scalars().all()
+        inserted = sum(1 for was_inserted in written if was_inserted)
+        return inserted, len(written) - inserted
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "last_run": self._last_run}
+
+    async def _sync(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        totals = {"seen": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+        errors = 0
+
+        async def crawl(provider: ProductProvider, category: str):
+            nonlocal errors
+            async with semaphore:
+                try:
+                    result = await self.sync_category(provider, category)
+                except Exception as e:
+                    errors += 1
+                    logger.warning(f"Catalog sync of {provider.name}/{category} failed: {e}")
+                    return
+            for name, value in result.items():
+                totals[name] += value
+
+        await asyncio.gather(*(crawl(p, c) for p in self.providers for c in self.categories))
+
+        self._counters["runs"] += 1
+        self._counters["crawls"] += len(self.providers) * len(self.categories)
+        self._counters["crawl_errors"] += errors
+        for name, value in totals.items():
+            self._counters[name] += value
+        self._last_run = {
+            **totals,
+            "errors": errors,
+            "seconds": round(time.monotonic() - started, 2),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        logger.info(f"Catalog sync finished: {self._last_run}")
+        return self._last_run
+
+
+class CatalogMirror:
+    """Serves provider searches from the synced products table"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        max_age_s: Optional[float] = None,
+        state_ttl_s: Optional[float] = None,
+    ):
+        """
+        Initialize the mirror
+
+        Args:
+            session_factory: Async session factory
+            max_age_s: A provider/category synced longer ago than this is not served
+            state_ttl_s: How long the sync state is cached between reads
+        """
+        self.session_factory = session_factory
+        self.max_age_s = settings.CATALOG_MIRROR_MAX_AGE_S if max_age_s is None else max_age_s
+        self.state_ttl_s = settings.CATALOG_MIRROR_STATE_TTL_S if state_ttl_s is None else state_ttl_s
+        self._synced: Dict[Tuple[str, str], datetime] = {}
+        self._state_loaded_at = float("-inf")
+        self._state_lock = asyncio.Lock()
+        self._counters = {"hits": 0, "stale": 0, "empty": 0, "errors": 0}
+
+    async def search(
+        self,
+        provider: str,
+        prediction: GarmentPrediction,
+        limit: int,
+    ) -> Optional[List[ProductEntity]]:
+        """
+        Mirrored products for a provider search
+
+        Args:
+            provider: Provider name
+            prediction: Garment prediction
+            limit: Max results
+
+        Returns:
+            Products (matching color first, then most recently changed), or None
+            when the mirror is stale, empty for the query or unreachable - the
+            caller should then go live
+        """
+        category = prediction.category.value
+        try:
+            if not await self._is_fresh(provider, category):
+                self._counters["stale"] += 1
+                return None
+            rows = await self._query(provider, category, prediction.color, limit)
+        except Exception as e:
+            self._counters["errors"] += 1
+            logger.warning(f"Catalog mirror read failed, going live: {e}")
+            return None
+        if not rows:
+            self._counters["empty"] += 1
+            return None
+        self._counters["hits"] += 1
+        return [to_entity(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self._counters.values())
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            "synced_categories": len(self._synced),
+        }
+
+    async def _is_fresh(self, provider: str, category: str) -> bool:
+        if time.monotonic() - self._state_loaded_at >= self.state_ttl_s:
+            async with self._state_lock:
+                # Another request may have reloaded it while this one waited
+                if time.monotonic() - self._state_loaded_at >= self.state_ttl_s:
+                    async with self.session_factory() as session:
+                        rows = (await session.execute(
+                            select(CatalogSyncState.provider, CatalogSyncState.category, CatalogSyncState.synced_at)
+                        )).all()
+                    self._synced = {(r.provider, r.category): r.synced_at for r in rows}
+                    self._state_loaded_at = time.monotonic()
+        synced_at = self._synced.get((provider, category))
+        return synced_at is not None and datetime.utcnow() - synced_at < timedelta(seconds=self.max_age_s)
+
+    async def _query(self, provider: str, category: str, color: Optional[str], limit: int):
+        stmt = select(*ENTITY_COLUMNS).where(Product.provider == provider, Product.category == category)
+        order = [Product.updated_at.desc()]
+        if color and color.strip():
+            color_match = func.lower(Product.attributes["color"].astext) == color.strip().lower()
+            order.insert(0, case((color_match, 0), else_=1))
+        stmt = stmt.order_by(*order).limit(limit)
+        async with self.session_factory() as session:
+            return (await session.execute(stmt)).all()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sync provider catalogs into the products table")
+    parser.add_argument("--provider", action="append", help="Only this provider (repeatable)")
+    parser.add_argument("--category", action="append", help="Only this category (repeatable)")
+    parser.add_argument("--page-size", type=int, default=settings.CATALOG_SYNC_PAGE_SIZE)
+    parser.add_argument("--loop", action="store_true", help="Keep syncing every CATALOG_SYNC_INTERVAL_S")
+    args = parser.parse_args()
+
+    sync = CatalogSync(categories=args.category, page_size=args.page_size)
+    if args.provider:
+        sync.providers = [p for p in sync.providers if p.name in args.provider]
+    if args.loop:
+        await sync.run()
+    else:
+        print(json.dumps(await sync.sync_once(), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""
+Category routing
+Which product categories a category-filtered similarity query should touch
+"""
+
+from typing import Dict, List, Optional
+
+
+# Visually interchangeable categories, searched alongside the requested one
+RELATED_CATEGORIES: Dict[str, List[str]] = {
+    "shirt": ["blouse", "t-shirt"],
+    "t-shirt": ["tank_top", "shirt"],
+    "blouse": ["shirt", "tank_top"],
+    "tank_top": ["t-shirt", "blouse"],
+    "sweater": ["hoodie"],
+    "hoodie": ["sweater"],
+    "jeans": ["pants"],
+    "pants": ["jeans", "shorts"],
+    "shorts": ["pants"],
+    "sneakers": ["shoes"],
+    "shoes": ["sneakers", "boots"],
+    "boots": ["shoes"],
+}
+
+
+def route_categories(category: Optional[str], include_related: bool = False) -> Optional[List[str]]:
+    """
+    Categories to search for a query
+
+    Args:
+        category: Requested category, or None for all
+        include_related: Also search visually related categories
+
+    Returns:
+        Category list, or None when the query is unfiltered
+    """
+    if not category:
+        return None
+    if not include_related:
+        return [category]
+    return [category] + [c for c in RELATED_CATEGORIES.get(category, []) if c != category]
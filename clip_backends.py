@@ -0,0 +1,203 @@
+"""
+CLIP image encoder backends
+Selectable inference paths for the image tower: fp32 PyTorch, dynamically
+quantized int8 PyTorch, and an exported ONNX Runtime graph.
+"""
+
+from abc import ABC, abstractmethod
+import os
+from typing import Dict, List, Optional
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+
+
+BACKEND_TORCH_FP32 = "torch_fp32"
+BACKEND_TORCH_INT8 = "torch_int8"
+BACKEND_ONNX = "onnx"
+
+INT8_ARTIFACT = "clip_image_int8.pt"
+ONNX_ARTIFACT = "clip_image.onnx"
+
+
+def artifact_path(filename: str) -> str:
+    """Location of an exported artifact under MODEL_CACHE_DIR"""
+    return os.path.join(settings.MODEL_CACHE_DIR, filename)
+
+
+def normalize(features: np.ndarray) -> np.ndarray:
+    """L2-normalize embeddings row-wise"""
+    norms = np.linalg.norm(features, axis=-1, keepdims=True)
+    return features / np.maximum(norms, 1e-12)
+
+
+def build_image_encoder(model_name: Optional[str] = None):
+    """
+    Build a torch module mapping pixel_values to normalized image embeddings
+
+    Only the vision tower and projection are kept, which is what gets
+    quantized and exported.
+    """
+    import torch
+    from transformers import CLIPModel
+
+    class ImageEncoder(torch.nn.Module):
+        def __init__(self, clip: CLIPModel):
+            super().__init__()
+            self.vision_model = clip.vision_model
+            self.visual_projection = clip.visual_projection
+
+        def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+            pooled = self.vision_model(pixel_values=pixel_values)[1]
+            features = self.visual_projection(pooled)
+            return features / features.norm(p=2, dim=-1, keepdim=True)
+
+    clip = CLIPModel.from_pretrained(model_name or settings.CLIP_MODEL_NAME)
+    return ImageEncoder(clip).eval()
+
+
+def quantize_image_encoder(encoder):
+    """Dynamically quantize the Linear layers of an image encoder to int8"""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class ImageEncoderBackend(ABC):
+    """Abstract CLIP image encoder"""
+
+    name: str = ""
+
+    @abstractmethod
+    def encode(self, pixel_values: np.ndarray) -> np.ndarray:
+        """
+        Encode preprocessed images
+
+        Args:
+            pixel_values: Float32 array of shape (N, 3, H, W)
+
+        Returns:
+            Normalized float32 embeddings of shape (N, D)
+        """
+        pass
+
+
+class TorchFP32Backend(ImageEncoderBackend):
+    """Reference fp32 PyTorch path"""
+
+    name = BACKEND_TORCH_FP32
+
+    def __init__(self, device: Optional[str] = None):
+        import torch
+
+        self._torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.encoder = build_image_encoder().to(self.device)
+
+    def encode(self, pixel_values: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.no_grad():
+            inputs = torch.from_numpy(np.ascontiguousarray(pixel_values, dtype=np.float32))
+            return self.encoder(inputs.to(self.device)).cpu().numpy()
+
+
+class TorchInt8Backend(ImageEncoderBackend):
+    """Dynamically quantized int8 PyTorch path (CPU only)"""
+
+    name = BACKEND_TORCH_INT8
+
+    def __init__(self):
+        import torch
+
+        self._torch = torch
+        path = artifact_path(INT8_ARTIFACT)
+        if os.path.exists(path):
+            self.encoder = torch.jit.load(path, map_location="cpu").eval()
+            logger.info(f"Loaded int8 CLIP image encoder from {path}")
+        else:
+            # Quantizing on the fly only costs a few seconds at startup
+            logger.warning(f"{path} not found - quantizing CLIP image encoder at startup")
+            self.encoder = quantize_image_encoder(build_image_encoder())
+
+    def encode(self, pixel_values: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.no_grad():
+            inputs = torch.from_numpy(np.ascontiguousarray(pixel_values, dtype=np.float32))
+            return self.encoder(inputs).numpy()
+
+
+class OnnxBackend(ImageEncoderBackend):
+    """ONNX Runtime path over the exported image encoder"""
+
+    name = BACKEND_ONNX
+
+    def __init__(self, path: Optional[str] = None):
+        import onnxruntime as ort
+
+        path = path or artifact_path(ONNX_ARTIFACT)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} not found - run `python -m app.infrastructure.ml.export_clip` first"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.CLIP_ONNX_THREADS > 0:
+            options.intra_op_num_threads = settings.CLIP_ONNX_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(f"Loaded ONNX CLIP image encoder from {path}")
+
+    def encode(self, pixel_values: np.ndarray) -> np.ndarray:
+        inputs = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        (features,) = self.session.run(None, {self.input_name: inputs})
+        # The graph already normalizes; re-normalize to absorb float drift
+        return normalize(features.astype(np.float32))
+
+
+BACKENDS = {
+    BACKEND_TORCH_FP32: TorchFP32Backend,
+    BACKEND_TORCH_INT8: TorchInt8Backend,
+    BACKEND_ONNX: OnnxBackend,
+}
+
+
+def create_backend(name: Optional[str] = None) -> ImageEncoderBackend:
+    """Instantiate the configured image encoder backend"""
+    name = name or settings.CLIP_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CLIP backend: {name}. Available: {', '.join(BACKENDS)}")
+    logger.info(f"Using CLIP image backend: {name}")
+    return BACKENDS[name]()
+
+
+def parity_check(
+    reference: ImageEncoderBackend,
+    candidates: List[ImageEncoderBackend],
+    pixel_values: np.ndarray,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare candidate backends against a reference on the same inputs
+
+    Args:
+        reference: Usually the fp32 backend
+        candidates: Backends to check
+        pixel_values: Preprocessed calibration images
+
+    Returns:
+        Per-backend cosine similarity stats against the reference embeddings
+    """
+    expected = normalize(reference.encode(pixel_values))
+    report = {}
+    for backend in candidates:
+        actual = normalize(backend.encode(pixel_values))
+        cosine = np.sum(expected * actual, axis=-1)
+        report[backend.name] = {
+            "samples": int(len(cosine)),
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "p01_cosine": float(np.percentile(cosine, 1)),
+            "max_drift": float(1.0 - cosine.min()),
+        }
+    return report
@@ -3,24 +3,23 @@ Complete workflow endpoint
 Recognizes garment, finds products, and generates outfits in one call
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from PIL import Image
-import io
-from typing import Dict, Any
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from dataclasses import asdict
+from typing import AsyncIterator, Dict, Any, List, Optional
 from loguru import logger
 
 from app.domain.entities.garment import GarmentPrediction
-from app.infrastructure.ml.recognition import GarmentRecognitionService
-from app.infrastructure.external_apis.aggregator import ProductAggregator
-from app.domain.services.outfit_engine import OutfitRecommendationEngine
+from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.cache.analysis_cache import CachedAnalysis
+from app.infrastructure.ml.image_decode import decode_image, ImageDecodeError
+from app.core.registry import registry
 from app.core.config import settings
 
 router = APIRouter()
 
-recognition_service = GarmentRecognitionService()
-product_aggregator = ProductAggregator()
-outfit_engine = OutfitRecommendationEngine()
-
 
 @router.post("/analyze")
 async def complete_analysis(file: UploadFile = File(...)) -> Dict[str, Any]:
@@ -37,56 +36,343 @@ async def complete_analysis(file: UploadFile = File(...)) -> Dict[str, Any]:
         - prediction: GarmentPrediction
         - products: List of similar products
         - outfits: List of outfit recommendations
+        - providers: Which providers made the deadline (absent on cache hits)
     """
+    # Shared services; raises 503 while models are still loading
+    recognition_service = registry.recognition
+    product_aggregator = registry.aggregator
+    analysis_cache = registry.analysis_cache
+    
     try:
         # 1. Validate and load image
-        if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported image type: {file.content_type}"
-            )
-        
-        contents = await file.read()
-        if len(contents) > settings.MAX_IMAGE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Image too large. Max: {settings.MAX_IMAGE_SIZE / 1024 / 1024}MB"
-            )
+        contents = await _read_upload(file)
         
-        image = Image.open(io.BytesIO(contents))
+        # Exact-bytes keys are checked before decoding so repeats skip it entirely
+        image = None
+        cache_key = None
+        cached = None
+        provider_report = None
+        if analysis_cache:
+            if analysis_cache.needs_image:
+                image = await _decode(contents)
+            cache_key = analysis_cache.key_for(contents, image)
+            cached = await analysis_cache.get(cache_key)
         
-        # 2. Recognize garment
-        prediction = await recognition_service.recognize(image)
-        logger.info(f"Recognized: {prediction.category} (confidence: {prediction.confidence:.2f})")
-        
-        # 3. Search for products
-        products = await product_aggregator.search_products(
-            prediction,
-            limit=settings.SIMILAR_PRODUCTS_LIMIT
-        )
-        logger.info(f"Found {len(products)} products")
-        
-        # 4. Generate outfits (using first product as anchor)
-        outfits = []
-        if products:
-            anchor = products[0]
-            outfits = await outfit_engine.generate_outfits(
-                anchor_item=anchor,
-                prediction=prediction,
-                available_products=products,
-                limit=settings.MAX_OUTFITS_PER_ITEM
+        if cached:
+            prediction, products = cached.prediction, cached.products
+            logger.info(f"Analysis cache hit: {prediction.category}, {len(products)} products")
+        else:
+            if image is None:
+                image = await _decode(contents)
+            
+            # 2. Recognize garment
+            embedding = await recognition_service.embed(image)
+            prediction = await recognition_service.recognize(image, embedding=embedding)
+            logger.info(f"Recognized: {prediction.category} (confidence: {prediction.confidence:.2f})")
+            
+            # 3. Search for products within the provider budget
+            search = await product_aggregator.search(
+                prediction,
+                limit=settings.SIMILAR_PRODUCTS_LIMIT,
+                query_embedding=embedding
             )
-            logger.info(f"Generated {len(outfits)} outfits")
+            products, provider_report = search.products, search.report()
+            logger.info(f"Found {len(products)} products")
+            
+            # Partial results (a provider timed out or failed) are not worth pinning
+            if analysis_cache and not search.partial:
+                await analysis_cache.set(cache_key, CachedAnalysis(embedding, prediction, products))
         
-        # 5. Return complete result
-        return {
-            "prediction": prediction.model_dump(),
-            "products": [p.model_dump() for p in products],
-            "outfits": [o.model_dump() for o in outfits]
-        }
+        # 4. Generate outfits and return complete result
+        return await _build_result(prediction, products, provider_report)
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in complete analysis: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+
+@router.post("/analyze/stream")
+async def complete_analysis_stream(request: Request, file: UploadFile = File(...)) -> StreamingResponse:
+    """
+    Complete analysis, streamed as each stage finishes
+    
+    Sends the prediction as soon as recognition is done, then every
+    provider's products as they arrive, then the merged products and the
+    outfits. Responds with Server-Sent Events when the client accepts
+    text/event-stream, newline-delimited JSON otherwise.
+    
+    Args:
+        file: Image file
+        
+    Returns:
+        Stream of events, each {"event": ..., "data": ...}:
+        - prediction: GarmentPrediction
+        - provider: one provider's outcome and products
+        - products: merged products and the provider report
+        - outfits: outfit recommendations
+        - done / error
+    """
+    # Resolved up front so a loading model is a 503, not an error event
+    recognition_service = registry.recognition
+    product_aggregator = registry.aggregator
+    analysis_cache = registry.analysis_cache
+    
+    # Validation and decoding happen before the stream starts so they still map to 4xx
+    contents = await _read_upload(file)
+    image = None
+    cache_key = None
+    cached = None
+    if analysis_cache:
+        if analysis_cache.needs_image:
+            image = await _decode(contents)
+        cache_key = analysis_cache.key_for(contents, image)
+        cached = await analysis_cache.get(cache_key)
+    if not cached and image is None:
+        image = await _decode(contents)
+    
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    return StreamingResponse(
+        _analysis_events(recognition_service, product_aggregator, analysis_cache, image, cache_key, cached, sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/analyze/batch")
+async def complete_analysis_batch(files: List[UploadFile] = File(...)) -> Dict[str, Any]:
+    """
+    Complete analysis for several images in one call
+    
+    Images are decoded concurrently, embedded in one batched forward pass, and
+    identical provider queries across the batch are only sent once.
+    
+    Args:
+        files: Image files
+        
+    Returns:
+        Dictionary with:
+        - results: One entry per image, in upload order, holding either the
+          same fields as /analyze or an error
+    """
+    recognition_service = registry.recognition
+    product_aggregator = registry.aggregator
+    analysis_cache = registry.analysis_cache
+    
+    if len(files) > settings.MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images. Max: {settings.MAX_BATCH_IMAGES}"
+        )
+    
+    errors: List[Optional[str]] = [None] * len(files)
+    predictions: List[Optional[GarmentPrediction]] = [None] * len(files)
+    products: List[Optional[List[ProductEntity]]] = [None] * len(files)
+    provider_reports: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    
+    # 1. Read, validate and decode all uploads concurrently
+    async def load(file: UploadFile):
+        contents = await _read_upload(file)
+        return contents, await _decode(contents)
+    
+    loaded = await asyncio.gather(*(load(f) for f in files), return_exceptions=True)
+    
+    pending = []
+    for i, item in enumerate(loaded):
+        if isinstance(item, BaseException):
+            errors[i] = _error_detail(item)
+            continue
+        contents, image = item
+        cache_key = analysis_cache.key_for(contents, image) if analysis_cache else None
+        cached = await analysis_cache.get(cache_key) if analysis_cache else None
+        if cached:
+            predictions[i], products[i] = cached.prediction, cached.products
+        else:
+            pending.append((i, image, cache_key))
+    
+    try:
+        # 2. One batched forward pass for everything not cached
+        embeddings = await recognition_service.embed_many([image for _, image, _ in pending])
+        recognized = await asyncio.gather(
+            *(recognition_service.recognize(image, embedding=embedding)
+              for (_, image, _), embedding in zip(pending, embeddings)),
+            return_exceptions=True
+        )
+    except Exception as e:
+        logger.error(f"Error in batch recognition: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+    
+    # 3. Search providers once per distinct query
+    queries: Dict[tuple, GarmentPrediction] = {}
+    for (i, _, _), prediction in zip(pending, recognized):
+        if isinstance(prediction, BaseException):
+            errors[i] = _error_detail(prediction)
+            continue
+        predictions[i] = prediction
+        key = product_aggregator.query_key(prediction, settings.SIMILAR_PRODUCTS_LIMIT)
+        queries.setdefault(key, prediction)
+    
+    searched = await asyncio.gather(
+        *(product_aggregator.search(p, limit=settings.SIMILAR_PRODUCTS_LIMIT)
+          for p in queries.values()),
+        return_exceptions=True
+    )
+    search_results = dict(zip(queries.keys(), searched))
+    logger.info(f"Batch of {len(files)}: {len(pending)} embedded, {len(queries)} distinct provider queries")
+    
+    for (i, _, cache_key), embedding in zip(pending, embeddings):
+        if errors[i]:
+            continue
+        found = search_results[product_aggregator.query_key(predictions[i], settings.SIMILAR_PRODUCTS_LIMIT)]
+        if isinstance(found, BaseException):
+            errors[i] = _error_detail(found)
+            continue
+        # One search per distinct query; ranking against each photo is per image
+        products[i] = product_aggregator.rank(
+            found.products, predictions[i], settings.SIMILAR_PRODUCTS_LIMIT, embedding
+        )
+        provider_reports[i] = found.report()
+        if analysis_cache and not found.partial:
+            await analysis_cache.set(cache_key, CachedAnalysis(embedding, predictions[i], products[i]))
+    
+    # 4. Outfits per image, results in upload order
+    async def result_for(i: int) -> Dict[str, Any]:
+        entry = {"index": i, "filename": files[i].filename}
+        if errors[i]:
+            return {**entry, "error": errors[i]}
+        try:
+            return {**entry, **await _build_result(predictions[i], products[i], provider_reports[i])}
+        except Exception as e:
+            return {**entry, "error": _error_detail(e)}
+    
+    return {"results": await asyncio.gather(*(result_for(i) for i in range(len(files))))}
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """Read an upload, enforcing type and size limits"""
+    if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported image type: {file.content_type}"
+        )
+    
+    contents = await file.read()
+    if len(contents) > settings.MAX_IMAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Image too large. Max: {settings.MAX_IMAGE_SIZE / 1024 / 1024}MB"
+        )
+    return contents
+
+
+async def _analysis_events(
+    recognition_service,
+    product_aggregator,
+    analysis_cache,
+    image,
+    cache_key: Optional[str],
+    cached: Optional[CachedAnalysis],
+    sse: bool
+) -> AsyncIterator[str]:
+    """Run the analysis stages, yielding one frame per result"""
+    def frame(event: str, data: Dict[str, Any]) -> str:
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, "data": data}) + "\n"
+    
+    try:
+        if cached:
+            prediction, products, provider_report = cached.prediction, cached.products, None
+            yield frame("prediction", prediction.model_dump(mode="json"))
+        else:
+            # 1. Recognize; the first frame goes out right after inference
+            embedding = await recognition_service.embed(image)
+            prediction = await recognition_service.recognize(image, embedding=embedding)
+            yield frame("prediction", prediction.model_dump(mode="json"))
+            
+            # 2. Forward each provider's products as it answers
+            queue: asyncio.Queue = asyncio.Queue()
+            search_task = asyncio.create_task(product_aggregator.search(
+                prediction,
+                limit=settings.SIMILAR_PRODUCTS_LIMIT,
+                on_provider=lambda outcome, found: queue.put_nowait((outcome, found)),
+                query_embedding=embedding,
+            ))
+            search_task.add_done_callback(lambda _: queue.put_nowait(None))
+            try:
+                while (item := await queue.get()) is not None:
+                    outcome, found = item
+                    yield frame("provider", {
+                        **asdict(outcome),
+                        "products": [p.model_dump(mode="json") for p in found],
+                    })
+                search = await search_task
+            finally:
+                # Client went away mid-stream
+                search_task.cancel()
+            products, provider_report = search.products, search.report()
+            
+            if analysis_cache and not search.partial:
+                await analysis_cache.set(cache_key, CachedAnalysis(embedding, prediction, products))
+        
+        yield frame("products", {
+            "products": [p.model_dump(mode="json") for p in products],
+            "providers": provider_report,
+        })
+        
+        # 3. Outfits last
+        outfits = await _generate_outfits(prediction, products)
+        yield frame("outfits", {"outfits": [o.model_dump(mode="json") for o in outfits]})
+        yield frame("done", {})
+    except Exception as e:
+        logger.error(f"Error in streamed analysis: {e}")
+        yield frame("error", {"detail": _error_detail(e)})
+
+
+async def _generate_outfits(prediction: GarmentPrediction, products: List[ProductEntity]) -> list:
+    """Generate outfits using the first product as anchor"""
+    outfits = []
+    if products:
+        anchor = products[0]
+        outfits = await registry.outfit_engine.generate_outfits(
+            anchor_item=anchor,
+            prediction=prediction,
+            available_products=products,
+            limit=settings.MAX_OUTFITS_PER_ITEM
+        )
+        logger.info(f"Generated {len(outfits)} outfits")
+    return outfits
+
+
+async def _build_result(
+    prediction: GarmentPrediction,
+    products: List[ProductEntity],
+    provider_report: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Generate outfits (using first product as anchor) and assemble the response"""
+    outfits = await _generate_outfits(prediction, products)
+    
+    result = {
+        "prediction": prediction.model_dump(),
+        "products": [p.model_dump() for p in products],
+        "outfits": [o.model_dump() for o in outfits]
+    }
+    if provider_report is not None:
+        result["providers"] = provider_report
+    return result
+
+
+def _error_detail(error: BaseException) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return f"Error processing image: {str(error)}"
+
+
+async def _decode(contents: bytes):
+    """Decode an upload to model resolution off the event loop"""
+    try:
+        return await asyncio.to_thread(decode_image, contents, registry.recognition.input_size)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
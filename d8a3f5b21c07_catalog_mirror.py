@@ -0,0 +1,36 @@
+"""Add products.content_hash and catalog_sync_state for the local catalog mirror
+
+Revision ID: d8a3f5b21c07
+Revises: c41f9a7e2d6b
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d8a3f5b21c07"
+down_revision = "c41f9a7e2d6b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("products", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    # Mirror reads filter on provider + category
+    op.create_index("ix_products_provider_category", "products", ["provider", "category"])
+    op.create_table(
+        "catalog_sync_state",
+        sa.Column("provider", sa.String(length=50), primary_key=True),
+        sa.Column("category", sa.String(length=50), primary_key=True),
+        sa.Column("synced_at", sa.DateTime(), nullable=False),
+        sa.Column("items", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("changed", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_sync_state")
+    op.drop_index("ix_products_provider_category", table_name="products")
+    op.drop_column("products", "content_hash")
@@ -0,0 +1,147 @@
+"""Batch concurrent key lookups into one round trip per event loop tick"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    DataLoader-style batcher with a TTL cache
+
+    Keys requested during the same tick, by any number of callers, are
+    deduplicated and handed to batch_fn together on the next tick. Keys already
+    being fetched are joined instead of fetched again. Results (including
+    "not found") are cached for cache_ttl_s.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[K]], Awaitable[Dict[K, V]]],
+        name: str,
+        max_batch_size: int = 500,
+        cache_ttl_s: float = 0.0,
+        cache_size: int = 4096,
+    ):
+        """
+        Args:
+            batch_fn: Fetches many keys at once; keys missing from its result are "not found"
+            name: Name used in stats
+            max_batch_size: Larger batches are split into several batch_fn calls
+            cache_ttl_s: Seconds results are served from memory (0 disables the cache)
+            cache_size: Max cached keys (least recently used are dropped)
+        """
+        self.name = name
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.cache_ttl_s = cache_ttl_s
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[K, Tuple[float, Optional[V]]]" = OrderedDict()
+        self._futures: Dict[K, asyncio.Future] = {}
+        self._queue: List[K] = []
+        self._scheduled = False
+        self._counters = {"keys": 0, "cache_hits": 0, "joined": 0, "batches": 0, "fetched": 0, "errors": 0}
+
+    async def load(self, key: K) -> Optional[V]:
+        """One key, or None when not found"""
+        return (await self.load_many([key])).get(key)
+
+    async def load_many(self, keys: Iterable[K]) -> Dict[K, V]:
+        """
+        Many keys at once
+
+        Returns:
+            Found keys only
+        """
+        found: Dict[K, V] = {}
+        waiting: Dict[K, asyncio.Future] = {}
+        now = time.monotonic()
+        loop = asyncio.get_running_loop()
+        for key in dict.fromkeys(keys):
+            self._counters["keys"] += 1
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self._counters["cache_hits"] += 1
+                self._cache.move_to_end(key)
+                if cached[1] is not None:
+                    found[key] = cached[1]
+                continue
+
+            future = self._futures.get(key)
+            if future is None:
+                future = loop.create_future()
+                # Nobody may be left to read a failure; don't warn about it
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._futures[key] = future
+                self._queue.append(key)
+            else:
+                self._counters["joined"] += 1
+            waiting[key] = future
+
+        if self._queue and not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+
+        if waiting:
+            # shield: one caller giving up must not fail the others waiting on the same key
+            values = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            found.update((key, value) for key, value in zip(waiting, values) if value is not None)
+        return found
+
+    def prime(self, key: K, value: V):
+        """Put a known value in the cache (e.g. products just fetched another way)"""
+        if self.cache_ttl_s > 0:
+            self._store(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "cached": len(self._cache),
+            "in_flight": len(self._futures),
+            "avg_batch": round(self._counters["fetched"] / self._counters["batches"], 1)
+            if self._counters["batches"] else 0.0,
+        }
+
+    def _dispatch(self):
+        keys, self._queue, self._scheduled = self._queue, [], False
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._run(keys[start:start + self.max_batch_size]))
+
+    async def _run(self, keys: List[K]):
+        self._counters["batches"] += 1
+        self._counters["fetched"] += len(keys)
+        futures = {key: self._futures.get(key) for key in keys}
+        try:
+            values = await self._batch_fn(keys)
+            for key in keys:
+                value = values.get(key)
+                if self.cache_ttl_s > 0:
+                    self._store(key, value)
+                future = futures[key]
+                if future is not None and not future.done():
+                    future.set_result(value)
+        except Exception as e:
+            self._counters["errors"] += 1
+            for future in futures.values():
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancelled or a BaseException: don't leave callers waiting, and let
+            # later loads fetch these keys again
+            for key, future in futures.items():
+                if future is not None and not future.done():
+                    future.cancel()
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+
+    def _store(self, key: K, value: Optional[V]):
+        self._cache[key] = (time.monotonic() + self.cache_ttl_s, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,263 @@
+"""
+Near-duplicate product detection
+Finds the same item listed by several providers using MinHash/LSH over title
+word shingles and, when image embeddings are available, random-hyperplane LSH
+over embeddings. Only LSH bucket collisions are compared, so the cost stays
+close to linear in the number of products.
+
+A similar title alone is not enough: model numbers and color words must be
+the same, and the image embedding or the price has to agree as well. A
+cluster never holds two listings of the same provider.
+"""
+
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+from app.domain.entities.product import Product as ProductEntity
+from app.core.config import settings
+
+
+# Small enough that a * hash (32-bit) + b stays within uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Titles with fewer words say too little about which item it is
+_MIN_TITLE_TOKENS = 2
+
+# Words that tell variants of one model apart; they must match exactly
+_COLOR_WORDS = frozenset({
+    "black", "white", "grey", "gray", "blue", "navy", "red", "green", "yellow", "orange", "pink",
+    "purple", "brown", "beige", "cream", "khaki", "olive", "burgundy", "silver", "gold", "multicolor",
+})
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    title = unicodedata.normalize("NFKD", title or "")
+    title = "".join(c for c in title if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", title).split())
+
+
+def shingles(tokens: List[str], size: int) -> Set[str]:
+    """Word n-grams of 1 to size words"""
+    return {" ".join(tokens[i:i + n]) for n in range(1, size + 1) for i in range(len(tokens) - n + 1)}
+
+
+def key_tokens(tokens: Iterable[str]) -> frozenset:
+    """Model numbers (words with a digit) and color words"""
+    return frozenset(t for t in tokens if t in _COLOR_WORDS or any(c.isdigit() for c in t))
+
+
+class _UnionFind:
+    """Union-find whose clusters never hold two rows of the same provider"""
+
+    def __init__(self, providers: List[str]):
+        self.parent = list(range(len(providers)))
+        self.providers = [{provider} for provider in providers]
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j or self.providers[root_i] & self.providers[root_j]:
+            return
+        keep, drop = min(root_i, root_j), max(root_i, root_j)
+        self.parent[drop] = keep
+        self.providers[keep] |= self.providers[drop]
+
+
+class ProductDeduplicator:
+    """Clusters near-duplicate products and keeps the best-priced one per cluster"""
+
+    def __init__(
+        self,
+        title_threshold: Optional[float] = None,
+        embedding_threshold: Optional[float] = None,
+        title_embedding_threshold: Optional[float] = None,
+        price_tolerance: Optional[float] = None,
+        num_perm: Optional[int] = None,
+        bands: Optional[int] = None,
+        shingle_size: Optional[int] = None,
+        embedding_tables: Optional[int] = None,
+        embedding_bits: Optional[int] = None,
+        seed: int = 0,
+    ):
+        """
+        Initialize the deduplicator
+
+        Args:
+            title_threshold: Estimated title Jaccard similarity at which two products match
+            embedding_threshold: Image embedding cosine similarity at which two products match
+            title_embedding_threshold: Embedding cosine similarity that confirms a title match
+            price_tolerance: Relative price difference within which prices confirm a
+                title match (used when either product has no embedding)
+            num_perm: MinHash permutations
+            bands: LSH bands (num_perm must be divisible by it); more bands catch
+                lower similarities at the cost of more candidate pairs
+            shingle_size: Longest word n-gram in a title shingle
+            embedding_tables: Random-hyperplane LSH tables for embeddings
+            embedding_bits: Hyperplanes (bits) per table
+            seed: Seed for the hash permutations and hyperplanes
+        """
+        self.title_threshold = settings.DEDUP_TITLE_THRESHOLD if title_threshold is None else title_threshold
+        self.embedding_threshold = (
+            settings.DEDUP_EMBEDDING_THRESHOLD if embedding_threshold is None else embedding_threshold
+        )
+        self.title_embedding_threshold = (
+            settings.DEDUP_TITLE_EMBEDDING_THRESHOLD if title_embedding_threshold is None else title_embedding_threshold
+        )
+        self.price_tolerance = settings.DEDUP_PRICE_TOLERANCE if price_tolerance is None else price_tolerance
+        self.num_perm = settings.DEDUP_NUM_PERM if num_perm is None else num_perm
+        self.bands = settings.DEDUP_LSH_BANDS if bands is None else bands
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm={self.num_perm} must be divisible by bands={self.bands}")
+        self.shingle_size = settings.DEDUP_SHINGLE_SIZE if shingle_size is None else shingle_size
+        self.embedding_tables = settings.DEDUP_EMBEDDING_TABLES if embedding_tables is None else embedding_tables
+        self.embedding_bits = settings.DEDUP_EMBEDDING_BITS if embedding_bits is None else embedding_bits
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        self._seed = seed
+        self._planes: Optional[np.ndarray] = None
+
+    def deduplicate(
+        self,
+        products: List[ProductEntity],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[ProductEntity]:
+        """
+        Merge near-duplicates
+
+        Args:
+            products: Products from all providers
+            embeddings: Optional image embeddings by product id
+
+        Returns:
+            One product per duplicate cluster (the cheapest), in first-seen
+            order; other offers of the same item are listed in its
+            attributes["duplicate_offers"]
+        """
+        if len(products) < 2:
+            return list(products)
+
+        vectors: Dict[int, np.ndarray] = {}
+        if embeddings:
+            for i, product in enumerate(products):
+                vector = embeddings.get(str(product.id))
+                if vector is not None:
+                    vector = np.asarray(vector, dtype=np.float32)
+                    vectors[i] = vector / (np.linalg.norm(vector) + 1e-12)
+
+        # (similarity, i, j) of every accepted pair; merged best first
+        matches: List[Tuple[float, int, int]] = []
+        tokens = [normalize_title(p.name).split() for p in products]
+        titled = [i for i, t in enumerate(tokens) if len(t) >= _MIN_TITLE_TOKENS]
+        if len(titled) > 1:
+            signatures = self.signatures([products[i].name for i in titled])
+            for a, b in self._title_candidates(signatures):
+                i, j = titled[a], titled[b]
+                similarity = float(np.mean(signatures[a] == signatures[b]))
+                if (
+                    similarity >= self.title_threshold
+                    and products[i].provider != products[j].provider
+                    and key_tokens(tokens[i]) == key_tokens(tokens[j])
+                    and self._confirmed(products[i], products[j], vectors.get(i), vectors.get(j))
+                ):
+                    matches.append((similarity, i, j))
+
+        if len(vectors) > 1:
+            rows = list(vectors)
+            stacked = np.vstack([vectors[i] for i in rows])
+            for a, b in self._embedding_candidates(stacked):
+                similarity = float(stacked[a] @ stacked[b])
+                if similarity >= self.embedding_threshold:
+                    matches.append((similarity, rows[a], rows[b]))
+
+        union_find = _UnionFind([p.provider for p in products])
+        for _, i, j in sorted(matches, reverse=True):
+            union_find.union(i, j)
+
+        clusters: Dict[int, List[int]] = defaultdict(list)
+        for i in range(len(products)):
+            clusters[union_find.find(i)].append(i)
+        return [self._merge([products[i] for i in members]) for members in sorted(clusters.values())]
+
+    def signatures(self, titles: Iterable[str]) -> np.ndarray:
+        """MinHash signature matrix (n, num_perm)"""
+        rows = []
+        for title in titles:
+            words = shingles(normalize_title(title).split(), self.shingle_size)
+            hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & _MAX_HASH for s in words), dtype=np.uint64)
+            # (a * x + b) mod p for every permutation at once, then min over shingles
+            permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+            rows.append(permuted.min(axis=1))
+        return np.vstack(rows)
+
+    def _confirmed(
+        self,
+        x: ProductEntity,
+        y: ProductEntity,
+        vector_x: Optional[np.ndarray],
+        vector_y: Optional[np.ndarray],
+    ) -> bool:
+        """Whether the images (when both have one) or else the prices back up a title match"""
+        if vector_x is not None and vector_y is not None:
+            return float(vector_x @ vector_y) >= self.title_embedding_threshold
+        if x.price is None or y.price is None:
+            return False
+        low, high = sorted((float(x.price), float(y.price)))
+        return high - low <= self.price_tolerance * high
+
+    def _title_candidates(self, signatures: np.ndarray) -> Set[Tuple[int, int]]:
+        rows_per_band = self.num_perm // self.bands
+        bands = signatures.reshape(len(signatures), self.bands, rows_per_band)
+        return self._pairs_from_tables([
+            [bands[i, band].tobytes() for i in range(len(signatures))] for band in range(self.bands)
+        ])
+
+    def _embedding_candidates(self, vectors: np.ndarray) -> Set[Tuple[int, int]]:
+        dim = vectors.shape[1]
+        if self._planes is None or self._planes.shape[1] != dim:
+            rng = np.random.default_rng(self._seed + 1)
+            self._planes = rng.standard_normal((self.embedding_tables * self.embedding_bits, dim)).astype(np.float32)
+        bits = (vectors @ self._planes.T) > 0
+        tables = bits.reshape(len(vectors), self.embedding_tables, self.embedding_bits)
+        keys = np.packbits(tables, axis=2)
+        return self._pairs_from_tables([
+            [keys[i, t].tobytes() for i in range(len(vectors))] for t in range(self.embedding_tables)
+        ])
+
+    @staticmethod
+    def _pairs_from_tables(tables: List[List[bytes]]) -> Set[Tuple[int, int]]:
+        """Pairs of rows sharing a bucket in any table"""
+        pairs: Set[Tuple[int, int]] = set()
+        for keys in tables:
+            buckets: Dict[bytes, List[int]] = defaultdict(list)
+            for row, key in enumerate(keys):
+                buckets[key].append(row)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+        return pairs
+
+    @staticmethod
+    def _merge(cluster: List[ProductEntity]) -> ProductEntity:
+        """Cheapest product of a cluster, carrying the other offers"""
+        if len(cluster) == 1:
+            return cluster[0]
+        best = min(cluster, key=lambda p: p.price if p.price is not None else float("inf"))
+        offers = [
+            {"provider": p.provider, "price": p.price, "currency": p.currency, "product_url": p.product_url}
+            for p in cluster if p is not best
+        ]
+        return best.model_copy(update={"attributes": {**(best.attributes or {}), "duplicate_offers": offers}})
@@ -0,0 +1,445 @@
+"""
+Bulk catalog embedding ingestion
+
+Streams catalog rows (from the products table or a JSONL feed), fetches
+product images with bounded concurrency, embeds them in large CLIP batches
+and upserts the embeddings back in bulk. Unchanged images are skipped by
+content hash and progress is checkpointed so interrupted runs resume.
+
+Usage:
+    python -m app.infrastructure.ml.embedding_ingestion --source db [--only-missing]
+    python -m app.infrastructure.ml.embedding_ingestion --source jsonl --feed catalog.jsonl
+"""
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from loguru import logger
+from sqlalchemy import String, Text, cast, column, select, update, values as sa_values
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.database.models.product import Product
+from app.infrastructure.ml.clip_backends import create_backend
+from app.infrastructure.ml.image_decode import decode_image, to_pixel_values, ImageDecodeError
+
+
+# Columns a JSONL feed row may carry besides the image
+FEED_COLUMNS = (
+    "name", "description", "price", "currency", "image_url", "product_url",
+    "affiliate_link", "category", "attributes",
+)
+# NOT NULL columns a feed row must carry to be inserted as a new product
+INSERT_REQUIRED_COLUMNS = frozenset({"name", "product_url", "category"})
+
+
+@dataclass
+class CatalogItem:
+    """One product whose image should be embedded"""
+    seq: int
+    cursor: str
+    provider: str
+    external_id: str
+    image_url: str
+    image_hash: Optional[str] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class IngestionStats:
+    read: int = 0
+    fetched: int = 0
+    skipped_unchanged: int = 0
+    failed: int = 0
+    embedded: int = 0
+    written: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            **{k: v for k, v in self.__dict__.items() if k != "started"},
+            "elapsed_s": round(elapsed, 1),
+            "images_per_s": round(self.embedded / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+class Checkpoint:
+    """Tracks the highest contiguous finished item so a run can resume after it"""
+
+    def __init__(self, path: Optional[str], source: str):
+        self.path = path
+        self.source = source
+        self.cursor: Optional[str] = None
+        self._next_seq = 0
+        self._done: Dict[int, str] = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("source") == source:
+                self.cursor = state.get("cursor")
+                logger.info(f"Resuming {source} ingestion after {self.cursor}")
+
+    def mark_done(self, seq: int, cursor: str):
+        self._done[seq] = cursor
+        while self._next_seq in self._done:
+            self.cursor = self._done.pop(self._next_seq)
+            self._next_seq += 1
+
+    def save(self):
+        if not self.path or self.cursor is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "cursor": self.cursor, "saved_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+
+async def stream_db_rows(after: Optional[str], only_missing: bool, page_size: int) -> AsyncIterator[CatalogItem]:
+    """Keyset-paginate products by id"""
+    seq = 0
+    while True:
+        stmt = select(
+            Product.id, Product.provider, Product.external_id, Product.image_url, Product.image_hash
+        ).order_by(Product.id).limit(page_size)
+        if after:
+            stmt = stmt.where(Product.id > uuid.UUID(after))
+        if only_missing:
+            stmt = stmt.where(Product.embedding.is_(None))
+
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            return
+
+        for row in rows:
+            yield CatalogItem(
+                seq=seq,
+                cursor=str(row.id),
+                provider=row.provider,
+                external_id=row.external_id,
+                image_url=row.image_url,
+                image_hash=row.image_hash,
+            )
+            seq += 1
+        after = str(rows[-1].id)
+
+
+async def stream_jsonl(path: str, after: Optional[str]) -> AsyncIterator[CatalogItem]:
+    """Read a JSONL feed; the cursor is the line number"""
+    skip_until = int(after) if after is not None else -1
+    seq = 0
+    with open(path) as f:
+        for line_no, line in enumerate(f):
+            if line_no <= skip_until or not line.strip():
+                continue
+            row = json.loads(line)
+            yield CatalogItem(
+                seq=seq,
+                cursor=str(line_no),
+                provider=row["provider"],
+                external_id=str(row["external_id"]),
+                image_url=row["image_url"],
+                image_hash=row.get("image_hash"),
+                fields={k: row[k] for k in FEED_COLUMNS if k in row},
+            )
+            seq += 1
+            # Let the fetchers run between lines
+            if seq % 256 == 0:
+                await asyncio.sleep(0)
+
+
+async def lookup_image_hashes(items: List[CatalogItem]):
+    """Fill in stored image hashes for feed rows that don't carry one"""
+    keys = [(item.provider, item.external_id) for item in items if item.image_hash is None]
+    if not keys:
+        return
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(Product.provider, Product.external_id, Product.image_hash)
+            .where(Product.external_id.in_([k[1] for k in keys]))
+        )).all()
+    stored = {(r.provider, r.external_id): r.image_hash for r in rows}
+    for item in items:
+        if item.image_hash is None:
+            item.image_hash = stored.get((item.provider, item.external_id))
+
+
+async def upsert_embeddings(rows: List[Tuple[CatalogItem, str, np.ndarray]]):
+    """
+    Write one batch
+
+    Feed rows that carry every required column are upserted with a single
+    INSERT ... ON CONFLICT on (provider, external_id). Everything else (db
+    rows, partial feed rows) can only refer to existing products and gets a
+    single UPDATE ... FROM (VALUES ...) of the embedding columns.
+    """
+    now = datetime.utcnow()
+    complete = [r for r in rows if INSERT_REQUIRED_COLUMNS <= r[0].fields.keys()]
+    existing = [r for r in rows if not INSERT_REQUIRED_COLUMNS <= r[0].fields.keys()]
+
+    statements = []
+    if complete:
+        values = [
+            {
+                "provider": item.provider,
+                "external_id": item.external_id,
+                "image_url": item.image_url,
+                **item.fields,
+                "embedding": embedding.tolist(),
+                "image_hash": image_hash,
+                "updated_at": now,
+            }
+            for item, image_hash, embedding in complete
+        ]
+        # Every row in a multi-VALUES insert needs the same keys
+        columns = set().union(*(v.keys() for v in values))
+        values = [{c: v.get(c) for c in columns} for v in values]
+
+        stmt = insert(Product).values(values)
+        set_ = {"embedding": stmt.excluded.embedding, "image_hash": stmt.excluded.image_hash, "updated_at": now}
+        set_.update({c: stmt.excluded[c] for c in columns if c in FEED_COLUMNS})
+        statements.append(stmt.on_conflict_do_update(constraint="uq_product_provider_external", set_=set_))
+
+    if existing:
+        incoming = sa_values(
+            column("provider", String),
+            column("external_id", String),
+            column("embedding", Text),
+            column("image_hash", String),
+            name="incoming",
+        ).data([
+            (item.provider, item.external_id, json.dumps(embedding.tolist()), image_hash)
+            for item, image_hash, embedding in existing
+        ])
+        statements.append(
+            update(Product)
+            .where(Product.provider == incoming.c.provider, Product.external_id == incoming.c.external_id)
+            .values(
+                # pgvector parses its '[x, y, ...]' text form
+                embedding=cast(incoming.c.embedding, Product.embedding.type),
+                image_hash=incoming.c.image_hash,
+                updated_at=now,
+            )
+        )
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            for stmt in statements:
+                await session.execute(stmt)
+
+
+class EmbeddingIngestionPipeline:
+    """fetch (N workers) -> decode -> batch embed -> bulk write"""
+
+    def __init__(
+        self,
+        encode: Callable[[np.ndarray], np.ndarray],
+        http_client: httpx.AsyncClient,
+        concurrency: int = 32,
+        batch_size: int = 128,
+        checkpoint: Optional[Checkpoint] = None,
+        force: bool = False,
+        writer: Callable = upsert_embeddings,
+    ):
+        """
+        Initialize the pipeline
+
+        Args:
+            encode: Blocking function mapping pixel batches to normalized embeddings
+            http_client: Client used to download images
+            concurrency: Max concurrent image downloads
+            batch_size: Images per forward pass and per bulk write
+            checkpoint: Progress tracker for resumable runs
+            force: Re-embed even when the image hash is unchanged
+            writer: Async function persisting a batch
+        """
+        self.encode = encode
+        self.http_client = http_client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.force = force
+        self.writer = writer
+        self.stats = IngestionStats()
+
+    async def run(self, items: AsyncIterator[CatalogItem]) -> IngestionStats:
+        """Process every item from the source"""
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        decoded: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+
+        fetchers = [asyncio.create_task(self._fetch_worker(pending, decoded)) for _ in range(self.concurrency)]
+        embedder = asyncio.create_task(self._embed_worker(decoded))
+
+        try:
+            async for item in items:
+                self.stats.read += 1
+                await pending.put(item)
+            for _ in fetchers:
+                await pending.put(None)
+            await asyncio.gather(*fetchers)
+            await decoded.put(None)
+            await embedder
+        finally:
+            for task in [*fetchers, embedder]:
+                task.cancel()
+            if self.checkpoint:
+                self.checkpoint.save()
+
+        logger.info(f"Ingestion finished: {self.stats.summary()}")
+        return self.stats
+
+    async def _fetch_worker(self, pending: asyncio.Queue, decoded: asyncio.Queue):
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            try:
+                response = await self.http_client.get(item.image_url)
+                response.raise_for_status()
+                contents = response.content
+                if len(contents) > settings.MAX_IMAGE_SIZE:
+                    raise ImageDecodeError(f"Image too large: {len(contents)} bytes")
+                self.stats.fetched += 1
+
+                image_hash = hashlib.sha256(contents).hexdigest()
+                if not self.force and image_hash == item.image_hash:
+                    self.stats.skipped_unchanged += 1
+                    self._done(item)
+                    continue
+
+                array = await asyncio.to_thread(decode_image, contents)
+                await decoded.put((item, image_hash, array))
+            except (httpx.HTTPError, ImageDecodeError) as e:
+                self.stats.failed += 1
+                logger.warning(f"Skipping {item.provider}/{item.external_id}: {e}")
+                self._done(item)
+            except Exception as e:
+                # Anything else (e.g. httpx.InvalidURL) must not kill the worker:
+                # once all fetchers are gone run() blocks on the full queue
+                self.stats.failed += 1
+                logger.warning(f"Skipping {item.provider}/{item.external_id}: {type(e).__name__}: {e}")
+                self._done(item)
+
+    async def _embed_worker(self, decoded: asyncio.Queue):
+        batch = []
+        write: Optional[asyncio.Task] = None
+        while True:
+            entry = await decoded.get()
+            if entry is not None:
+                batch.append(entry)
+            if batch and (entry is None or len(batch) >= self.batch_size):
+                try:
+                    embeddings = await asyncio.to_thread(self.encode, to_pixel_values([a for _, _, a in batch]))
+                except Exception as e:
+                    # Losing the embedder would leave run() waiting on a full queue forever
+                    self.stats.failed += len(batch)
+                    logger.error(f"Embedding a batch of {len(batch)} images failed: {e}")
+                    for item, _, _ in batch:
+                        self._done(item)
+                    batch = []
+                    if entry is None:
+                        break
+                    continue
+                self.stats.embedded += len(batch)
+                # Overlap the DB write of this batch with embedding the next one
+                if write is not None:
+                    await write
+                write = asyncio.create_task(self._write(
+                    [(item, image_hash, emb) for (item, image_hash, _), emb in zip(batch, embeddings)]
+                ))
+                batch = []
+            if entry is None:
+                break
+        if write is not None:
+            await write
+
+    async def _write(self, rows: List[Tuple[CatalogItem, str, np.ndarray]]):
+        try:
+            await self.writer(rows)
+            self.stats.written += len(rows)
+            self.stats.batches += 1
+        except Exception as e:
+            self.stats.failed += len(rows)
+            logger.error(f"Bulk write of {len(rows)} embeddings failed: {e}")
+        for item, _, _ in rows:
+            self._done(item)
+        if self.checkpoint:
+            self.checkpoint.save()
+
+    def _done(self, item: CatalogItem):
+        if self.checkpoint:
+            self.checkpoint.mark_done(item.seq, item.cursor)
+
+
+async def _with_stored_hashes(items: AsyncIterator[CatalogItem], chunk: int = 500) -> AsyncIterator[CatalogItem]:
+    """Attach stored hashes to feed rows in chunks, so unchanged images are skipped"""
+    buffer = []
+    async for item in items:
+        buffer.append(item)
+        if len(buffer) >= chunk:
+            await lookup_image_hashes(buffer)
+            for buffered in buffer:
+                yield buffered
+            buffer = []
+    if buffer:
+        await lookup_image_hashes(buffer)
+        for buffered in buffer:
+            yield buffered
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Embed catalog images into products.embedding")
+    parser.add_argument("--source", choices=["db", "jsonl"], default="db")
+    parser.add_argument("--feed", help="JSONL feed path (for --source jsonl)")
+    parser.add_argument("--only-missing", action="store_true", help="Only rows without an embedding (db source)")
+    parser.add_argument("--concurrency", type=int, default=settings.INGESTION_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=settings.INGESTION_BATCH_SIZE)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default=os.path.join(settings.MODEL_CACHE_DIR, "ingestion_checkpoint.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint")
+    parser.add_argument("--force", action="store_true", help="Re-embed unchanged images")
+    args = parser.parse_args()
+
+    if args.source == "jsonl" and not args.feed:
+        parser.error("--feed is required for --source jsonl")
+
+    source_id = f"jsonl:{os.path.abspath(args.feed)}" if args.source == "jsonl" else "db"
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint, source_id)
+
+    if args.source == "jsonl":
+        items = _with_stored_hashes(stream_jsonl(args.feed, checkpoint.cursor))
+    else:
+        items = stream_db_rows(checkpoint.cursor, args.only_missing, args.page_size)
+
+    backend = create_backend()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=20.0, follow_redirects=True) as client:
+        pipeline = EmbeddingIngestionPipeline(
+            encode=backend.encode,
+            http_client=client,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            checkpoint=checkpoint,
+            force=args.force,
+        )
+        stats = await pipeline.run(items)
+    print(json.dumps(stats.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
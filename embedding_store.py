@@ -0,0 +1,375 @@
+"""
+Compact embedding store
+Keeps millions of CLIP embeddings in one contiguous array, either as float16
+or as product-quantization (PQ) codes plus a codebook, with an id -> row map.
+Serializes to .npy files that can be memory-mapped back in.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+
+
+CODEC_FLOAT32 = "float32"
+CODEC_FLOAT16 = "float16"
+CODEC_PQ = "pq"
+
+PQ_CENTROIDS = 256  # 8-bit codes
+_SEARCH_CHUNK = 65536
+
+
+class EmbeddingStore:
+    """
+    Contiguous embedding storage with approximate inner-product search
+
+    float16 halves memory with negligible recall loss. PQ splits each vector
+    into pq_m sub-vectors and stores one byte per sub-vector (512-d float32 =
+    2048 bytes -> 64 bytes at pq_m=64); it has to be trained before vectors
+    can be added. Rows can carry a group (e.g. category) for filtered search.
+    """
+
+    def __init__(self, dim: Optional[int] = None, codec: Optional[str] = None, pq_m: Optional[int] = None):
+        """
+        Initialize an empty store
+
+        Args:
+            dim: Embedding dimension
+            codec: "float16", "pq" or "float32"
+            pq_m: PQ sub-quantizers; must divide dim
+        """
+        self.dim = settings.CLIP_EMBEDDING_DIM if dim is None else dim
+        self.codec = codec or settings.EMBEDDING_STORE_CODEC
+        if self.codec not in (CODEC_FLOAT32, CODEC_FLOAT16, CODEC_PQ):
+            raise ValueError(f"Unknown embedding store codec: {self.codec}")
+        self.pq_m = settings.EMBEDDING_STORE_PQ_M if pq_m is None else pq_m
+        if self.codec == CODEC_PQ and self.dim % self.pq_m:
+            raise ValueError(f"pq_m={self.pq_m} must divide dim={self.dim}")
+
+        self.codebook: Optional[np.ndarray] = None  # (pq_m, 256, dim // pq_m)
+        self._data = np.empty((0, self._row_width), dtype=self._dtype)
+        self._groups = np.empty(0, dtype=np.int32)
+        self._count = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._group_names: List[str] = []
+        self._group_codes: Dict[str, int] = {}
+        self._mmapped = False
+
+    @property
+    def size(self) -> int:
+        return self._count
+
+    @property
+    def trained(self) -> bool:
+        return self.codec != CODEC_PQ or self.codebook is not None
+
+    @property
+    def _dtype(self):
+        return {CODEC_FLOAT32: np.float32, CODEC_FLOAT16: np.float16, CODEC_PQ: np.uint8}[self.codec]
+
+    @property
+    def _row_width(self) -> int:
+        return self.pq_m if self.codec == CODEC_PQ else self.dim
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def train(self, sample: np.ndarray, iterations: int = 20, seed: int = 0):
+        """Learn the PQ codebook (k-means per sub-space) from a sample of embeddings"""
+        if self.codec != CODEC_PQ:
+            return
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        if len(sample) < PQ_CENTROIDS:
+            raise ValueError(f"PQ training needs at least {PQ_CENTROIDS} vectors, got {len(sample)}")
+
+        started = time.monotonic()
+        rng = np.random.default_rng(seed)
+        dsub = self.dim // self.pq_m
+        sub = sample.reshape(len(sample), self.pq_m, dsub)
+        codebook = np.empty((self.pq_m, PQ_CENTROIDS, dsub), dtype=np.float32)
+        for m in range(self.pq_m):
+            x = sub[:, m, :]
+            centroids = x[rng.choice(len(x), PQ_CENTROIDS, replace=False)].copy()
+            for _ in range(iterations):
+                assign = self._nearest(x, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, x)
+                counts = np.bincount(assign, minlength=PQ_CENTROIDS)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+                # Re-seed empty clusters from random points
+                if not filled.all():
+                    centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+            codebook[m] = centroids
+        self.codebook = codebook
+        logger.info(f"Trained PQ codebook ({self.pq_m}x{PQ_CENTROIDS}) on {len(sample)} vectors in {time.monotonic() - started:.1f}s")
+
+    def add(self, ids: Sequence[str], embeddings: np.ndarray, groups: Optional[Sequence[Optional[str]]] = None):
+        """
+        Add or replace embeddings
+
+        Args:
+            ids: Item ids
+            embeddings: (n, dim) float embeddings
+            groups: Optional group per item (e.g. category) for filtered search
+        """
+        if not self.trained:
+            raise RuntimeError("PQ embedding store must be trained before adding vectors")
+        self._materialize()
+        encoded = self._encode(np.atleast_2d(embeddings))
+        group_codes = [self._group_code(g) for g in (groups or [None] * len(ids))]
+        self._reserve(self._count + len(ids))
+
+        new_rows = []
+        for i, item_id in enumerate(ids):
+            row = self._rows.get(item_id)
+            if row is None:
+                row = self._count + len(new_rows)
+                new_rows.append(item_id)
+                self._rows[item_id] = row
+            self._data[row] = encoded[i]
+            self._groups[row] = group_codes[i]
+        self._ids.extend(new_rows)
+        self._count += len(new_rows)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Delete items; the last row is moved into the hole so storage stays contiguous"""
+        self._materialize()
+        removed = 0
+        for item_id in ids:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                continue
+            last = self._count - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._data[row] = self._data[last]
+                self._groups[row] = self._groups[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids.pop()
+            self._count -= 1
+            removed += 1
+        return removed
+
+    def get(self, ids: Sequence[str]) -> np.ndarray:
+        """Decoded float32 embeddings for ids (all must be present)"""
+        rows = np.array([self._rows[item_id] for item_id in ids], dtype=np.int64)
+        return self._decode(self._data[rows])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        groups: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k items by inner product (cosine for normalized embeddings)
+
+        Args:
+            query: Query embedding
+            k: Number of results
+            groups: Only consider rows in these groups
+
+        Returns:
+            List of (id, score), best first
+        """
+        if self._count == 0:
+            return []
+        scores = self.scores(np.asarray(query, dtype=np.float32).reshape(-1))
+        if groups is not None:
+            codes = [self._group_codes[g] for g in groups if g in self._group_codes]
+            scores = np.where(np.isin(self._groups[:self._count], codes), scores, -np.inf)
+
+        k = min(k, self._count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[row], float(scores[row])) for row in top.tolist() if np.isfinite(scores[row])]
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Inner product of the query with every row, in row order"""
+        out = np.empty(self._count, dtype=np.float32)
+        if self.codec == CODEC_PQ:
+            # Asymmetric distance: one lookup table per sub-space, then gather + sum over codes
+            dsub = self.dim // self.pq_m
+            table = np.einsum("md,mkd->mk", query.reshape(self.pq_m, dsub), self.codebook)
+            flat = table.reshape(-1)
+            offsets = np.arange(self.pq_m, dtype=np.int64) * PQ_CENTROIDS
+            for start in range(0, self._count, _SEARCH_CHUNK):
+                end = min(start + _SEARCH_CHUNK, self._count)
+                out[start:end] = flat[self._data[start:end].astype(np.int64) + offsets].sum(axis=1)
+        else:
+            for start in range(0, self._count, _SEARCH_CHUNK):
+                end = min(start + _SEARCH_CHUNK, self._count)
+                out[start:end] = self._data[start:end].astype(np.float32) @ query
+        return out
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes used for vectors vs. the same vectors as float32"""
+        used = self._count * self._row_width * np.dtype(self._dtype).itemsize
+        if self.codebook is not None:
+            used += self.codebook.nbytes
+        float32 = self._count * self.dim * 4
+        return {
+            "codec": self.codec,
+            "items": self._count,
+            "bytes": int(used),
+            "float32_bytes": int(float32),
+            "saved_bytes": int(float32 - used),
+            "compression": round(float32 / used, 2) if used else 0.0,
+            "mmapped": self._mmapped,
+        }
+
+    def recall_report(self, exact: np.ndarray, queries: np.ndarray, k: int = 10) -> Dict[str, Any]:
+        """
+        Recall@k of this store against exact float32 search
+
+        Args:
+            exact: float32 embeddings aligned with the store's rows (see ids())
+            queries: Query embeddings
+            k: Cutoff
+        """
+        exact = np.asarray(exact, dtype=np.float32)
+        k = min(k, self._count)
+        hits = 0
+        error = 0.0
+        for query in np.atleast_2d(queries).astype(np.float32):
+            truth_scores = exact @ query
+            truth = set(np.argpartition(-truth_scores, k - 1)[:k].tolist())
+            approx = self.scores(query)
+            found = set(np.argpartition(-approx, k - 1)[:k].tolist())
+            hits += len(truth & found)
+            error += float(np.abs(approx - truth_scores).mean())
+        n = len(np.atleast_2d(queries))
+        return {
+            "codec": self.codec,
+            "k": k,
+            "queries": n,
+            f"recall@{k}": round(hits / (n * k), 4) if n and k else 0.0,
+            "mean_abs_score_error": round(error / n, 6) if n else 0.0,
+        }
+
+    def ids(self) -> List[str]:
+        """Item ids in row order"""
+        return list(self._ids)
+
+    def save(self, path: str):
+        """Write to a directory of .npy files (loadable with mmap)"""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "vectors": self._data[:self._count],
+            "groups": self._groups[:self._count],
+            "ids": np.array(self._ids, dtype=str),
+        }
+        if self.codebook is not None:
+            arrays["codebook"] = self.codebook
+        for name, array in arrays.items():
+            tmp = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp, np.ascontiguousarray(array))
+            os.replace(tmp, os.path.join(path, f"{name}.npy"))
+        # Written last: a directory without a matching meta.json is an incomplete save
+        meta = {"dim": self.dim, "codec": self.codec, "pq_m": self.pq_m, "count": self._count, "groups": self._group_names}
+        tmp = os.path.join(path, "meta.tmp.json")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        logger.info(f"Saved {self._count} {self.codec} embeddings to {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "EmbeddingStore":
+        """Load a saved store; with mmap the vectors stay on disk until first write"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        store = cls(dim=meta["dim"], codec=meta["codec"], pq_m=meta["pq_m"])
+        store._data = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        store._groups = np.load(os.path.join(path, "groups.npy"))
+        store._ids = np.load(os.path.join(path, "ids.npy")).tolist()
+        store._rows = {item_id: row for row, item_id in enumerate(store._ids)}
+        store._count = meta["count"]
+        store._group_names = list(meta["groups"])
+        store._group_codes = {name: code for code, name in enumerate(store._group_names)}
+        store._mmapped = mmap
+        codebook_path = os.path.join(path, "codebook.npy")
+        if os.path.exists(codebook_path):
+            store.codebook = np.load(codebook_path)
+        logger.info(f"Loaded {store._count} {store.codec} embeddings from {path}")
+        return store
+
+    def _encode(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {embeddings.shape[1]}")
+        if self.codec != CODEC_PQ:
+            return embeddings.astype(self._dtype)
+        dsub = self.dim // self.pq_m
+        sub = embeddings.reshape(len(embeddings), self.pq_m, dsub)
+        codes = np.empty((len(embeddings), self.pq_m), dtype=np.uint8)
+        for m in range(self.pq_m):
+            codes[:, m] = self._nearest(sub[:, m, :], self.codebook[m])
+        return codes
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        if self.codec != CODEC_PQ:
+            return rows.astype(np.float32)
+        parts = [self.codebook[m][rows[:, m]] for m in range(self.pq_m)]
+        return np.concatenate(parts, axis=1)
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * (x @ centroids.T)
+        return distances.argmin(axis=1)
+
+    def _group_code(self, group: Optional[str]) -> int:
+        if group is None:
+            return -1
+        if group not in self._group_codes:
+            self._group_codes[group] = len(self._group_names)
+            self._group_names.append(group)
+        return self._group_codes[group]
+
+    def _reserve(self, rows: int):
+        # Grow geometrically so bulk adds stay amortized O(n)
+        if rows <= len(self._data):
+            return
+        capacity = max(rows, 2 * len(self._data), 1024)
+        data = np.empty((capacity, self._row_width), dtype=self._dtype)
+        data[:self._count] = self._data[:self._count]
+        groups = np.full(capacity, -1, dtype=np.int32)
+        groups[:self._count] = self._groups[:self._count]
+        self._data, self._groups = data, groups
+
+    def _materialize(self):
+        # Memory-mapped stores are read-only; copy into RAM on first write
+        if self._mmapped:
+            self._data = np.array(self._data[:self._count])
+            self._mmapped = False
+            logger.info("Materialized memory-mapped embedding store for writing")
+
+
+def compare_codecs(
+    ids: Sequence[str],
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    codecs: Sequence[str] = (CODEC_FLOAT16, CODEC_PQ),
+    pq_m: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Build a store per codec from float32 embeddings and report memory and recall"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    reports = []
+    for codec in codecs:
+        store = EmbeddingStore(dim=embeddings.shape[1], codec=codec, pq_m=pq_m)
+        if codec == CODEC_PQ:
+            sample = embeddings[:settings.VISUAL_INDEX_TRAIN_SIZE]
+            if len(sample) < PQ_CENTROIDS:
+                logger.warning(f"Skipping PQ report: needs {PQ_CENTROIDS} embeddings, got {len(sample)}")
+                continue
+            store.train(sample)
+        store.add(ids, embeddings)
+        reports.append({**store.memory_report(), **store.recall_report(embeddings, queries, k)})
+    return reports
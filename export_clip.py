@@ -0,0 +1,118 @@
+"""
+Export and calibrate CLIP image encoder artifacts
+
+Usage:
+    python -m app.infrastructure.ml.export_clip [--calibration-dir DIR] [--samples N]
+
+Writes the int8 TorchScript and ONNX image encoders under MODEL_CACHE_DIR and
+prints the cosine drift of each backend against the fp32 embeddings.
+"""
+
+import argparse
+import json
+import os
+from typing import List
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from app.core.config import settings
+from app.infrastructure.ml.clip_backends import (
+    INT8_ARTIFACT,
+    ONNX_ARTIFACT,
+    OnnxBackend,
+    TorchFP32Backend,
+    TorchInt8Backend,
+    artifact_path,
+    build_image_encoder,
+    parity_check,
+    quantize_image_encoder,
+)
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_calibration_images(directory: str, samples: int) -> List[Image.Image]:
+    """Load up to `samples` images from a directory"""
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:samples]
+    return [Image.open(path).convert("RGB") for path in paths]
+
+
+def export_int8(encoder, example) -> str:
+    """Quantize and save the image encoder as TorchScript"""
+    import torch
+
+    path = artifact_path(INT8_ARTIFACT)
+    quantized = quantize_image_encoder(encoder)
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, example)
+    torch.jit.save(traced, path)
+    logger.info(f"Wrote {path}")
+    return path
+
+
+def export_onnx(encoder, example, opset: int) -> str:
+    """Export the fp32 image encoder to ONNX with a dynamic batch axis"""
+    import torch
+
+    path = artifact_path(ONNX_ARTIFACT)
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            (example,),
+            path,
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=opset,
+        )
+    logger.info(f"Wrote {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CLIP image encoder backends")
+    parser.add_argument("--calibration-dir", help="Directory of sample garment photos for the parity check")
+    parser.add_argument("--samples", type=int, default=64, help="Max calibration images")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--skip-export", action="store_true", help="Only run the parity check")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import CLIPProcessor
+
+    os.makedirs(settings.MODEL_CACHE_DIR, exist_ok=True)
+    processor = CLIPProcessor.from_pretrained(settings.CLIP_MODEL_NAME)
+
+    if args.calibration_dir:
+        images = load_calibration_images(args.calibration_dir, args.samples)
+        pixel_values = processor(images=images, return_tensors="np")["pixel_values"]
+    else:
+        logger.warning("No calibration images given - parity check uses random inputs")
+        crop = processor.image_processor.crop_size
+        rng = np.random.default_rng(0)
+        pixel_values = rng.standard_normal(
+            (args.samples, 3, crop["height"], crop["width"])
+        ).astype(np.float32)
+
+    if not args.skip_export:
+        encoder = build_image_encoder()
+        example = torch.from_numpy(pixel_values[:1])
+        export_onnx(encoder, example, args.opset)
+        export_int8(encoder, example)
+
+    report = parity_check(
+        TorchFP32Backend(device="cpu"),
+        [TorchInt8Backend(), OnnxBackend()],
+        pixel_values,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
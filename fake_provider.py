@@ -0,0 +1,86 @@
+"""Fake product provider with injectable latency and faults (for tests and load drills)"""
+
+from typing import List, Optional
+import asyncio
+import random
+import uuid
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.entities.garment import GarmentPrediction
+from app.infrastructure.external_apis.product_provider import ProductProvider
+
+
+class InjectedFault(RuntimeError):
+    """Error raised by FakeProvider on purpose"""
+    pass
+
+
+class FakeProvider(ProductProvider):
+    """
+    Provider returning generated products after a configurable delay
+
+    Latency and error rate are plain attributes, so a test can degrade the
+    provider mid-run (e.g. set error_rate=1.0 to trip a breaker, then back to 0
+    to watch it recover).
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        latency_s: float = 0.05,
+        jitter_s: float = 0.0,
+        error_rate: float = 0.0,
+        results: int = 10,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            name: Provider name reported in outcomes and metrics
+            latency_s: Base delay per call
+            jitter_s: Uniform random extra delay, up to this much
+            error_rate: Probability that a call raises InjectedFault
+            results: Products returned per call (capped by limit)
+            seed: Seed for reproducible jitter and faults
+        """
+        super().__init__()
+        self.name = name
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.results = results
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def search_products(
+        self,
+        prediction: GarmentPrediction,
+        limit: int = 20
+    ) -> List[ProductEntity]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s + self._rng.uniform(0, self.jitter_s))
+        if self._rng.random() < self.error_rate:
+            raise InjectedFault(f"{self.name}: injected fault")
+
+        category = prediction.category.value
+        return [
+            ProductEntity(
+                id=uuid.uuid4(),
+                provider=self.name,
+                name=f"{category.title()} {prediction.color or 'Style'} - {self.name} {i + 1}",
+                description=f"Fake {category}",
+                price=20.0 + i * 5,
+                currency="EUR",
+                image_url=f"https://example.com/{self.name}/{i + 1}.jpg",
+                product_url=f"https://example.com/{self.name}/{i + 1}",
+                category=category,
+                attributes={
+                    "external_id": f"{self.name}-{category}-{i + 1}",
+                    "color": prediction.color,
+                    "pattern": prediction.pattern,
+                },
+            )
+            for i in range(min(self.results, limit))
+        ]
+
+    async def get_product(self, product_id: str) -> ProductEntity:
+        raise NotImplementedError("FakeProvider only supports search_products")
@@ -0,0 +1,166 @@
+"""
+Shared HTTP client for e-commerce providers
+One pooled httpx.AsyncClient (HTTP/2, keep-alive, cached DNS) created at
+startup and injected into every ProductProvider, so provider calls reuse warm
+connections instead of paying a TCP + TLS handshake per search.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpcore
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+class DnsCachingBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that caches getaddrinfo results for a TTL"""
+
+    def __init__(self, ttl: float, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def connect_tcp(self, host: str, port: int, timeout=None, local_address=None, socket_options=None):
+        addresses = await self._resolve(host, port)
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # All cached addresses failed; resolve again next time
+        self._cache.pop((host, port), None)
+        raise last_error
+
+    async def connect_unix_socket(self, path: str, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        entry = self._cache.get((host, port))
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport whose connection pool uses the DNS-caching backend"""
+
+    def __init__(self, limits: httpx.Limits, http2: bool, network_backend: httpcore.AsyncNetworkBackend):
+        super().__init__(limits=limits, http2=http2)
+        # httpx does not expose network_backend, so rebuild the pool it created
+        self.pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=network_backend,
+        )
+        self._pool = self.pool
+
+    def stats(self) -> Dict[str, int]:
+        connections = self.pool.connections
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "http2": sum(1 for c in connections if "HTTP/2" in c.info()),
+        }
+
+
+class ProviderHttpClient:
+    """
+    Owns the shared provider client and its transports
+
+    Hosts listed in PROVIDER_HTTP_HOSTS get their own pool capped at
+    HTTP_MAX_CONNECTIONS_PER_HOST, so one slow marketplace cannot take every
+    connection; other hosts share the default pool.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, hosts: Optional[List[str]] = None):
+        """
+        Initialize the client
+
+        Args:
+            transport: Replaces all pooled transports (e.g. httpx.MockTransport in tests)
+            hosts: Hosts with a dedicated connection pool
+        """
+        self.dns = DnsCachingBackend(settings.HTTP_DNS_TTL_S)
+        self.transports: Dict[str, PooledTransport] = {}
+        self._counters = {"requests": 0, "responses": 0, "errors_4xx": 0, "errors_5xx": 0}
+
+        mounts = {}
+        if transport is None:
+            for host in hosts if hosts is not None else settings.PROVIDER_HTTP_HOSTS:
+                self.transports[host] = self._transport(settings.HTTP_MAX_CONNECTIONS_PER_HOST)
+                mounts[f"all://{host}"] = self.transports[host]
+            self.transports["default"] = self._transport(settings.HTTP_MAX_CONNECTIONS)
+            transport = self.transports["default"]
+
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            mounts=mounts,
+            timeout=httpx.Timeout(settings.HTTP_READ_TIMEOUT_S, connect=settings.HTTP_CONNECT_TIMEOUT_S),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            headers={"User-Agent": settings.APP_NAME},
+        )
+        logger.info(f"Initialized provider HTTP client ({len(mounts)} dedicated host pools, http2={settings.HTTP_HTTP2})")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counters, per-pool connection usage and DNS cache hits"""
+        return {
+            **self._counters,
+            # In flight, or failed before a response (timeouts, connect errors)
+            "unanswered": self._counters["requests"] - self._counters["responses"],
+            "pools": {name: transport.stats() for name, transport in self.transports.items()},
+            "dns_cache": {"entries": len(self.dns._cache), "hits": self.dns.hits, "misses": self.dns.misses},
+        }
+
+    def _transport(self, max_connections: int) -> PooledTransport:
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(settings.HTTP_MAX_KEEPALIVE, max_connections),
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+        )
+        return PooledTransport(limits, settings.HTTP_HTTP2, self.dns)
+
+    async def _on_request(self, request: httpx.Request):
+        self._counters["requests"] += 1
+
+    async def _on_response(self, response: httpx.Response):
+        self._counters["responses"] += 1
+        if response.status_code >= 500:
+            self._counters["errors_5xx"] += 1
+        elif response.status_code >= 400:
+            self._counters["errors_4xx"] += 1
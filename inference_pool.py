@@ -0,0 +1,346 @@
+"""
+Process-pool CLIP inference
+Runs the image encoder in dedicated worker processes so forward passes never
+block the API event loop. Pixel tensors and embeddings are exchanged through
+shared memory slots; only slot indices travel over the task queues.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+
+
+class _Slot:
+    """One shared-memory region holding a batch of inputs and its outputs"""
+
+    def __init__(
+        self,
+        index: int,
+        max_batch_size: int,
+        input_shape: Tuple[int, ...],
+        embedding_dim: int,
+        name: Optional[str] = None,
+    ):
+        self.index = index
+        input_bytes = max_batch_size * int(np.prod(input_shape)) * 4
+        output_bytes = max_batch_size * embedding_dim * 4
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=input_bytes + output_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.inputs = np.ndarray(
+            (max_batch_size, *input_shape), dtype=np.float32, buffer=self.shm.buf
+        )
+        self.outputs = np.ndarray(
+            (max_batch_size, embedding_dim), dtype=np.float32, buffer=self.shm.buf, offset=input_bytes
+        )
+        self.done = threading.Event()
+        self.error: Optional[str] = None
+
+    def close(self, unlink: bool = False):
+        # Views must be released before the buffer can be closed
+        self.inputs = None
+        self.outputs = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _worker_main(
+    worker_id: int,
+    backend_name: str,
+    slot_names: List[str],
+    max_batch_size: int,
+    input_shape: Tuple[int, ...],
+    embedding_dim: int,
+    torch_threads: int,
+    tasks: "mp.Queue",
+    results: "mp.Queue",
+    busy: "mp.Array",
+):
+    """Entry point of an inference worker process"""
+    import torch
+    from multiprocessing import resource_tracker
+    from app.infrastructure.ml.clip_backends import create_backend
+
+    torch.set_num_threads(torch_threads)
+    backend = create_backend(backend_name)
+
+    slots = []
+    for index, name in enumerate(slot_names):
+        slot = _Slot(index, max_batch_size, input_shape, embedding_dim, name=name)
+        # The parent owns these segments; don't let this process unlink them on exit
+        resource_tracker.unregister(slot.shm._name, "shared_memory")
+        slots.append(slot)
+
+    results.put(("ready", None, worker_id))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        index, size = task
+        slot = slots[index]
+        # Shared memory, so the parent can fail this slot even if the process dies mid-batch
+        busy[worker_id] = index
+        try:
+            # Encode straight from the shared input buffer
+            slot.outputs[:size] = backend.encode(slot.inputs[:size])
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        busy[worker_id] = -1
+        results.put(("done", index, error))
+
+    for slot in slots:
+        slot.close()
+
+
+class InferenceProcessPool:
+    """Pool of CLIP worker processes fed through shared memory"""
+
+    def __init__(
+        self,
+        num_workers: int,
+        max_batch_size: int,
+        input_shape: Tuple[int, ...],
+        embedding_dim: int = 512,
+        backend_name: Optional[str] = None,
+        torch_threads: int = 1,
+        timeout_s: float = 30.0,
+        start_timeout_s: float = 120.0,
+    ):
+        """
+        Initialize the pool (workers are spawned by start())
+
+        Args:
+            num_workers: Number of worker processes
+            max_batch_size: Max images per slot
+            input_shape: Shape of one preprocessed image, e.g. (3, 224, 224)
+            embedding_dim: Size of the image embedding
+            backend_name: Image encoder backend to load in each worker
+            torch_threads: Intra-op threads per worker
+            timeout_s: Max time to wait for a free slot, and for a worker to finish a batch
+            start_timeout_s: Max time start() waits for every worker to load its model
+        """
+        self.num_workers = max(1, num_workers)
+        self.max_batch_size = max_batch_size
+        self.input_shape = tuple(input_shape)
+        self.embedding_dim = embedding_dim
+        self.backend_name = backend_name or settings.CLIP_BACKEND
+        self.torch_threads = max(1, torch_threads)
+        self.timeout_s = timeout_s
+        self.start_timeout_s = start_timeout_s
+
+        self._slots: List[_Slot] = []
+        self._free_slots: "queue.Queue[_Slot]" = queue.Queue()
+        self._retired: set = set()
+        self._lock = threading.Lock()
+        self._processes: List[mp.Process] = []
+        self._ctx = None
+        self._tasks = None
+        self._results = None
+        self._collector: Optional[threading.Thread] = None
+        self._ready: set = set()  # worker ids that finished loading
+        self._busy = None  # slot index each worker is encoding, -1 when idle
+        self._started = False
+        self._closing = False
+        self._respawns = 0
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+
+    def start(self):
+        """
+        Allocate shared memory, spawn the workers and wait until all of them loaded the model
+
+        Raises:
+            RuntimeError: A worker exited during startup
+            TimeoutError: Workers were not ready within start_timeout_s
+        """
+        self._ctx = mp.get_context("spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._busy = self._ctx.Array("i", [-1] * self.num_workers, lock=False)
+
+        # Two slots per worker so the next batch can be staged while one runs
+        for index in range(self.num_workers * 2):
+            slot = _Slot(index, self.max_batch_size, self.input_shape, self.embedding_dim)
+            self._slots.append(slot)
+            self._free_slots.put(slot)
+
+        self._processes = [self._spawn(worker_id) for worker_id in range(self.num_workers)]
+        self._collector = threading.Thread(target=self._collect, name="clip-pool-collector", daemon=True)
+        self._collector.start()
+
+        deadline = time.monotonic() + self.start_timeout_s
+        while len(self._ready) < self.num_workers:
+            dead = [p.name for p in self._processes if not p.is_alive()]
+            if dead:
+                self.close()
+                raise RuntimeError(f"CLIP workers exited during startup: {', '.join(dead)}")
+            if time.monotonic() > deadline:
+                self.close()
+                raise TimeoutError(f"CLIP workers not ready within {self.start_timeout_s}s")
+            time.sleep(0.1)
+        self._started = True
+        logger.info(f"Started CLIP inference pool with {self.num_workers} workers")
+
+    @property
+    def ready(self) -> bool:
+        """Whether every worker has loaded its model"""
+        return self._started and len(self._ready) == self.num_workers
+
+    def run(self, pixel_values: np.ndarray) -> np.ndarray:
+        """
+        Embed a batch of preprocessed images (blocking)
+
+        Args:
+            pixel_values: Array of shape (N, *input_shape)
+
+        Returns:
+            Normalized embeddings of shape (N, embedding_dim)
+        """
+        pixel_values = np.asarray(pixel_values, dtype=np.float32)
+        output = np.empty((len(pixel_values), self.embedding_dim), dtype=np.float32)
+
+        # Dispatch all chunks first so they run on several workers at once
+        pending = []
+        try:
+            for start in range(0, len(pixel_values), self.max_batch_size):
+                chunk = pixel_values[start:start + self.max_batch_size]
+                try:
+                    slot = self._free_slots.get(timeout=self.timeout_s)
+                except queue.Empty:
+                    raise TimeoutError(f"No free CLIP inference slot within {self.timeout_s}s")
+                slot.error = None
+                slot.done.clear()
+                slot.inputs[:len(chunk)] = chunk
+                self._tasks.put((slot.index, len(chunk)))
+                pending.append((start, len(chunk), slot))
+
+            for start, size, slot in pending:
+                if not slot.done.wait(self.timeout_s):
+                    raise TimeoutError(f"CLIP worker did not answer within {self.timeout_s}s")
+                if slot.error:
+                    raise RuntimeError(f"CLIP worker failed: {slot.error}")
+                output[start:start + size] = slot.outputs[:size]
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            for _, _, slot in pending:
+                with self._lock:
+                    if slot.done.is_set():
+                        self._free_slots.put(slot)
+                    else:
+                        # Still owned by a (slow) worker; the collector frees it later
+                        self._retired.add(slot.index)
+
+        self._batches += 1
+        self._items += len(pixel_values)
+        return output
+
+    def close(self):
+        """Stop workers and release shared memory"""
+        self._closing = True
+        if self._tasks is not None:
+            for _ in self._processes:
+                self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self._results is not None:
+            self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+        for slot in self._slots:
+            slot.close(unlink=True)
+        self._processes = []
+        self._slots = []
+        self._started = False
+        logger.info("Stopped CLIP inference pool")
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker and throughput statistics"""
+        return {
+            "workers": self.num_workers,
+            "workers_ready": len(self._ready),
+            "workers_alive": sum(1 for p in self._processes if p.is_alive()),
+            "respawns": self._respawns,
+            "free_slots": self._free_slots.qsize(),
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+        }
+
+    def _spawn(self, worker_id: int) -> mp.Process:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker_id,
+                self.backend_name,
+                [slot.shm.name for slot in self._slots],
+                self.max_batch_size,
+                self.input_shape,
+                self.embedding_dim,
+                self.torch_threads,
+                self._tasks,
+                self._results,
+                self._busy,
+            ),
+            daemon=True,
+            name=f"clip-worker-{worker_id}",
+        )
+        process.start()
+        return process
+
+    def _collect(self):
+        """Route worker completions back to the waiting slots and replace dead workers"""
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            if message:
+                kind, index, payload = message
+                if kind == "ready":
+                    self._ready.add(payload)
+                else:
+                    self._finish(index, payload)
+            if self._started and not self._closing:
+                self._check_workers()
+
+    def _check_workers(self):
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            logger.error(f"CLIP worker {worker_id} died (exit code {process.exitcode}); respawning")
+            self._ready.discard(worker_id)
+            # Fail the batch it was encoding so the caller doesn't wait for the timeout
+            index = self._busy[worker_id]
+            if index >= 0:
+                self._busy[worker_id] = -1
+                self._finish(index, "worker process died")
+            self._processes[worker_id] = self._spawn(worker_id)
+            self._respawns += 1
+
+    def _finish(self, index: int, error: Optional[str]):
+        slot = self._slots[index]
+        with self._lock:
+            slot.error = error
+            slot.done.set()
+            if index in self._retired:
+                self._retired.discard(index)
+                self._free_slots.put(slot)
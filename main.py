@@ -3,7 +3,7 @@ LOOQ Backend - Main Application Entry Point
 FastAPI application for fashion recognition and outfit recommendations
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
@@ -13,6 +13,7 @@ from app.core.config import settings
 from app.core.logging import setup_logging
 from app.api.v1.router import api_router
 from app.infrastructure.database import init_db
+from app.core.registry import registry, ServiceNotReadyError
 
 
 @asynccontextmanager
@@ -21,9 +22,12 @@ async def lifespan(app: FastAPI):
     # Startup
     setup_logging()
     await init_db()
+    # Returns right away; models load in the background and /ready says
+    # "starting" until they are warmed up
+    await registry.startup()
     yield
     # Shutdown
-    # Any cleanup code here
+    await registry.shutdown()
 
 
 # Create FastAPI app
@@ -49,6 +53,12 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.exception_handler(ServiceNotReadyError)
+async def service_not_ready_handler(request: Request, exc: ServiceNotReadyError):
+    """Requests that arrive while models are still loading"""
+    return JSONResponse(content={"detail": str(exc)}, status_code=503)
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -68,6 +78,22 @@ async def health_check():
     )
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint - green only once models are loaded and warmed up"""
+    readiness = registry.readiness()
+    return JSONResponse(
+        content={"status": "ready" if readiness["ready"] else "starting", **readiness},
+        status_code=200 if readiness["ready"] else 503
+    )
+
+
+@app.get("/stats")
+async def service_stats():
+    """Runtime stats (inference batching, caches) for tuning"""
+    return registry.stats()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -3,23 +3,35 @@ Outfit Recommendation Engine
 Generates outfit combinations based on style rules (MVP: basic rules)
 """
 
-from typing import List
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
 from loguru import logger
 from decimal import Decimal
+import numpy as np
 
 from app.domain.entities.product import Product as ProductEntity
 from app.domain.entities.outfit import OutfitRecommendation, OutfitItem
 from app.domain.entities.garment import GarmentPrediction
+from app.domain.services.outfit_scoring import OutfitScorer
+from app.domain.services.style_rules import StyleRuleEngine, default_style_rules
 import uuid
 
 
 class OutfitRecommendationEngine:
     """Engine for generating outfit recommendations"""
     
-    def __init__(self):
-        """Initialize outfit recommendation engine"""
+    def __init__(self, style_rules: Optional[StyleRuleEngine] = None):
+        """
+        Initialize outfit recommendation engine
+        
+        Args:
+            style_rules: Slot and color rules (defaults to the shared engine)
+        """
         logger.info("Initialized OutfitRecommendationEngine")
-        self._style_rules = StyleRuleEngine()
+        self._style_rules = style_rules or default_style_rules()
+        self.scorer = OutfitScorer(style_rules=self._style_rules)
+        # Resolves product ids to image embeddings (set once a visual index is loaded)
+        self.embedding_lookup: Optional[Callable[[List[str]], Dict[str, np.ndarray]]] = None
     
     async def generate_outfits(
         self,
@@ -42,17 +54,16 @@ class OutfitRecommendationEngine:
         """
         logger.info(f"Generating outfits for {anchor_item.category}")
         
-        # MVP: Simple rule-based outfit generation
-        # Filter compatible items
+        # Bucket compatible items by outfit slot
         compatible_items = self._filter_compatible_items(
             anchor_item, 
             prediction,
             available_products
         )
         
-        # Generate combinations
+        # Score every combination and keep the best
         outfits = []
-        for combo in self._generate_basic_combinations(anchor_item, compatible_items, limit):
+        for combo, score in await self._generate_basic_combinations(anchor_item, prediction, compatible_items, limit):
             outfit = OutfitRecommendation(
                 id=uuid.uuid4(),
                 items=[OutfitItem(
@@ -65,7 +76,7 @@ class OutfitRecommendationEngine:
                 occasion="casual",
                 season=self._current_season(),
                 total_price=sum(item.price or Decimal(0) for item in combo),
-                compatibility_score=0.8,  # MVP: fixed score
+                compatibility_score=round(score, 4),
                 description=self._generate_outfit_description(combo)
             )
             outfits.append(outfit)
@@ -77,53 +88,32 @@ class OutfitRecommendationEngine:
         anchor: ProductEntity,
         prediction: GarmentPrediction,
         products: List[ProductEntity]
-    ) -> List[ProductEntity]:
-        """Filter products compatible with anchor item"""
-        compatible = []
-        
-        for product in products:
-            # Skip the anchor itself
-            if product.id == anchor.id:
-                continue
-            
-            # MVP: Basic compatibility rules
-            # Tops go with bottoms (jeans, pants, shorts)
-            if anchor.category in ["shirt", "t-shirt", "blouse", "sweater", "hoodie"]:
-                if product.category in ["jeans", "pants", "shorts"]:
-                    compatible.append(product)
-                # Also compatible with shoes
-                elif product.category in ["sneakers", "shoes", "boots"]:
-                    compatible.append(product)
-        
-        return compatible
+    ) -> Dict[str, List[ProductEntity]]:
+        """Products compatible with the anchor item, bucketed by slot in one pass"""
+        return self._style_rules.bucket(anchor, products)
     
-    def _generate_basic_combinations(
+    async def _generate_basic_combinations(
         self,
         anchor: ProductEntity,
-        compatible: List[ProductEntity],
+        prediction: GarmentPrediction,
+        compatible: Dict[str, List[ProductEntity]],
         limit: int
-    ) -> List[List[ProductEntity]]:
-        """Generate basic outfit combinations"""
-        combinations = []
+    ) -> List[Tuple[List[ProductEntity], float]]:
+        """Best anchor + first slot (+ second slot) combinations with their compatibility scores"""
+        # Completing slots in outfit order, e.g. bottom then shoes for a top
+        slots = list(compatible.values())
+        first = slots[0] if slots else []
+        second = slots[1] if len(slots) > 1 else []
         
-        # Separate by category
-        bottoms = [p for p in compatible if p.category in ["jeans", "pants", "shorts"]]
-        shoes = [p for p in compatible if p.category in ["sneakers", "shoes", "boots"]]
-        
-        # Generate combinations: anchor + bottom + shoe
-        for bottom in bottoms[:3]:  # Max 3 bottoms
-            for shoe in shoes[:3]:  # Max 3 shoes
-                combinations.append([anchor, bottom, shoe])
-                if len(combinations) >= limit:
-                    return combinations
-        
-        # If not enough combinations, add simpler ones
-        for bottom in bottoms[:limit]:
-            combinations.append([anchor, bottom])
-            if len(combinations) >= limit:
-                break
-        
-        return combinations[:limit]
+        embeddings = None
+        if self.embedding_lookup is not None:
+            embeddings = self.embedding_lookup([str(p.id) for p in (anchor, *first, *second)])
+        # Full cross-product, scored in one vectorized pass; off the event loop
+        # since large candidate sets take tens of milliseconds
+        return await asyncio.to_thread(
+            self.scorer.best_outfits,
+            anchor, first, second, limit, embeddings=embeddings, anchor_color=prediction.color,
+        )
     
     def _generate_outfit_description(self, items: List[ProductEntity]) -> str:
         """Generate a description for the outfit"""
@@ -142,13 +132,3 @@ class OutfitRecommendationEngine:
             return "summer"
         else:
             return "fall"
-
-
-class StyleRuleEngine:
-    """Basic style rule engine (placeholder for future ML-based rules)"""
-    
-    def __init__(self):
-        """Initialize style rules"""
-        # MVP: Empty, rules are hardcoded in outfit engine
-        pass
-
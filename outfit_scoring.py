@@ -0,0 +1,197 @@
+"""
+Outfit compatibility scoring
+Scores every anchor + bottom + shoes combination at once from pairwise
+compatibility matrices (image-embedding affinity, color harmony, price balance)
+and picks the best ones with partial top-k selection. Bottoms are processed in
+row blocks so memory stays bounded with thousands of candidates per slot.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.services.style_rules import StyleRuleEngine, default_style_rules
+from app.core.config import settings
+
+
+# Pairwise score when there is nothing to compare (unknown color, no embeddings)
+_NEUTRAL = 0.5
+
+
+class OutfitScorer:
+    """Vectorized compatibility scoring of outfit combinations"""
+
+    def __init__(
+        self,
+        style_rules: Optional[StyleRuleEngine] = None,
+        weights: Optional[Dict[str, float]] = None,
+        block_size: Optional[int] = None,
+        max_item_reuse: Optional[int] = None,
+    ):
+        """
+        Initialize the scorer
+
+        Args:
+            style_rules: Rule engine providing color harmony (defaults to the shared one)
+            weights: Per-component weights (embedding, color, price); missing
+                ones come from the OUTFIT_WEIGHT_* settings
+            block_size: Max combinations scored per block
+            max_item_reuse: Max outfits a single bottom or shoe may appear in
+        """
+        self.style_rules = style_rules or default_style_rules()
+        self.weights = {
+            "embedding": settings.OUTFIT_WEIGHT_EMBEDDING,
+            "color": settings.OUTFIT_WEIGHT_COLOR,
+            "price": settings.OUTFIT_WEIGHT_PRICE,
+            **(weights or {}),
+        }
+        self.block_size = settings.OUTFIT_SCORING_BLOCK if block_size is None else block_size
+        self.max_item_reuse = settings.OUTFIT_MAX_ITEM_REUSE if max_item_reuse is None else max_item_reuse
+
+    def best_outfits(
+        self,
+        anchor: ProductEntity,
+        bottoms: List[ProductEntity],
+        shoes: List[ProductEntity],
+        limit: int,
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        anchor_color: Optional[str] = None,
+    ) -> List[Tuple[List[ProductEntity], float]]:
+        """
+        Best-scoring combinations
+
+        Args:
+            anchor: Item the outfits are built around
+            bottoms: Candidates for the first completing slot (bottoms for a top)
+            shoes: Candidates for the second slot (outfits are anchor + bottom when empty)
+            limit: Number of outfits
+            embeddings: Image embeddings by product id
+            anchor_color: Color of the anchor (defaults to its color attribute)
+
+        Returns:
+            (items, score in [0, 1]) pairs, best first
+        """
+        if not bottoms or limit <= 0:
+            return []
+        items = [anchor, *bottoms, *shoes]
+        colors = [self._color(p) for p in items]
+        if anchor_color:
+            colors[0] = anchor_color.strip().lower()
+        harmony = _Harmony(colors, self.style_rules)
+        affinity = _Affinity(items, embeddings)
+        log_prices = self._log_prices(items)
+
+        a, b = np.array([0]), np.arange(1, 1 + len(bottoms))
+        if not shoes:
+            scores = self._combine(
+                affinity(a, b)[0], harmony(a, b)[0], self._balance([log_prices[0], log_prices[b]])
+            )
+            k = min(limit, len(bottoms))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [([anchor, bottoms[i]], float(scores[i])) for i in top.tolist()]
+
+        s = np.arange(1 + len(bottoms), len(items))
+        anchor_bottom = affinity(a, b)[0], harmony(a, b)[0]
+        anchor_shoe = affinity(a, s)[0], harmony(a, s)[0]
+        # Keep more than limit so the reuse cap can skip over repeats
+        pool = min(limit * (self.max_item_reuse + 2), len(bottoms) * len(shoes))
+        rows_per_block = max(1, self.block_size // len(shoes))
+        candidates: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for start in range(0, len(bottoms), rows_per_block):
+            block = slice(start, start + rows_per_block)
+            rows = b[block]
+            scores = self._combine(
+                (anchor_bottom[0][block][:, None] + anchor_shoe[0][None, :] + affinity(rows, s)) / 3,
+                (anchor_bottom[1][block][:, None] + anchor_shoe[1][None, :] + harmony(rows, s)) / 3,
+                self._balance([log_prices[0], log_prices[rows][:, None], log_prices[s][None, :]]),
+            ).ravel()
+            k = min(pool, scores.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates.append((scores[top], start + top // len(shoes), top % len(shoes)))
+
+        scores = np.concatenate([c[0] for c in candidates])
+        bottom_idx = np.concatenate([c[1] for c in candidates])
+        shoe_idx = np.concatenate([c[2] for c in candidates])
+        k = min(pool, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        outfits = []
+        bottom_uses: Dict[int, int] = {}
+        shoe_uses: Dict[int, int] = {}
+        for i in top.tolist():
+            bi, si = int(bottom_idx[i]), int(shoe_idx[i])
+            if bottom_uses.get(bi, 0) >= self.max_item_reuse or shoe_uses.get(si, 0) >= self.max_item_reuse:
+                continue
+            bottom_uses[bi] = bottom_uses.get(bi, 0) + 1
+            shoe_uses[si] = shoe_uses.get(si, 0) + 1
+            outfits.append(([anchor, bottoms[bi], shoes[si]], float(scores[i])))
+            if len(outfits) >= limit:
+                break
+        return outfits
+
+    def _combine(self, affinity: np.ndarray, harmony: np.ndarray, balance: np.ndarray) -> np.ndarray:
+        w = self.weights
+        total = w["embedding"] + w["color"] + w["price"]
+        return ((w["embedding"] * affinity + w["color"] * harmony + w["price"] * balance) / total).astype(np.float32)
+
+    @staticmethod
+    def _log_prices(items: List[ProductEntity]) -> np.ndarray:
+        prices = np.array([float(p.price) if p.price else np.nan for p in items], dtype=np.float64)
+        known = ~np.isnan(prices)
+        # Unknown prices count as the median, so they don't skew the balance
+        fill = np.median(prices[known]) if known.any() else 1.0
+        return np.log(np.where(known, prices, fill)).astype(np.float32)
+
+    @staticmethod
+    def _balance(log_prices: List[np.ndarray]) -> np.ndarray:
+        """exp(-variance of log prices): 1 for equal prices, ~0.3 when one item costs 10x another"""
+        mean = sum(log_prices) / len(log_prices)
+        variance = sum((lp - mean) ** 2 for lp in log_prices) / len(log_prices)
+        return np.exp(-variance)
+
+    @staticmethod
+    def _color(product: ProductEntity) -> Optional[str]:
+        color = (product.attributes or {}).get("color")
+        return color.strip().lower() if isinstance(color, str) and color.strip() else None
+
+
+class _Harmony:
+    """Pairwise color harmony, looked up in a small palette x palette table"""
+
+    def __init__(self, colors: List[Optional[str]], style_rules: StyleRuleEngine):
+        palette = sorted({c for c in colors if c})
+        index = {c: i + 1 for i, c in enumerate(palette)}  # 0 = unknown color
+        self.table = np.full((len(palette) + 1, len(palette) + 1), _NEUTRAL, dtype=np.float32)
+        self.table[1:, 1:] = style_rules.harmony_table(palette, _NEUTRAL)
+        self.ids = np.array([index.get(c, 0) for c in colors])
+
+    def __call__(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return self.table[self.ids[x][:, None], self.ids[y][None, :]]
+
+
+class _Affinity:
+    """Pairwise image-embedding cosine similarity mapped to [0, 1]"""
+
+    def __init__(self, items: List[ProductEntity], embeddings: Optional[Dict[str, np.ndarray]]):
+        self.known = np.array([bool(embeddings) and str(p.id) in embeddings for p in items])
+        self.vectors = None
+        # Pairs involving an item without an embedding get the typical affinity
+        self.fill = _NEUTRAL
+        if self.known.sum() < 2:
+            return
+        dim = len(next(iter(embeddings.values())))
+        self.vectors = np.zeros((len(items), dim), dtype=np.float32)
+        rows = np.flatnonzero(self.known)
+        self.vectors[rows] = [embeddings[str(items[i].id)] for i in rows]
+        self.vectors[rows] /= np.linalg.norm(self.vectors[rows], axis=1, keepdims=True) + 1e-12
+        sample = self.vectors[rows[:256]]
+        pairs = (sample @ sample.T + 1) / 2
+        self.fill = float((pairs.sum() - np.trace(pairs)) / max(1, len(sample) * (len(sample) - 1)))
+
+    def __call__(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        if self.vectors is None:
+            return np.full((len(x), len(y)), self.fill, dtype=np.float32)
+        affinity = (self.vectors[x] @ self.vectors[y].T + 1) / 2
+        return np.where(self.known[x][:, None] & self.known[y][None, :], affinity, np.float32(self.fill))
@@ -1,25 +1,25 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from app.domain.services.style_rules import StyleRuleEngine, default_style_rules
 
 class OutfitService:
-    def __init__(self):
-        # Basic rules: category -> list of compatible categories
-        self.rules = {
-            "top": ["pants", "shorts", "skirts"],
-            "shirt": ["trousers", "jeans"],
-            "t-shirt": ["shorts", "jeans", "joggers"],
-            "pants": ["shirt", "t-shirt", "sweater"],
-        }
-        
-        # Color harmony rules (very basic)
-        self.color_rules = {
-            "white": ["black", "blue", "grey", "navy"],
-            "black": ["white", "grey", "red", "beige"],
-            "blue": ["white", "grey", "beige"],
-        }
+    def __init__(self, style_rules: Optional[StyleRuleEngine] = None):
+        # Rules live in style_rules.yaml, shared with the outfit engine
+        self.style_rules = style_rules or default_style_rules()
+
+    @property
+    def rules(self) -> Dict[str, List[str]]:
+        # Category -> list of compatible categories
+        return self.style_rules.pairings()
+
+    @property
+    def color_rules(self) -> Dict[str, List[str]]:
+        # Color harmony rules
+        return self.style_rules.color_rules()
 
     async def get_recommended_outfits(self, category: str, attributes: Dict) -> List[Dict]:
         # Anchor item category
-        anchors = self.rules.get(category, ["pants"])
+        anchors = self.style_rules.rules.pairings.get(category, ("pants",))
         
         # Mocking some products for the outfit
         outfits = []
@@ -1,7 +1,8 @@
 """Product database model"""
 
-from sqlalchemy import Column, String, DateTime, Numeric, Text, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, Index, Integer, Numeric, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from pgvector.sqlalchemy import Vector
 from datetime import datetime
 import uuid
 
@@ -25,14 +26,28 @@ class Product(Base):
     category = Column(String(50), nullable=False, index=True)
     attributes = Column(JSONB, nullable=True)  # brand, color, size, etc.
     metadata = Column(JSONB, nullable=True)  # provider-specific data
+    embedding = Column(Vector(512), nullable=True)  # CLIP image embedding, HNSW-indexed
+    image_hash = Column(String(64), nullable=True)  # sha256 of the embedded image bytes
+    content_hash = Column(String(64), nullable=True)  # sha256 of the synced catalog fields
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Unique constraint on provider + external_id
     __table_args__ = (
         UniqueConstraint('provider', 'external_id', name='uq_product_provider_external'),
+        Index('ix_products_provider_category', 'provider', 'category'),
     )
     
     def __repr__(self):
         return f"<Product(id={self.id}, name={self.name[:50]}, provider={self.provider})>"
 
+
+class CatalogSyncState(Base):
+    """Last successful catalog sync per provider and category"""
+    __tablename__ = "catalog_sync_state"
+    
+    provider = Column(String(50), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    synced_at = Column(DateTime, nullable=False)
+    items = Column(Integer, nullable=False, default=0)  # products seen in the last crawl
+    changed = Column(Integer, nullable=False, default=0)  # of which inserted or updated
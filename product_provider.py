@@ -1,7 +1,10 @@
 """Base class for product providers"""
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
+import httpx
+from loguru import logger
 from app.domain.entities.product import Product as ProductEntity
 from app.domain.entities.garment import GarmentPrediction
 
@@ -9,6 +12,16 @@ from app.domain.entities.garment import GarmentPrediction
 class ProductProvider(ABC):
     """Abstract base class for e-commerce product providers"""
     
+    name: str = "provider"
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: Shared pooled client (see ProviderHttpClient); providers
+                never build their own
+        """
+        self.http_client = http_client
+    
     @abstractmethod
     async def search_products(
         self, 
@@ -39,4 +52,31 @@ class ProductProvider(ABC):
             Product entity
         """
         pass
+    
+    async def get_products(self, product_ids: List[str]) -> Dict[str, ProductEntity]:
+        """
+        Get many products by ID
+        
+        The default issues get_product calls concurrently; providers with a
+        batch endpoint (e.g. PA-API GetItems) should override it.
+        
+        Args:
+            product_ids: Provider product identifiers
+            
+        Returns:
+            Found products by identifier (failed or unknown ones are left out)
+        """
+        results = await asyncio.gather(
+            *(self.get_product(product_id) for product_id in product_ids), return_exceptions=True
+        )
+        found = {}
+        for product_id, result in zip(product_ids, results):
+            if isinstance(result, NotImplementedError):
+                # Same for every id; no point logging each
+                return {}
+            if isinstance(result, Exception):
+                logger.warning(f"{self.name} lookup of {product_id} failed: {result}")
+                continue
+            found[product_id] = result
+        return found
 
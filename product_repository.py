@@ -0,0 +1,78 @@
+"""Read access to the products table as domain entities"""
+
+from typing import Dict, List
+import uuid
+from sqlalchemy import select
+
+from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.database.models.product import Product
+
+
+# Columns needed to build an entity (skips the embedding and bookkeeping columns)
+ENTITY_COLUMNS = (
+    Product.id, Product.provider, Product.external_id, Product.name, Product.description, Product.price,
+    Product.currency, Product.image_url, Product.product_url, Product.affiliate_link,
+    Product.category, Product.attributes,
+)
+
+
+def to_entity(row) -> ProductEntity:
+    """Domain entity from a row selected with ENTITY_COLUMNS"""
+    return ProductEntity(
+        id=row.id,
+        provider=row.provider,
+        name=row.name,
+        description=row.description,
+        price=float(row.price) if row.price is not None else None,
+        currency=row.currency,
+        image_url=row.image_url,
+        product_url=row.product_url,
+        affiliate_link=row.affiliate_link,
+        category=row.category,
+        attributes=row.attributes or {},
+    )
+
+
+async def fetch_by_ids(session_factory, product_ids: List[str]) -> Dict[str, ProductEntity]:
+    """
+    Products by id, in one query
+
+    Args:
+        session_factory: Async session factory
+        product_ids: Product ids; ones that are not UUIDs are ignored
+
+    Returns:
+        Found products, keyed by the ids as given (any UUID spelling)
+    """
+    requested: Dict[uuid.UUID, List[str]] = {}
+    for product_id in product_ids:
+        try:
+            requested.setdefault(uuid.UUID(str(product_id)), []).append(product_id)
+        except ValueError:
+            continue
+    if not requested:
+        return {}
+    async with session_factory() as session:
+        rows = (await session.execute(select(*ENTITY_COLUMNS).where(Product.id.in_(list(requested))))).all()
+    found = {}
+    for row in rows:
+        entity = to_entity(row)
+        for product_id in requested.get(row.id, ()):
+            found[product_id] = entity
+    return found
+
+
+async def fetch_by_external_ids(session_factory, provider: str, external_ids: List[str]) -> Dict[str, ProductEntity]:
+    """
+    Products of one provider by the provider's own ids, in one query
+
+    Returns:
+        Found products by external id
+    """
+    if not external_ids:
+        return {}
+    async with session_factory() as session:
+        rows = (await session.execute(
+            select(*ENTITY_COLUMNS).where(Product.provider == provider, Product.external_id.in_(external_ids))
+        )).all()
+    return {row.external_id: to_entity(row) for row in rows}
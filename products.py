@@ -1,16 +1,15 @@
 """Products endpoints"""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import List
 from loguru import logger
 
 from app.domain.entities.product import Product as ProductEntity
 from app.domain.entities.garment import GarmentPrediction, GarmentCategory
-from app.infrastructure.external_apis.aggregator import ProductAggregator
+from app.core.registry import registry
 from app.core.config import settings
 
 router = APIRouter()
-aggregator = ProductAggregator()
 
 
 @router.post("/search", response_model=List[ProductEntity])
@@ -40,7 +39,7 @@ async def search_products(prediction: GarmentPrediction):
             )
         
         # Search products
-        products = await aggregator.search_products(
+        products = await registry.aggregator.search_products(
             prediction,
             limit=settings.SIMILAR_PRODUCTS_LIMIT
         )
@@ -55,3 +54,26 @@ async def search_products(prediction: GarmentPrediction):
         logger.error(f"Error searching products: {e}")
         raise HTTPException(status_code=500, detail=f"Error searching products: {str(e)}")
 
+
+@router.get("", response_model=List[ProductEntity])
+async def get_products(ids: List[str] = Query(..., description="Product ids or provider:external_id")):
+    """
+    Look up many products at once (e.g. the items of saved outfits)
+    
+    Args:
+        ids: Product ids
+        
+    Returns:
+        Found products, in request order (unknown ids are left out)
+    """
+    if len(ids) > settings.MAX_PRODUCT_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_PRODUCT_LOOKUP_IDS} ids per request"
+        )
+    try:
+        found = await registry.aggregator.get_products(ids)
+    except Exception as e:
+        logger.error(f"Error looking up products: {e}")
+        raise HTTPException(status_code=500, detail=f"Error looking up products: {str(e)}")
+    return [found[product_id] for product_id in dict.fromkeys(ids) if product_id in found]
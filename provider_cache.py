@@ -0,0 +1,210 @@
+"""
+Provider search cache
+Caches each provider's results per normalized query with stale-while-revalidate:
+fresh entries are served as-is, stale ones are served immediately while a
+background refresh replaces them. Expired entries are kept a while longer as a
+fallback for when the provider fails or is skipped by its circuit breaker.
+An in-process LRU sits in front of Redis.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import msgpack
+from loguru import logger
+
+from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.cache.redis_client import get_redis
+from app.core.config import settings
+
+
+CACHE_FRESH = "fresh"
+CACHE_STALE = "stale"
+CACHE_MISS = "miss"
+CACHE_FALLBACK = "fallback"
+
+
+def encode_products(products: List[ProductEntity], fetched_at: float) -> bytes:
+    """msgpack with the field names stored once, rows as plain arrays"""
+    dumped = [p.model_dump(mode="json") for p in products]
+    fields = list(dumped[0].keys()) if dumped else []
+    return msgpack.packb(
+        {"t": fetched_at, "f": fields, "r": [[row[f] for f in fields] for row in dumped]},
+        use_bin_type=True,
+    )
+
+
+def decode_products(payload: bytes) -> Tuple[float, List[ProductEntity]]:
+    data = msgpack.unpackb(payload, raw=False)
+    fields = data["f"]
+    return data["t"], [ProductEntity.model_validate(dict(zip(fields, row))) for row in data["r"]]
+
+
+class ProviderSearchCache:
+    """Two-tier (in-process LRU + Redis) cache of per-provider search results"""
+
+    def __init__(
+        self,
+        fresh_ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        fallback_ttl: Optional[float] = None,
+        redis_client: Any = None,
+        use_redis: bool = True,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            fresh_ttl: Seconds an entry is served without refreshing
+            stale_ttl: Further seconds a stale entry may be served while it refreshes
+            max_entries: Max entries kept in the in-process tier
+            fallback_ttl: Further seconds an expired entry is kept, served only
+                when fetching fails
+            redis_client: Optional Redis client (defaults to the shared one; any
+                object with async get/set works, e.g. a fake in tests)
+            use_redis: Disable to run with the in-process tier only
+        """
+        self.fresh_ttl = settings.PROVIDER_CACHE_FRESH_S if fresh_ttl is None else fresh_ttl
+        self.stale_ttl = settings.PROVIDER_CACHE_STALE_S if stale_ttl is None else stale_ttl
+        self.max_entries = settings.PROVIDER_CACHE_L1_SIZE if max_entries is None else max_entries
+        self.fallback_ttl = settings.PROVIDER_CACHE_FALLBACK_S if fallback_ttl is None else fallback_ttl
+        self._redis = redis_client
+        self._use_redis = use_redis
+
+        self._local: "OrderedDict[str, Tuple[float, List[ProductEntity]]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._counters = {
+            "fresh_hits": 0, "stale_hits": 0, "misses": 0, "fallback_hits": 0,
+            "refreshes": 0, "refresh_errors": 0, "redis_errors": 0,
+        }
+
+    @staticmethod
+    def key_for(provider: str, query_key: Tuple) -> str:
+        """Cache key from a provider name and ProductAggregator.query_key()"""
+        return "psearch:" + ":".join([provider, *("" if part is None else str(part) for part in query_key)])
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[List[ProductEntity]]],
+        refresh: Optional[Callable[[], Awaitable[List[ProductEntity]]]] = None,
+    ) -> Tuple[List[ProductEntity], str]:
+        """
+        Serve from cache, or fetch and store
+
+        Args:
+            key: Cache key (see key_for)
+            fetch: Called on a miss; the caller waits for it
+            refresh: Called in the background for stale entries (defaults to fetch)
+
+        Returns:
+            (products, "fresh" | "stale" | "miss" | "fallback"); fallback is an
+            expired entry served because fetch raised
+        """
+        fallback = None
+        entry = await self._get(key)
+        if entry is not None:
+            fetched_at, products = entry
+            age = time.time() - fetched_at
+            if age < self.fresh_ttl:
+                self._counters["fresh_hits"] += 1
+                return products, CACHE_FRESH
+            if age < self.fresh_ttl + self.stale_ttl:
+                self._counters["stale_hits"] += 1
+                self._schedule_refresh(key, refresh or fetch)
+                return products, CACHE_STALE
+            fallback = products
+
+        self._counters["misses"] += 1
+        try:
+            products = await fetch()
+        except Exception as e:
+            if fallback is None:
+                raise
+            self._counters["fallback_hits"] += 1
+            logger.warning(f"Serving expired {key} after fetch failed: {e}")
+            return fallback, CACHE_FALLBACK
+        await self.set(key, products)
+        return products, CACHE_MISS
+
+    async def set(self, key: str, products: List[ProductEntity]):
+        """Store fresh results in both tiers"""
+        fetched_at = time.time()
+        self._store_local(key, fetched_at, products)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(
+                    key, encode_products(products, fetched_at), ex=int(self._retention())
+                )
+            except Exception as e:
+                self._counters["redis_errors"] += 1
+                logger.warning(f"Provider cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._counters["fresh_hits"] + self._counters["stale_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "l1_entries": len(self._local),
+            "refreshing": len(self._refreshing),
+        }
+
+    async def _get(self, key: str) -> Optional[Tuple[float, List[ProductEntity]]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            if time.time() - entry[0] < self._retention():
+                self._local.move_to_end(key)
+                return entry
+            del self._local[key]
+
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            payload = await redis.get(key)
+            if payload is None:
+                return None
+            fetched_at, products = decode_products(payload)
+        except Exception as e:
+            self._counters["redis_errors"] += 1
+            logger.warning(f"Provider cache read failed: {e}")
+            return None
+        self._store_local(key, fetched_at, products)
+        return fetched_at, products
+
+    def _retention(self) -> float:
+        return self.fresh_ttl + self.stale_ttl + self.fallback_ttl
+
+    def _schedule_refresh(self, key: str, refresh: Callable[[], Awaitable[List[ProductEntity]]]):
+        # One refresh per key at a time
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await self.set(key, await refresh())
+                self._counters["refreshes"] += 1
+            except Exception as e:
+                self._counters["refresh_errors"] += 1
+                logger.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(run())
+
+    def _get_redis(self):
+        if not self._use_redis:
+            return None
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def _store_local(self, key: str, fetched_at: float, products: List[ProductEntity]):
+        self._local[key] = (fetched_at, products)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
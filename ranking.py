@@ -0,0 +1,130 @@
+"""
+Relevance ranking
+Scores candidate products against the recognized garment in one vectorized
+pass: image-embedding similarity, attribute matches and price, combined with
+configurable weights. Top-k uses partial selection instead of a full sort.
+"""
+
+from typing import Dict, List, Optional
+import numpy as np
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.entities.garment import GarmentPrediction
+from app.core.config import settings
+
+
+class RelevanceRanker:
+    """Weighted linear relevance score over product features"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize the ranker
+
+        Args:
+            weights: Per-feature weights (similarity, category, color, pattern,
+                style, price); missing ones come from the RANK_WEIGHT_* settings
+        """
+        self.weights = {
+            "similarity": settings.RANK_WEIGHT_SIMILARITY,
+            "category": settings.RANK_WEIGHT_CATEGORY,
+            "color": settings.RANK_WEIGHT_COLOR,
+            "pattern": settings.RANK_WEIGHT_PATTERN,
+            "style": settings.RANK_WEIGHT_STYLE,
+            "price": settings.RANK_WEIGHT_PRICE,
+            **(weights or {}),
+        }
+
+    def rank(
+        self,
+        products: List[ProductEntity],
+        prediction: GarmentPrediction,
+        limit: int,
+        query_embedding: Optional[np.ndarray] = None,
+        product_embeddings: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[ProductEntity]:
+        """
+        Top products by relevance, best first
+
+        Args:
+            products: Candidates
+            prediction: Recognized garment
+            limit: Number of products to return
+            query_embedding: Embedding of the photo
+            product_embeddings: Image embeddings by product id (products without
+                one get the mean similarity, so they are neither boosted nor buried)
+
+        Returns:
+            Up to limit products
+        """
+        if not products:
+            return []
+        scores = self.scores(products, prediction, query_embedding, product_embeddings)
+        k = min(limit, len(products))
+        # Partial selection, then order only the k winners (index breaks ties stably)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(products) else np.arange(len(products))
+        top = top[np.lexsort((top, -scores[top]))]
+        return [products[i] for i in top.tolist()]
+
+    def scores(
+        self,
+        products: List[ProductEntity],
+        prediction: GarmentPrediction,
+        query_embedding: Optional[np.ndarray] = None,
+        product_embeddings: Optional[Dict[str, np.ndarray]] = None,
+    ) -> np.ndarray:
+        """Relevance score per product"""
+        n = len(products)
+        w = self.weights
+        score = np.zeros(n, dtype=np.float32)
+
+        if query_embedding is not None and product_embeddings and w["similarity"]:
+            score += w["similarity"] * self._similarity(products, query_embedding, product_embeddings)
+
+        attributes = [p.attributes or {} for p in products]
+        names = [p.name.lower() for p in products]
+        score += w["category"] * np.fromiter(
+            (p.category == prediction.category.value for p in products), dtype=np.float32, count=n
+        )
+        for feature in ("color", "pattern", "style"):
+            wanted = getattr(prediction, feature, None)
+            if not w[feature] or not wanted:
+                continue
+            wanted = wanted.strip().lower()
+            score += w[feature] * np.fromiter(
+                (
+                    str(attrs.get(feature) or "").lower() == wanted or wanted in name
+                    for attrs, name in zip(attributes, names)
+                ),
+                dtype=np.float32,
+                count=n,
+            )
+
+        if w["price"]:
+            prices = np.array([p.price if p.price is not None else np.nan for p in products], dtype=np.float64)
+            known = ~np.isnan(prices)
+            if known.any():
+                low, high = prices[known].min(), prices[known].max()
+                # Cheapest = 1, most expensive = 0; unknown prices get nothing
+                cheapness = np.zeros(n, dtype=np.float32)
+                cheapness[known] = 1.0 if high == low else (high - prices[known]) / (high - low)
+                score += w["price"] * cheapness
+        return score
+
+    @staticmethod
+    def _similarity(
+        products: List[ProductEntity],
+        query_embedding: np.ndarray,
+        product_embeddings: Dict[str, np.ndarray],
+    ) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        rows = [i for i, p in enumerate(products) if str(p.id) in product_embeddings]
+        similarity = np.zeros(len(products), dtype=np.float32)
+        if not rows:
+            return similarity
+        matrix = np.asarray([product_embeddings[str(products[i].id)] for i in rows], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        known = matrix @ query
+        similarity[:] = known.mean()
+        similarity[rows] = known
+        return similarity
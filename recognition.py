@@ -1,43 +1,98 @@
-import torch
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
+from transformers import CLIPProcessor
 import numpy as np
+from typing import List, Optional, Union
 
-from app.domain.entities.garment import GarmentPrediction, GarmentCategory
+from app.domain.entities.garment import GarmentPrediction
 from app.services.outfits import OutfitService
 from app.services.vector_search import VectorSearchService
 from app.core.config import settings
-from sqlalchemy.orm import Session
+from app.infrastructure.ml.batching import InferenceBatcher
+from app.infrastructure.ml.inference_pool import InferenceProcessPool
+from app.infrastructure.ml.clip_backends import create_backend
+from app.infrastructure.ml.zero_shot import ZeroShotClassifier
+from app.infrastructure.ml.image_decode import to_pixel_values
 
 class RecognitionService:
-    def __init__(self, db: Session = None):
+    def __init__(self, vector_search: Optional[VectorSearchService] = None):
         # We will initialize the models here. 
         # Using CLIP as the primary feature extractor.
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = CLIPModel.from_pretrained(settings.CLIP_MODEL_NAME).to(self.device)
         self.processor = CLIPProcessor.from_pretrained(settings.CLIP_MODEL_NAME)
+        crop = self.processor.image_processor.crop_size
+        # Side length of the model input; decode_image() output of this size skips the processor
+        self.input_size = crop["height"]
+        self.backend = None
+        self.pool = None
+        if settings.CLIP_INFERENCE_WORKERS > 0:
+            # Forward passes run in worker processes; this process only preprocesses
+            self.pool = InferenceProcessPool(
+                num_workers=settings.CLIP_INFERENCE_WORKERS,
+                max_batch_size=settings.CLIP_BATCH_MAX_SIZE,
+                input_shape=(3, crop["height"], crop["width"]),
+                embedding_dim=settings.CLIP_EMBEDDING_DIM,
+                torch_threads=settings.CLIP_WORKER_TORCH_THREADS,
+                timeout_s=settings.CLIP_INFERENCE_TIMEOUT_S,
+                start_timeout_s=settings.CLIP_INFERENCE_START_TIMEOUT_S,
+            )
+            self.pool.start()
+        else:
+            self.backend = create_backend(settings.CLIP_BACKEND)
+        # Text embeddings are computed once (or loaded from cache) at startup
+        self.classifier = ZeroShotClassifier()
         self.outfit_service = OutfitService()
-        self.vector_search = VectorSearchService(db) if db else None
+        self.vector_search = vector_search
+        # Concurrent recognize() calls share batched forward passes
+        self.batcher = InferenceBatcher(
+            self._embed_batch,
+            max_batch_size=settings.CLIP_BATCH_MAX_SIZE,
+            max_wait_ms=settings.CLIP_BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=max(1, settings.CLIP_INFERENCE_WORKERS),
+        )
 
-    async def recognize(self, image: Image.Image) -> GarmentPrediction:
-        # 1. Extract features using CLIP
-        inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-        with torch.no_grad():
-            image_features = self.model.get_image_features(**inputs)
-        
-        # Normalize features
-        image_features /= image_features.norm(p=2, dim=-1, keepdim=True)
-        features_list = image_features.cpu().numpy().tolist()[0]
+    async def embed(self, image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        """
+        Get the normalized CLIP embedding for one image
+
+        Accepts a PIL image or a pre-sized RGB array from decode_image().
+        """
+        return await self.batcher.submit(image)
+
+    async def embed_many(self, images: List[Union[Image.Image, np.ndarray]]) -> List[np.ndarray]:
+        """Get embeddings for several images, batched into as few passes as possible"""
+        return await self.batcher.submit_many(images)
+
+    def inference_stats(self) -> dict:
+        """Batching queue depth and batch size stats"""
+        stats = self.batcher.stats()
+        if self.pool:
+            stats["pool"] = self.pool.stats()
+        return stats
+
+    async def close(self):
+        await self.batcher.close()
+        if self.pool:
+            self.pool.close()
+
+    async def recognize(
+        self, image: Union[Image.Image, np.ndarray], embedding: Optional[np.ndarray] = None
+    ) -> GarmentPrediction:
+        # 1. Extract features using CLIP (batched with concurrent requests),
+        # unless the caller already has the embedding
+        image_features = embedding if embedding is not None else await self.embed(image)
+        features_list = image_features.tolist()
         
-        # 2. Classify (currently mock)
-        category = GarmentCategory.SHIRT
+        # 2. Zero-shot classify against the precomputed prompt matrix
+        classification = self.classifier.classify(image_features)
+        category = classification.category
         
         # 3. Get outfits and similar products
         outfits = await self.outfit_service.get_recommended_outfits(category.value, {"features": features_list})
         
         similar_products = []
         if self.vector_search:
-            similar_products_objs = self.vector_search.find_similar_products(features_list)
+            similar_products_objs = await self.vector_search.find_similar_products(
+                features_list, category=category.value
+            )
             similar_products = [
                 {"name": p.name, "price": p.price, "image_url": p.image_url} 
                 for p in similar_products_objs
@@ -51,8 +106,43 @@ class RecognitionService:
         
         return GarmentPrediction(
             category=category,
-            confidence=0.95,
-            attributes={"features_extracted": True},
+            confidence=classification.confidence,
+            color=classification.color,
+            pattern=classification.pattern,
+            attributes={
+                "features_extracted": True,
+                "color_confidence": classification.color_confidence,
+                "pattern_confidence": classification.pattern_confidence,
+            },
             outfits=outfits,
             similar_products=similar_products
         )
+
+    def _embed_batch(self, images: List[Union[Image.Image, np.ndarray]]) -> List[np.ndarray]:
+        """Run one CLIP forward pass over a batch of images"""
+        pixel_values = self._preprocess(images)
+        if self.pool:
+            return list(self.pool.run(pixel_values))
+        # Backends return normalized features
+        return list(self.backend.encode(pixel_values))
+
+    def _preprocess(self, images: List[Union[Image.Image, np.ndarray]]) -> np.ndarray:
+        """Build the pixel batch, normalizing pre-sized arrays without the processor"""
+        image_processor = self.processor.image_processor
+        presized = [
+            isinstance(img, np.ndarray) and img.shape == (self.input_size, self.input_size, 3)
+            for img in images
+        ]
+        pixel_values = np.empty((len(images), 3, self.input_size, self.input_size), dtype=np.float32)
+
+        fast = [i for i, ok in enumerate(presized) if ok]
+        if fast:
+            pixel_values[fast] = to_pixel_values(
+                [images[i] for i in fast], image_processor.image_mean, image_processor.image_std
+            )
+        slow = [i for i, ok in enumerate(presized) if not ok]
+        if slow:
+            pixel_values[slow] = self.processor(
+                images=[images[i] for i in slow], return_tensors="np"
+            )["pixel_values"]
+        return pixel_values
@@ -0,0 +1,27 @@
+"""Shared async Redis connection"""
+
+from typing import Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Get the process-wide Redis client (created lazily from REDIS_URL)"""
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.REDIS_URL)
+        logger.info("Initialized Redis client")
+    return _client
+
+
+async def close_redis():
+    """Close the shared Redis client"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,201 @@
+"""
+Service registry
+Single place where models and shared services are created, warmed up and shut
+down. Initialized from the application lifespan: cheap services are created
+right away and models load in the background, so /health and /ready
+("starting") answer while the weights load. Every router uses the same instances.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.services.recognition import RecognitionService
+from app.services.vector_search import VectorSearchService
+from app.infrastructure.external_apis.aggregator import ProductAggregator
+from app.infrastructure.external_apis.http_client import ProviderHttpClient
+from app.infrastructure.external_apis.catalog_sync import CatalogMirror, CatalogSync
+from app.infrastructure.cache.analysis_cache import AnalysisCache
+from app.infrastructure.cache.provider_cache import ProviderSearchCache
+from app.infrastructure.cache.redis_client import close_redis
+from app.infrastructure.ml.visual_search import VisualSearchEngine
+from app.domain.services.outfit_engine import OutfitRecommendationEngine
+
+
+class ServiceNotReadyError(RuntimeError):
+    """A service was requested before the registry finished starting up"""
+    pass
+
+
+class ServiceRegistry:
+    """Holds the process-wide service instances"""
+
+    def __init__(self):
+        self._recognition: Optional[RecognitionService] = None
+        self._aggregator: Optional[ProductAggregator] = None
+        self._outfit_engine: Optional[OutfitRecommendationEngine] = None
+        self._visual_search: Optional[VisualSearchEngine] = None
+        self.http_client: Optional[ProviderHttpClient] = None
+        self.provider_cache: Optional[ProviderSearchCache] = None
+        self.catalog_mirror: Optional[CatalogMirror] = None
+        self.catalog_sync: Optional[CatalogSync] = None
+        self.analysis_cache: Optional[AnalysisCache] = None
+        self._components: Dict[str, bool] = {
+            "recognition_model": False,
+            "warmup": False,
+            "visual_index": False,
+        }
+        self._startup_seconds: Optional[float] = None
+        self._startup_error: Optional[str] = None
+        self._loading: Optional[asyncio.Task] = None
+        self._background: List[asyncio.Task] = []
+
+    @property
+    def ready(self) -> bool:
+        return all(self._components.values())
+
+    @property
+    def recognition(self) -> RecognitionService:
+        return self._require(self._recognition, "recognition")
+
+    @property
+    def aggregator(self) -> ProductAggregator:
+        return self._require(self._aggregator, "aggregator")
+
+    @property
+    def outfit_engine(self) -> OutfitRecommendationEngine:
+        return self._require(self._outfit_engine, "outfit_engine")
+
+    @property
+    def visual_search(self) -> VisualSearchEngine:
+        return self._require(self._visual_search, "visual_search")
+
+    async def startup(self):
+        """Create the cheap services and start loading models in the background"""
+        started = time.monotonic()
+
+        # Cheap services first so non-ML endpoints work while weights load
+        self.http_client = ProviderHttpClient()
+        self.provider_cache = ProviderSearchCache() if settings.PROVIDER_CACHE_ENABLED else None
+        self.catalog_mirror = CatalogMirror() if settings.CATALOG_MIRROR_ENABLED else None
+        self._aggregator = ProductAggregator(
+            http_client=self.http_client.client, cache=self.provider_cache, mirror=self.catalog_mirror
+        )
+        if settings.CATALOG_SYNC_ENABLED:
+            self.catalog_sync = CatalogSync(http_client=self.http_client.client)
+            self._background.append(asyncio.create_task(self.catalog_sync.run()))
+        self._outfit_engine = OutfitRecommendationEngine()
+        self.analysis_cache = AnalysisCache() if settings.ANALYSIS_CACHE_ENABLED else None
+
+        self._loading = asyncio.create_task(self._load_models(started))
+
+    async def _load_models(self, started: float):
+        """Load models, warm them up and map the visual index"""
+        try:
+            await self._load_and_warm_up(started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._startup_error = f"{type(e).__name__}: {e}"
+            logger.exception(f"Service registry startup failed: {self._startup_error}")
+
+    async def _load_and_warm_up(self, started: float):
+        # Loading weights is blocking; keep the event loop free for /health
+        vector_search = VectorSearchService() if settings.VECTOR_SEARCH_ENABLED else None
+        self._recognition = await asyncio.to_thread(RecognitionService, vector_search)
+        self._components["recognition_model"] = True
+
+        await self.warm_up()
+        self._components["warmup"] = True
+
+        # Maps the last snapshot from disk
+        self._visual_search = await asyncio.to_thread(
+            VisualSearchEngine, embedder=self._recognition.embed, product_lookup=self._aggregator.get_products
+        )
+        self._components["visual_index"] = True
+        self._aggregator.embedding_lookup = self._visual_search.embeddings_for
+        self._outfit_engine.embedding_lookup = self._visual_search.embeddings_for
+        self._background.append(asyncio.create_task(self._visual_search.run_snapshots()))
+
+        self._startup_seconds = round(time.monotonic() - started, 2)
+        logger.info(f"Service registry ready in {self._startup_seconds}s")
+
+    async def warm_up(self):
+        """Run a dummy batch so the first real request doesn't pay for lazy init"""
+        pool = self._recognition.pool
+        if pool is not None:
+            # A respawned worker may still be loading its model
+            deadline = time.monotonic() + settings.CLIP_INFERENCE_START_TIMEOUT_S
+            while not pool.ready:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("CLIP inference workers not ready for warm-up")
+                await asyncio.sleep(0.1)
+        size = self._recognition.input_size
+        dummy = [np.zeros((size, size, 3), dtype=np.uint8)] * max(1, settings.WARMUP_BATCH_SIZE)
+        started = time.monotonic()
+        embeddings = await self._recognition.batcher.submit_many(dummy)
+        self._recognition.classifier.classify(embeddings[0])
+        logger.info(f"Warm-up batch of {len(dummy)} took {time.monotonic() - started:.2f}s")
+
+    async def shutdown(self):
+        """Release models, worker processes and connections"""
+        if self._loading is not None:
+            # A blocking load already handed to a thread still finishes there
+            self._loading.cancel()
+            await asyncio.gather(self._loading, return_exceptions=True)
+            self._loading = None
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+        if self._visual_search is not None:
+            await asyncio.to_thread(self._visual_search.snapshot)
+        if self._recognition is not None:
+            await self._recognition.close()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        await close_redis()
+        for name in self._components:
+            self._components[name] = False
+
+    def readiness(self) -> Dict[str, Any]:
+        readiness = {"ready": self.ready, "components": dict(self._components)}
+        if self._startup_error:
+            readiness["error"] = self._startup_error
+        return readiness
+
+    def stats(self) -> Dict[str, Any]:
+        """Runtime stats of the registered services"""
+        stats: Dict[str, Any] = {"ready": self.ready, "startup_seconds": self._startup_seconds}
+        if self._recognition is not None:
+            stats["inference"] = self._recognition.inference_stats()
+            if self._recognition.vector_search is not None:
+                stats["vector_search"] = {"singleflight": self._recognition.vector_search.flight.stats()}
+        if self.analysis_cache is not None:
+            stats["analysis_cache"] = self.analysis_cache.stats()
+        if self._visual_search is not None:
+            stats["visual_index"] = self._visual_search.stats()
+        if self._aggregator is not None:
+            stats["providers"] = self._aggregator.stats()
+        if self.provider_cache is not None:
+            stats["provider_cache"] = self.provider_cache.stats()
+        if self.catalog_mirror is not None:
+            stats["catalog_mirror"] = self.catalog_mirror.stats()
+        if self.catalog_sync is not None:
+            stats["catalog_sync"] = self.catalog_sync.stats()
+        if self.http_client is not None:
+            stats["provider_http"] = self.http_client.stats()
+        return stats
+
+    @staticmethod
+    def _require(service, name: str):
+        if service is None:
+            raise ServiceNotReadyError(f"Service '{name}' is not initialized yet")
+        return service
+
+
+registry = ServiceRegistry()
@@ -0,0 +1,92 @@
+"""Data files that reload themselves when they change on disk"""
+
+import os
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+from loguru import logger
+
+
+T = TypeVar("T")
+
+
+class ReloadableFile(Generic[T]):
+    """Value loaded from a file and swapped in again whenever the file changes"""
+
+    def __init__(
+        self,
+        path: str,
+        loader: Callable[[str], T],
+        check_interval: float = 5.0,
+        background: bool = False,
+    ):
+        """
+        Initialize and load the file
+
+        Args:
+            path: File to watch
+            loader: Function turning the file path into the value
+            check_interval: Min seconds between modification-time checks
+            background: Rebuild in a thread and keep serving the old value
+                meanwhile (for expensive loaders)
+        """
+        self.path = path
+        self._loader = loader
+        self.check_interval = check_interval
+        self.background = background
+
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._last_check = time.monotonic()
+        self._mtime: Optional[float] = None
+        self._value: T = None
+        self.reload()
+
+    @property
+    def value(self) -> T:
+        """Current value, reloading first if the file changed"""
+        self._maybe_reload()
+        return self._value
+
+    def reload(self) -> T:
+        """Load the file now and swap the value in"""
+        mtime = os.stat(self.path).st_mtime
+        value = self._loader(self.path)
+        with self._lock:
+            self._value = value
+            self._mtime = mtime
+        logger.info(f"Loaded {self.path}")
+        return value
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        if self.background:
+            threading.Thread(target=self._safe_reload, daemon=True).start()
+        else:
+            self._safe_reload()
+
+    def _safe_reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            # Keep serving the previous value on a bad edit
+            logger.error(f"Reloading {self.path} failed: {e}")
+        finally:
+            self._reloading = False
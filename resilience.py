@@ -0,0 +1,248 @@
+"""
+Provider resilience
+Circuit breaker plus adaptive (AIMD) concurrency limit around each provider,
+so a degraded marketplace is skipped quickly instead of tying up sockets and
+coroutines on every request.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.entities.garment import GarmentPrediction
+from app.infrastructure.external_apis.product_provider import ProductProvider
+from app.core.config import settings
+
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class ProviderUnavailableError(RuntimeError):
+    """The provider was not called: breaker open or concurrency limit reached"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Count-based rolling window of call outcomes
+
+    Opens when the failure rate or the slow-call rate over the window crosses
+    its threshold. After open_s it lets a few probe calls through (half-open);
+    if they all succeed it closes again, any failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_s: Optional[float] = None,
+        slow_rate: Optional[float] = None,
+        open_s: Optional[float] = None,
+        half_open_probes: Optional[int] = None,
+    ):
+        self.min_calls = settings.PROVIDER_BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.failure_rate = settings.PROVIDER_BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.slow_call_s = settings.PROVIDER_SLOW_CALL_MS / 1000 if slow_call_s is None else slow_call_s
+        self.slow_rate = settings.PROVIDER_BREAKER_SLOW_RATE if slow_rate is None else slow_rate
+        self.open_s = settings.PROVIDER_BREAKER_OPEN_S if open_s is None else open_s
+        self.half_open_probes = (
+            settings.PROVIDER_BREAKER_HALF_OPEN_PROBES if half_open_probes is None else half_open_probes
+        )
+
+        # (failed, slow) per call
+        self._window: Deque[Tuple[bool, bool]] = deque(
+            maxlen=settings.PROVIDER_BREAKER_WINDOW if window is None else window
+        )
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        # Bumped on every transition; calls are tagged with it when allowed
+        self.generation = 0
+        self.transitions = {STATE_OPEN: 0, STATE_HALF_OPEN: 0, STATE_CLOSED: 0}
+
+    @property
+    def state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            self._transition(STATE_HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN and self._probes_started < self.half_open_probes:
+            self._probes_started += 1
+            return True
+        return False
+
+    def record(self, failed: bool, latency_s: float, generation: Optional[int] = None):
+        """
+        Record the outcome of an allowed call
+
+        Args:
+            failed: Whether the call raised
+            latency_s: Call duration
+            generation: The breaker's generation when the call was allowed
+        """
+        slow = latency_s >= self.slow_call_s
+        if self._state == STATE_HALF_OPEN:
+            if generation != self.generation:
+                # Started before this half-open period, so it is not a probe
+                return
+            if failed or slow:
+                self._transition(STATE_OPEN)
+                return
+            self._probes_succeeded += 1
+            if self._probes_succeeded >= self.half_open_probes:
+                self._transition(STATE_CLOSED)
+            return
+
+        self._window.append((failed, slow))
+        if self._state == STATE_CLOSED and len(self._window) >= self.min_calls:
+            failures, slows = self._rates()
+            if failures >= self.failure_rate or slows >= self.slow_rate:
+                self._transition(STATE_OPEN)
+
+    def abandon(self, generation: int):
+        """An allowed call ended without an outcome (cancelled); frees its probe slot"""
+        if self._state == STATE_HALF_OPEN and generation == self.generation:
+            self._probes_started -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        failures, slows = self._rates()
+        return {
+            "state": self.state,
+            "failure_rate": round(failures, 3),
+            "slow_rate": round(slows, 3),
+            "window_calls": len(self._window),
+            "transitions": dict(self.transitions),
+        }
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._window:
+            return 0.0, 0.0
+        n = len(self._window)
+        return sum(f for f, _ in self._window) / n, sum(s for _, s in self._window) / n
+
+    def _transition(self, state: str):
+        self._state = state
+        self.generation += 1
+        self.transitions[state] += 1
+        if state == STATE_OPEN:
+            self._opened_at = time.monotonic()
+        if state in (STATE_OPEN, STATE_HALF_OPEN):
+            self._probes_started = 0
+            self._probes_succeeded = 0
+        if state == STATE_CLOSED:
+            self._window.clear()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit
+
+    Each fast success raises the limit by 1/limit (about +1 per limit's worth
+    of calls); a failure or a slow call multiplies it by backoff. Calls over
+    the limit are rejected rather than queued.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        target_latency_s: Optional[float] = None,
+        backoff: Optional[float] = None,
+    ):
+        self.limit = float(settings.PROVIDER_LIMIT_INITIAL if initial is None else initial)
+        self.min_limit = settings.PROVIDER_LIMIT_MIN if min_limit is None else min_limit
+        self.max_limit = settings.PROVIDER_LIMIT_MAX if max_limit is None else max_limit
+        self.target_latency_s = (
+            settings.PROVIDER_SLOW_CALL_MS / 1000 if target_latency_s is None else target_latency_s
+        )
+        self.backoff = settings.PROVIDER_LIMIT_BACKOFF if backoff is None else backoff
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, failed: bool, latency_s: float):
+        self.in_flight -= 1
+        if failed or latency_s >= self.target_latency_s:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def abandon(self):
+        """Give a slot back without adjusting the limit (call not made or cancelled)"""
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": int(self.limit), "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+class ResilientProvider(ProductProvider):
+    """Wraps a provider with a circuit breaker and an adaptive concurrency limit"""
+
+    def __init__(
+        self,
+        provider: ProductProvider,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        super().__init__(provider.http_client)
+        self.provider = provider
+        self.name = provider.name
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveLimiter()
+        self.skipped = 0
+
+    async def search_products(self, prediction: GarmentPrediction, limit: int = 20) -> List[ProductEntity]:
+        # Limiter first: a rejection here must not use up a half-open probe slot
+        if not self.limiter.try_acquire():
+            self.skipped += 1
+            raise ProviderUnavailableError(f"{self.name}: concurrency limit {int(self.limiter.limit)} reached")
+        if not self.breaker.allow():
+            self.limiter.abandon()
+            self.skipped += 1
+            raise ProviderUnavailableError(f"{self.name}: circuit {self.breaker.state}")
+
+        generation = self.breaker.generation
+        started = time.monotonic()
+        try:
+            result = await self.provider.search_products(prediction, limit=limit)
+        except asyncio.CancelledError:
+            # Deadline or a winning hedge: says nothing about the provider
+            self.limiter.abandon()
+            self.breaker.abandon(generation)
+            raise
+        except Exception:
+            latency = time.monotonic() - started
+            self.limiter.release(True, latency)
+            self.breaker.record(True, latency, generation)
+            raise
+        latency = time.monotonic() - started
+        self.limiter.release(False, latency)
+        self.breaker.record(False, latency, generation)
+        return result
+
+    async def get_product(self, product_id: str) -> ProductEntity:
+        return await self.provider.get_product(product_id)
+
+    async def get_products(self, product_ids: List[str]) -> Dict[str, ProductEntity]:
+        return await self.provider.get_products(product_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.stats(), "limiter": self.limiter.stats(), "skipped": self.skipped}
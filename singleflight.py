@@ -0,0 +1,71 @@
+"""Collapse concurrent identical async calls into one in-flight execution"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    One in-flight execution per key, result fanned out to every caller
+
+    Callers that arrive while a call for the same key is running wait for it
+    instead of starting their own. A caller being cancelled only detaches that
+    caller; the shared call is cancelled once nobody is waiting for it.
+    Results are not kept after the call finishes - this is not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._counters = {"calls": 0, "executions": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn, or join the in-flight call for the same key
+
+        Args:
+            key: Identity of the call
+            fn: Coroutine function producing the result
+
+        Returns:
+            The shared result (exceptions are shared too)
+        """
+        self._counters["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            self._counters["executions"] += 1
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        else:
+            self._counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            # shield: cancelling one waiter must not cancel the shared task
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._counters["abandoned"] += 1
+                self._forget(key, call)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "in_flight": len(self._calls)}
+
+    def _forget(self, key: Hashable, call: _Call):
+        # A newer call may already own the key
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,166 @@
+"""
+Style rules
+Outfit compatibility rules compiled from style_rules.yaml into lookup tables:
+category -> slot, slot -> completing slots, and per-color bitmasks of
+compatible colors. Shared by OutfitService and OutfitRecommendationEngine and
+reloaded when the file changes.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import yaml
+
+from app.domain.entities.product import Product as ProductEntity
+from app.core.config import settings
+from app.core.reloadable import ReloadableFile
+
+
+DEFAULT_STYLE_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style_rules.yaml")
+
+
+@dataclass(frozen=True)
+class StyleRules:
+    """Compiled rule index"""
+    category_slot: Dict[str, str]
+    completions: Dict[str, Tuple[str, ...]]
+    pairings: Dict[str, Tuple[str, ...]]
+    color_rules: Dict[str, Tuple[str, ...]]  # as written, for display
+    color_bits: Dict[str, int]  # color -> bit
+    color_masks: Dict[str, int]  # color -> bits of the colors it goes with
+
+    def colors_match(self, a: str, b: str) -> Optional[bool]:
+        """Whether two colors go together, or None when neither has rules"""
+        mask_a, mask_b = self.color_masks.get(a, 0), self.color_masks.get(b, 0)
+        if not mask_a and not mask_b:
+            return None
+        return bool(mask_a & self.color_bits.get(b, 0))
+
+
+def load_style_rules(path: str) -> StyleRules:
+    """
+    Read and compile a style rule file
+
+    Raises:
+        ValueError: A category is in two slots, or an outfit refers to an unknown slot
+    """
+    with open(path) as f:
+        raw = yaml.safe_load(f) or {}
+
+    category_slot: Dict[str, str] = {}
+    for slot, categories in (raw.get("slots") or {}).items():
+        for category in categories:
+            if category in category_slot:
+                raise ValueError(f"Category {category!r} is in slots {category_slot[category]!r} and {slot!r}")
+            category_slot[category] = slot
+
+    known_slots = set(category_slot.values())
+    completions = {}
+    for slot, parts in (raw.get("outfits") or {}).items():
+        unknown = [p for p in [slot, *parts] if p not in known_slots]
+        if unknown:
+            raise ValueError(f"Outfit rule for {slot!r} refers to unknown slots {unknown}")
+        completions[slot] = tuple(parts)
+
+    pairings = {category: tuple(matches) for category, matches in (raw.get("pairings") or {}).items()}
+
+    color_rules = {
+        color.lower(): tuple(m.lower() for m in matches) for color, matches in (raw.get("colors") or {}).items()
+    }
+    palette = sorted(set(color_rules) | {m for matches in color_rules.values() for m in matches})
+    color_bits = {color: 1 << i for i, color in enumerate(palette)}
+    color_masks = dict.fromkeys(palette, 0)
+    for color, matches in color_rules.items():
+        for match in matches:
+            color_masks[color] |= color_bits[match]
+            color_masks[match] |= color_bits[color]
+
+    return StyleRules(category_slot, completions, pairings, color_rules, color_bits, color_masks)
+
+
+class StyleRuleEngine:
+    """Style rules loaded from a data file, reloaded when it changes"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the engine
+
+        Args:
+            path: Rule file (defaults to STYLE_RULES_PATH, or the bundled style_rules.yaml)
+        """
+        self.path = path or settings.STYLE_RULES_PATH or DEFAULT_STYLE_RULES_PATH
+        self._rules = ReloadableFile(
+            self.path, load_style_rules, check_interval=settings.STYLE_RULES_RELOAD_INTERVAL_S
+        )
+
+    @property
+    def rules(self) -> StyleRules:
+        return self._rules.value
+
+    def reload(self):
+        """Re-read the rule file now"""
+        self._rules.reload()
+
+    def slot_of(self, category: str) -> Optional[str]:
+        return self.rules.category_slot.get(category)
+
+    def bucket(self, anchor: ProductEntity, products: List[ProductEntity]) -> Dict[str, List[ProductEntity]]:
+        """
+        Products that can complete an outfit around the anchor, by slot
+
+        Args:
+            anchor: Item the outfit is built around
+            products: Candidates (the anchor itself is skipped)
+
+        Returns:
+            Slot -> products, one entry per completing slot in outfit order
+            (empty when the anchor's slot has no outfit rule)
+        """
+        rules = self.rules
+        buckets: Dict[str, List[ProductEntity]] = {
+            slot: [] for slot in rules.completions.get(rules.category_slot.get(anchor.category), ())
+        }
+        if not buckets:
+            return buckets
+        category_slot = rules.category_slot
+        for product in products:
+            bucket = buckets.get(category_slot.get(product.category))
+            if bucket is not None and product.id != anchor.id:
+                bucket.append(product)
+        return buckets
+
+    def pairings(self) -> Dict[str, List[str]]:
+        """Category -> categories suggested with it"""
+        return {category: list(matches) for category, matches in self.rules.pairings.items()}
+
+    def color_rules(self) -> Dict[str, List[str]]:
+        """Color -> colors it goes with, as written in the rule file"""
+        return {color: list(matches) for color, matches in self.rules.color_rules.items()}
+
+    def harmony_table(self, palette: List[str], neutral: float) -> np.ndarray:
+        """
+        Pairwise harmony over a palette
+
+        Returns:
+            (len(palette), len(palette)) table: 1 for matching colors, 0 for
+            colors the rules don't pair, neutral when neither color has rules
+            or both are the same
+        """
+        rules = self.rules
+        table = np.full((len(palette), len(palette)), neutral, dtype=np.float32)
+        for x, cx in enumerate(palette):
+            for y, cy in enumerate(palette):
+                match = rules.colors_match(cx, cy)
+                if match:
+                    table[x, y] = 1.0
+                elif match is False and cx != cy:
+                    table[x, y] = 0.0
+        return table
+
+
+@lru_cache(maxsize=1)
+def default_style_rules() -> StyleRuleEngine:
+    """Process-wide engine on the configured rule file"""
+    return StyleRuleEngine()
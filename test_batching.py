@@ -0,0 +1,28 @@
+"""Inference batcher tests"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.infrastructure.ml.batching import InferenceBatcher
+
+
+def _slow_identity(items):
+    time.sleep(0.2)
+    return items
+
+
+@pytest.mark.asyncio
+async def test_close_fails_collected_and_queued_requests():
+    batcher = InferenceBatcher(_slow_identity, max_batch_size=2, max_wait_ms=1, max_concurrent_batches=1)
+    running = [asyncio.create_task(batcher.submit(i)) for i in range(2)]
+    await asyncio.sleep(0.05)
+    # Two are collected and wait for the busy slot, two stay queued
+    waiting = [asyncio.create_task(batcher.submit(i)) for i in range(2, 6)]
+    await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(batcher.close(), 2)
+    assert await asyncio.gather(*running) == [0, 1]
+    for result in await asyncio.gather(*waiting, return_exceptions=True):
+        assert isinstance(result, RuntimeError)
@@ -0,0 +1,97 @@
+"""Near-duplicate product detection tests"""
+
+import uuid
+
+import numpy as np
+
+from app.domain.entities.product import Product as ProductEntity
+from app.domain.services.deduplication import ProductDeduplicator
+
+
+def _product(name: str, price: float, provider: str) -> ProductEntity:
+    return ProductEntity(
+        id=uuid.uuid4(),
+        provider=provider,
+        name=name,
+        description=None,
+        price=price,
+        currency="EUR",
+        image_url="https://example.com/image.jpg",
+        product_url=f"https://{provider}.example.com/{uuid.uuid4()}",
+        category="jeans",
+        attributes={},
+    )
+
+
+def _names(products):
+    return sorted(p.name for p in products)
+
+
+def test_color_variants_are_not_merged():
+    products = [
+        _product("Levi's 501 Original Jeans Blue", 89.90, "amazon"),
+        _product("Levi's 501 Original Jeans Black", 89.90, "zalando"),
+    ]
+    assert len(ProductDeduplicator().deduplicate(products)) == 2
+
+
+def test_model_numbers_must_match():
+    products = [
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+        _product("Nike Air Max 95 White", 139.0, "zalando"),
+    ]
+    assert len(ProductDeduplicator().deduplicate(products)) == 2
+
+
+def test_same_provider_listings_are_kept():
+    products = [
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+    ]
+    assert len(ProductDeduplicator().deduplicate(products)) == 2
+
+
+def test_same_title_needs_matching_price_without_embeddings():
+    products = [
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+        _product("Nike Air Max 90 White", 59.0, "zalando"),
+    ]
+    assert len(ProductDeduplicator().deduplicate(products)) == 2
+
+
+def test_cross_provider_duplicate_keeps_cheapest_offer():
+    products = [
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+        _product("Nike Air Max 90 - White", 135.0, "zalando"),
+    ]
+    [kept] = ProductDeduplicator().deduplicate(products)
+    assert kept.provider == "zalando"
+    assert [offer["provider"] for offer in kept.attributes["duplicate_offers"]] == ["amazon"]
+
+
+def test_embeddings_override_price_agreement():
+    products = [
+        _product("Nike Air Max 90 White", 139.0, "amazon"),
+        _product("Nike Air Max 90 White", 139.0, "zalando"),
+    ]
+    rng = np.random.default_rng(0)
+    embeddings = {str(p.id): rng.standard_normal(64).astype(np.float32) for p in products}
+    # Unrelated images: same title and price are not enough
+    assert len(ProductDeduplicator().deduplicate(products, embeddings)) == 2
+
+
+def test_mock_provider_results_stay_distinct():
+    products = [_product(f"Shirt Blue - Mock Product {i + 1}", 29.99 + i * 10, "amazon") for i in range(5)]
+    products += [_product(f"Shirt Blue - Zalando Mock {i + 1}", 39.99 + i * 15, "zalando") for i in range(5)]
+    assert _names(ProductDeduplicator().deduplicate(products)) == _names(products)
+
+
+def test_empty_titles_are_not_merged():
+    products = [_product("", 10.0, "amazon"), _product("", 10.0, "zalando")]
+    assert len(ProductDeduplicator().deduplicate(products)) == 2
+
+
+def test_explicit_zero_arguments_are_kept():
+    deduplicator = ProductDeduplicator(title_threshold=0.0, price_tolerance=0.0)
+    assert deduplicator.title_threshold == 0.0
+    assert deduplicator.price_tolerance == 0.0
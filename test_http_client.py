@@ -0,0 +1,65 @@
+"""Shared provider HTTP client tests"""
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.infrastructure.external_apis.aggregator import ProductAggregator
+from app.infrastructure.external_apis.http_client import ProviderHttpClient
+
+
+def _mock_transport(status_by_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/down":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(status_by_path.get(request.url.path, 200), json={})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_providers_share_the_injected_client():
+    http = ProviderHttpClient(transport=_mock_transport({}))
+    try:
+        aggregator = ProductAggregator(http_client=http.client)
+        assert aggregator.providers
+        assert all(provider.http_client is http.client for provider in aggregator.providers)
+    finally:
+        await http.aclose()
+
+
+@pytest.mark.asyncio
+async def test_dedicated_hosts_get_their_own_capped_pool(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_HTTP2", False)
+    http = ProviderHttpClient(hosts=["api.example.com"])
+    try:
+        dedicated = http.transports["api.example.com"]
+        default = http.transports["default"]
+        assert dedicated is not default
+        assert dedicated.pool._max_connections == settings.HTTP_MAX_CONNECTIONS_PER_HOST
+        assert default.pool._max_connections == settings.HTTP_MAX_CONNECTIONS
+
+        assert http.client._transport_for_url(httpx.URL("https://api.example.com/search")) is dedicated
+        assert http.client._transport_for_url(httpx.URL("https://other.example.com/search")) is default
+        assert set(http.stats()["pools"]) == {"api.example.com", "default"}
+    finally:
+        await http.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stats_count_requests_responses_and_errors():
+    http = ProviderHttpClient(transport=_mock_transport({"/missing": 404, "/broken": 503}))
+    try:
+        for path in ["/ok", "/missing", "/broken"]:
+            await http.client.get(f"https://api.example.com{path}")
+        with pytest.raises(httpx.ConnectError):
+            await http.client.get("https://api.example.com/down")
+
+        stats = http.stats()
+        assert stats["requests"] == 4
+        assert stats["responses"] == 3
+        assert stats["errors_4xx"] == 1
+        assert stats["errors_5xx"] == 1
+        assert stats["unanswered"] == 1
+    finally:
+        await http.aclose()
@@ -0,0 +1,129 @@
+"""Provider search cache tests (stale-while-revalidate over a fake Redis)"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.cache.provider_cache import (
+    CACHE_FRESH,
+    CACHE_MISS,
+    CACHE_STALE,
+    ProviderSearchCache,
+    decode_products,
+    encode_products,
+)
+
+
+class FakeRedis:
+    """Just the async get/set the cache uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+def _products(n: int = 3, provider: str = "amazon"):
+    return [
+        ProductEntity(
+            id=uuid.uuid4(),
+            provider=provider,
+            name=f"Shirt {i}",
+            description="Cotton shirt",
+            price=19.99 + i,
+            currency="EUR",
+            image_url=f"https://example.com/{i}.jpg",
+            product_url=f"https://example.com/{i}",
+            category="shirt",
+            attributes={"color": "blue", "sizes": ["S", "M"]},
+        )
+        for i in range(n)
+    ]
+
+
+class Fetcher:
+    def __init__(self, products):
+        self.products = products
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.products
+
+
+def test_msgpack_round_trip():
+    products = _products()
+    fetched_at, decoded = decode_products(encode_products(products, 1234.5))
+    assert fetched_at == 1234.5
+    assert [p.model_dump(mode="json") for p in decoded] == [p.model_dump(mode="json") for p in products]
+    assert decode_products(encode_products([], 1.0)) == (1.0, [])
+
+
+@pytest.mark.asyncio
+async def test_fresh_hit_is_served_from_redis_without_fetching():
+    redis = FakeRedis()
+    fetch = Fetcher(_products())
+    writer = ProviderSearchCache(fresh_ttl=60, stale_ttl=60, fallback_ttl=60, redis_client=redis)
+    products, status = await writer.get_or_fetch("psearch:amazon:shirt", fetch)
+    assert status == CACHE_MISS
+    assert redis.expiry["psearch:amazon:shirt"] == 180
+
+    # Another process: empty in-process tier, same Redis
+    reader = ProviderSearchCache(fresh_ttl=60, stale_ttl=60, fallback_ttl=60, redis_client=redis)
+    cached, status = await reader.get_or_fetch("psearch:amazon:shirt", fetch)
+    assert status == CACHE_FRESH
+    assert fetch.calls == 1
+    assert [p.id for p in cached] == [p.id for p in products]
+    assert reader.stats()["fresh_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_hit_is_served_and_refreshed_in_background():
+    redis = FakeRedis()
+    old, new = _products(), _products()
+    cache = ProviderSearchCache(fresh_ttl=0, stale_ttl=60, fallback_ttl=60, redis_client=redis)
+    await cache.get_or_fetch("k", Fetcher(old))
+
+    refresh = Fetcher(new)
+    served, status = await cache.get_or_fetch("k", Fetcher(old), refresh=refresh)
+    assert status == CACHE_STALE
+    assert [p.id for p in served] == [p.id for p in old]
+
+    # Only one refresh per key while it runs
+    await cache.get_or_fetch("k", Fetcher(old), refresh=refresh)
+    await asyncio.gather(*cache._refreshing.values())
+    assert refresh.calls == 1
+    assert cache.stats()["refreshes"] == 1
+    assert [p.id for p in decode_products(redis.data["k"])[1]] == [p.id for p in new]
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_fetch_and_local_tier():
+    fetch = Fetcher(_products())
+    cache = ProviderSearchCache(fresh_ttl=60, stale_ttl=60, fallback_ttl=60, redis_client=BrokenRedis())
+
+    products, status = await cache.get_or_fetch("k", fetch)
+    assert status == CACHE_MISS
+    assert len(products) == 3
+    # Read and write both failed, without failing the search
+    assert cache.stats()["redis_errors"] == 2
+
+    _, status = await cache.get_or_fetch("k", fetch)
+    assert status == CACHE_FRESH
+    assert fetch.calls == 1
@@ -0,0 +1,135 @@
+"""Circuit breaker, adaptive limit and cache fallback tests"""
+
+import asyncio
+
+import pytest
+
+from app.domain.entities.garment import GarmentPrediction, GarmentCategory
+from app.infrastructure.cache.provider_cache import CACHE_FALLBACK, ProviderSearchCache
+from app.infrastructure.external_apis.aggregator import ProductAggregator, STATUS_OK
+from app.infrastructure.external_apis.fake_provider import FakeProvider, InjectedFault
+from app.infrastructure.external_apis.resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    ProviderUnavailableError,
+    ResilientProvider,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+)
+
+
+PREDICTION = GarmentPrediction(category=GarmentCategory.SHIRT, confidence=1.0)
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        window=10, min_calls=4, failure_rate=0.5, slow_call_s=1.0, slow_rate=0.9, open_s=0.05, half_open_probes=2
+    )
+
+
+def _limiter(initial: int = 4) -> AdaptiveLimiter:
+    return AdaptiveLimiter(initial=initial, min_limit=1, max_limit=8, target_latency_s=1.0, backoff=0.5)
+
+
+async def _call(provider: ResilientProvider):
+    try:
+        return await provider.search_products(PREDICTION, limit=5)
+    except InjectedFault:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_half_opens_and_closes():
+    fake = FakeProvider(latency_s=0.0, error_rate=1.0, seed=0)
+    provider = ResilientProvider(fake, breaker=_breaker(), limiter=_limiter())
+
+    for _ in range(4):
+        await _call(provider)
+    assert provider.breaker.state == STATE_OPEN
+
+    # Open: the provider is not called at all
+    calls = fake.calls
+    with pytest.raises(ProviderUnavailableError):
+        await provider.search_products(PREDICTION, limit=5)
+    assert fake.calls == calls
+    assert provider.skipped == 1
+
+    await asyncio.sleep(0.06)
+    assert provider.breaker.state == STATE_HALF_OPEN
+
+    fake.error_rate = 0.0
+    await _call(provider)
+    assert provider.breaker.state == STATE_HALF_OPEN
+    await _call(provider)
+    assert provider.breaker.state == STATE_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_the_breaker():
+    fake = FakeProvider(latency_s=0.0, error_rate=1.0, seed=0)
+    provider = ResilientProvider(fake, breaker=_breaker(), limiter=_limiter())
+    for _ in range(4):
+        await _call(provider)
+    await asyncio.sleep(0.06)
+    assert provider.breaker.state == STATE_HALF_OPEN
+
+    await _call(provider)
+    assert provider.breaker.state == STATE_OPEN
+
+
+def test_limit_grows_on_fast_successes_and_backs_off_on_failures():
+    limiter = _limiter(initial=4)
+    for _ in range(8):
+        assert limiter.try_acquire()
+        limiter.release(False, 0.01)
+    assert limiter.limit > 5
+
+    raised = limiter.limit
+    assert limiter.try_acquire()
+    limiter.release(True, 0.01)
+    assert limiter.limit == pytest.approx(raised * 0.5)
+
+    # Slow successes count as congestion too
+    assert limiter.try_acquire()
+    limiter.release(False, 2.0)
+    assert limiter.limit == pytest.approx(raised * 0.25)
+
+
+@pytest.mark.asyncio
+async def test_calls_over_the_limit_are_rejected():
+    fake = FakeProvider(latency_s=0.05, seed=0)
+    provider = ResilientProvider(fake, breaker=_breaker(), limiter=_limiter(initial=2))
+
+    results = await asyncio.gather(*(provider.search_products(PREDICTION, limit=5) for _ in range(3)),
+                                   return_exceptions=True)
+    rejected = [r for r in results if isinstance(r, ProviderUnavailableError)]
+    assert len(rejected) == 1
+    assert fake.calls == 2
+    assert provider.limiter.rejected == 1
+    assert provider.limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_skipped_provider_falls_back_to_cached_results():
+    fake = FakeProvider(latency_s=0.0, seed=0)
+    provider = ResilientProvider(fake, breaker=_breaker(), limiter=_limiter())
+    # Entries are expired immediately but kept as a fallback
+    cache = ProviderSearchCache(fresh_ttl=0.0, stale_ttl=0.0, fallback_ttl=60.0, use_redis=False)
+    aggregator = ProductAggregator(providers=[provider], cache=cache)
+
+    first = await aggregator.search(PREDICTION, limit=5, budget_s=1.0)
+    assert len(first.products) == 5
+
+    fake.error_rate = 1.0
+    for _ in range(4):
+        await _call(provider)
+    assert provider.breaker.state == STATE_OPEN
+
+    calls = fake.calls
+    second = await aggregator.search(PREDICTION, limit=5, budget_s=1.0)
+    assert fake.calls == calls
+    [outcome] = second.providers
+    assert outcome.status == STATUS_OK
+    assert outcome.cache == CACHE_FALLBACK
+    assert {p.id for p in second.products} == {p.id for p in first.products}
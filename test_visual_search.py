@@ -0,0 +1,45 @@
+"""Visual index snapshot / compaction tests"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.core.config import settings
+from app.infrastructure.ml.visual_search import VisualSearchEngine, INDEX_HNSW
+
+
+def _engine(path) -> VisualSearchEngine:
+    return VisualSearchEngine(index_path=str(path), index_type=INDEX_HNSW)
+
+
+def test_compact_after_mmap_load_keeps_only_live_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VISUAL_INDEX_MMAP", True)
+    rng = np.random.default_rng(0)
+    dim = settings.CLIP_EMBEDDING_DIM
+    product_ids = [f"p{i}" for i in range(100)]
+    embeddings = rng.standard_normal((len(product_ids), dim)).astype(np.float32)
+
+    engine = _engine(tmp_path)
+    engine.add_embeddings(product_ids, embeddings, ["shirt"] * len(product_ids))
+    engine.snapshot()
+
+    # Reload: the shard is memory-mapped from the snapshot
+    loaded = _engine(tmp_path)
+    assert loaded.size == len(product_ids)
+
+    removed = set(product_ids[:31])
+    for product_id in removed:
+        assert loaded.remove_product(product_id)
+    loaded._shards["shirt"].compact()
+
+    live = len(product_ids) - len(removed)
+    shard_stats = loaded.stats()["shards"]["shirt"]
+    assert shard_stats["vectors"] == live
+    assert shard_stats["tombstones"] == 0
+
+    hits = loaded.search(embeddings[50], limit=live, category="shirt")
+    hit_ids = [product_id for product_id, _ in hits]
+    assert len(hit_ids) == len(set(hit_ids))
+    assert not removed & set(hit_ids)
+    assert hit_ids[0] == "p50"
@@ -1,19 +1,180 @@
-from sqlalchemy.orm import Session
-from app.models.garment import Product
-from pgvector.sqlalchemy import Vector
-from typing import List
+import asyncio
+import hashlib
+import os
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import numpy as np
+from loguru import logger
+
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.database.models.product import Product
+from app.infrastructure.ml.embedding_store import EmbeddingStore
+from app.domain.services.category_routing import route_categories
+from app.core.singleflight import SingleFlight
+from app.core.config import settings
+
 
 class VectorSearchService:
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self, session_factory=AsyncSessionLocal, store: Optional[EmbeddingStore] = None):
+        """
+        Initialize the service
+
+        Args:
+            session_factory: Async session factory
+            store: In-memory embedding store to rank with instead of the pgvector
+                index (defaults to the one at VECTOR_SEARCH_STORE_PATH, if any)
+        """
+        self.session_factory = session_factory
+        if store is None and settings.VECTOR_SEARCH_STORE_PATH and os.path.exists(
+            os.path.join(settings.VECTOR_SEARCH_STORE_PATH, "meta.json")
+        ):
+            store = EmbeddingStore.load(settings.VECTOR_SEARCH_STORE_PATH, mmap=True)
+        self.store = store
+        # Identical concurrent queries share one database round trip
+        self.flight: SingleFlight[List[Product]] = SingleFlight("vector_search")
 
-    def find_similar_products(self, query_embedding: List[float], limit: int = 10):
+    async def find_similar_products(
+        self,
+        query_embedding: List[float],
+        limit: int = 10,
+        category: Optional[str] = None,
+        include_related: bool = False,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        exact: bool = False,
+    ) -> List[Product]:
         """
         Find products similar to the query embedding using cosine distance
+
+        Served by the HNSW/IVFFlat index on products.embedding, or ranked in
+        process on the compact embedding store when one is configured. When a
+        category is given only that category (and optionally its related
+        categories) is considered.
+
+        Args:
+            query_embedding: Normalized query embedding
+            limit: Max results
+            category: Category pre-filter
+            include_related: Also include related categories
+            ef_search: HNSW candidate list size (higher = better recall, slower)
+            probes: IVFFlat lists to probe
+            exact: Bypass the index and the store (exact scan, for recall measurements)
         """
+        key = (
+            hashlib.sha1(np.asarray(query_embedding, dtype=np.float32).tobytes()).hexdigest(),
+            limit, category, include_related, ef_search, probes, exact,
+        )
+        return await self.flight.do(
+            key,
+            lambda: self._find(query_embedding, limit, category, include_related, ef_search, probes, exact),
+        )
+
+    async def _find(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        category: Optional[str],
+        include_related: bool,
+        ef_search: Optional[int],
+        probes: Optional[int],
+        exact: bool,
+    ) -> List[Product]:
+        categories = route_categories(category, include_related)
+        if self.store is not None and not exact:
+            return await self._find_in_store(query_embedding, limit, categories)
+
+        stmt = select(Product).where(Product.embedding.isnot(None))
+        if categories:
+            stmt = stmt.where(Product.category.in_(categories))
         # <-> is Euclidean distance, <=> is cosine distance in pgvector
-        results = self.db.query(Product).order_by(
-            Product.embedding.cosine_distance(query_embedding)
-        ).limit(limit).all()
-        
-        return results
+        stmt = stmt.order_by(Product.embedding.cosine_distance(query_embedding)).limit(limit)
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                await self._apply_search_params(session, ef_search, probes, exact, bool(categories))
+                result = await session.execute(stmt)
+                return list(result.scalars().all())
+
+    async def _find_in_store(self, query_embedding: List[float], limit: int, categories: List[str]) -> List[Product]:
+        """Rank in process on the compact store, then load only the winning rows"""
+        hits = await asyncio.to_thread(
+            self.store.search, np.asarray(query_embedding, dtype=np.float32), limit, categories or None
+        )
+        if not hits:
+            return []
+        ids = [product_id for product_id, _ in hits]
+        async with self.session_factory() as session:
+            result = await session.execute(select(Product).where(Product.id.in_(ids)))
+            by_id = {str(product.id): product for product in result.scalars()}
+        return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    async def export_store(
+        self,
+        path: Optional[str] = None,
+        codec: Optional[str] = None,
+        batch_size: int = 10000,
+    ) -> EmbeddingStore:
+        """
+        Build a compact embedding store from products.embedding and save it
+
+        Args:
+            path: Output directory (defaults to VECTOR_SEARCH_STORE_PATH)
+            codec: Store codec (defaults to EMBEDDING_STORE_CODEC)
+            batch_size: Rows fetched per keyset page
+
+        Returns:
+            The built store
+        """
+        path = path or settings.VECTOR_SEARCH_STORE_PATH
+        if not path:
+            raise ValueError("No embedding store path given")
+        store = EmbeddingStore(codec=codec)
+
+        after = None
+        while True:
+            stmt = (
+                select(Product.id, Product.category, Product.embedding)
+                .where(Product.embedding.isnot(None))
+                .order_by(Product.id)
+                .limit(batch_size)
+            )
+            if after is not None:
+                stmt = stmt.where(Product.id > after)
+            async with self.session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+            if not rows:
+                break
+            embeddings = np.array([np.asarray(r.embedding, dtype=np.float32) for r in rows])
+            if not store.trained:
+                # The first page doubles as the PQ training sample
+                await asyncio.to_thread(store.train, embeddings)
+            store.add([str(r.id) for r in rows], embeddings, [r.category for r in rows])
+            after = rows[-1].id
+
+        await asyncio.to_thread(store.save, path)
+        logger.info(f"Exported embedding store: {store.memory_report()}")
+        return store
+
+    @staticmethod
+    async def _apply_search_params(
+        session: AsyncSession,
+        ef_search: Optional[int],
+        probes: Optional[int],
+        exact: bool,
+        filtered: bool,
+    ):
+        """Per-query index settings; SET LOCAL only lasts for this transaction"""
+        ef_search = settings.PGVECTOR_EF_SEARCH if ef_search is None else ef_search
+        probes = settings.PGVECTOR_PROBES if probes is None else probes
+        if exact:
+            await session.execute(text("SET LOCAL enable_indexscan = off"))
+            return
+        # SET does not take bind parameters; values are coerced to int
+        if ef_search:
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if probes:
+            await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+        if filtered and settings.PGVECTOR_ITERATIVE_SCAN in ("relaxed_order", "strict_order"):
+            # pgvector >= 0.8: keep scanning the index until enough rows pass the filter
+            await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {settings.PGVECTOR_ITERATIVE_SCAN}"))
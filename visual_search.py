@@ -3,63 +3,609 @@ Visual Search Engine
 Finds visually similar products using CLIP embeddings and FAISS
 """
 
+import asyncio
+import hashlib
+import os
+import threading
 from PIL import Image
-from typing import List
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 import numpy as np
+import faiss
 from loguru import logger
 
 from app.domain.entities.product import Product as ProductEntity
+from app.infrastructure.ml.embedding_store import EmbeddingStore, CODEC_FLOAT16
+from app.domain.services.category_routing import route_categories
+from app.core.singleflight import SingleFlight
 from app.core.config import settings
 
 
+INDEX_HNSW = "hnsw"
+INDEX_IVFPQ = "ivfpq"
+UNCATEGORIZED = "_uncategorized"
+VECTORS_DIR = "_vectors"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class AnnIndex:
+    """
+    One FAISS index over normalized embeddings (inner product = cosine)
+
+    HNSW cannot remove vectors, so deletes are tombstoned and filtered out of
+    results until the next compaction. IVF-PQ needs training; vectors are kept
+    in an exact flat index until enough have arrived to train on.
+    """
+
+    def __init__(self, dim: int, index_type: str, index: Optional[faiss.Index] = None):
+        if index_type not in (INDEX_HNSW, INDEX_IVFPQ):
+            raise ValueError(f"Unknown visual index type: {index_type}")
+        self.dim = dim
+        self.index_type = index_type
+        self.index = index if index is not None else self._create()
+        self.tombstones: set = set()
+        self._mmapped_from: Optional[str] = None
+        self._apply_search_params()
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal - len(self.tombstones)
+
+    @property
+    def trained(self) -> bool:
+        """False while an IVF-PQ index is still collecting training vectors"""
+        return self.index_type == INDEX_HNSW or isinstance(self.index, faiss.IndexIVF)
+
+    def add(self, labels: np.ndarray, vectors: np.ndarray):
+        self._ensure_writable()
+        self.index.add_with_ids(vectors, labels.astype(np.int64))
+        if not self.trained and self.index.ntotal >= settings.VISUAL_INDEX_TRAIN_SIZE:
+            self._train()
+
+    def remove(self, labels: Sequence[int]):
+        if not labels:
+            return
+        if self.index_type == INDEX_HNSW:
+            self.tombstones.update(labels)
+            if len(self.tombstones) > settings.VISUAL_INDEX_COMPACT_RATIO * max(1, self.index.ntotal):
+                self.compact()
+        else:
+            self._ensure_writable()
+            self.index.remove_ids(np.asarray(labels, dtype=np.int64))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, labels); missing results have label -1"""
+        if self.index.ntotal == 0:
+            empty = np.full((len(queries), k), -1, dtype=np.int64)
+            return np.zeros((len(queries), k), dtype=np.float32), empty
+        # Over-fetch to make up for tombstoned hits
+        fetch = min(self.index.ntotal, k + len(self.tombstones)) if self.tombstones else k
+        scores, labels = self.index.search(queries, fetch)
+        if self.tombstones:
+            dead = np.isin(labels, list(self.tombstones))
+            labels = np.where(dead, -1, labels)
+            scores = np.where(dead, -np.inf, scores)
+            order = np.argsort(-scores, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, order, axis=1)
+            labels = np.take_along_axis(labels, order, axis=1)
+        return scores, labels
+
+    def compact(self):
+        """Rebuild without tombstoned vectors"""
+        labels, vectors = self.export()
+        # The new index lives in RAM; add() must not re-read the old snapshot over it
+        self._mmapped_from = None
+        self.index = self._create()
+        self.tombstones = set()
+        self._apply_search_params()
+        if len(labels):
+            self.add(labels, vectors)
+        logger.info(f"Compacted {self.index_type} index to {len(labels)} vectors")
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All live (labels, vectors); IVF-PQ vectors are decoded approximations"""
+        base = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap) else self.index
+        if isinstance(base, faiss.IndexIVF):
+            base.set_direct_map_type(faiss.DirectMap.Hashtable)
+            labels = np.concatenate([
+                faiss.rev_swig_ptr(base.invlists.get_ids(i), base.invlists.list_size(i)).copy()
+                for i in range(base.nlist)
+            ]) if base.ntotal else np.empty(0, dtype=np.int64)
+            vectors = np.vstack([base.reconstruct(int(l)) for l in labels]) if len(labels) else np.empty((0, self.dim), np.float32)
+        else:
+            labels = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+            vectors = base.reconstruct_n(0, base.ntotal)
+        alive = ~np.isin(labels, list(self.tombstones))
+        return labels[alive], vectors[alive]
+
+    def _create(self) -> faiss.Index:
+        if self.index_type == INDEX_HNSW:
+            hnsw = faiss.IndexHNSWFlat(self.dim, settings.VISUAL_INDEX_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = settings.VISUAL_INDEX_EF_CONSTRUCTION
+            return faiss.IndexIDMap2(hnsw)
+        # Exact staging index until there is enough data to train IVF-PQ
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def _train(self):
+        labels, vectors = self.export()
+        quantizer = faiss.IndexFlatIP(self.dim)
+        ivfpq = faiss.IndexIVFPQ(
+            quantizer,
+            self.dim,
+            settings.VISUAL_INDEX_IVF_NLIST,
+            settings.VISUAL_INDEX_PQ_M,
+            8,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        ivfpq.train(vectors)
+        ivfpq.add_with_ids(vectors, labels)
+        self._mmapped_from = None
+        self.index = ivfpq
+        self.tombstones = set()
+        self._apply_search_params()
+        logger.info(f"Trained IVF-PQ index on {len(vectors)} vectors")
+
+    def _apply_search_params(self):
+        base = self.index.index if isinstance(self.index, faiss.IndexIDMap) else self.index
+        base = faiss.downcast_index(base)
+        if isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = settings.VISUAL_INDEX_EF_SEARCH
+        elif isinstance(base, faiss.IndexIVF):
+            base.nprobe = settings.VISUAL_INDEX_IVF_NPROBE
+
+    def _ensure_writable(self):
+        # Memory-mapped indexes are read-only; load into RAM on first write
+        if self._mmapped_from:
+            self.index = faiss.read_index(self._mmapped_from)
+            self._apply_search_params()
+            self._mmapped_from = None
+            logger.info("Materialized memory-mapped index for writing")
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        faiss.write_index(self.index, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int, index_type: str, mmap: bool = True) -> "AnnIndex":
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                logger.info(f"{path} cannot be memory-mapped, reading into RAM")
+        loaded = cls(dim, index_type, index=index if index is not None else faiss.read_index(path))
+        if index is not None:
+            loaded._mmapped_from = path
+        return loaded
+
+
 class VisualSearchEngine:
-    """Engine for finding visually similar products"""
-    
-    def __init__(self):
-        """Initialize the visual search engine"""
-        # For MVP, we'll use a placeholder
-        # In production, this would initialize CLIP model and FAISS index
-        logger.info("Initialized VisualSearchEngine (MVP placeholder)")
-        self._index_initialized = False
-    
+    """
+    Engine for finding visually similar products
+
+    The index is partitioned by category: one FAISS sub-index (shard) per
+    category, so filtered queries only touch the shards they need and each
+    shard can be snapshotted and rebuilt on its own.
+
+    With IVF-PQ shards a float16 copy of every vector is kept in an
+    EmbeddingStore: PQ hits are re-ranked on it, and shards are rebuilt from
+    it instead of from lossy PQ reconstructions.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Callable[[Image.Image], Awaitable[np.ndarray]]] = None,
+        product_lookup: Optional[Callable[[List[str]], Awaitable[Dict[str, ProductEntity]]]] = None,
+        index_path: Optional[str] = None,
+        index_type: Optional[str] = None,
+    ):
+        """
+        Initialize the visual search engine, loading the last snapshot if present
+
+        Args:
+            embedder: Async function returning the normalized embedding of an image
+            product_lookup: Async function resolving product ids to entities
+            index_path: Snapshot directory (defaults to MODEL_CACHE_DIR/visual_index)
+            index_type: "hnsw" or "ivfpq"
+        """
+        self.dim = settings.CLIP_EMBEDDING_DIM
+        self.index_type = index_type or settings.VISUAL_INDEX_TYPE
+        self.index_path = index_path or settings.VISUAL_INDEX_PATH or os.path.join(
+            settings.MODEL_CACHE_DIR, "visual_index"
+        )
+        self._embedder = embedder
+        self._product_lookup = product_lookup
+        self._lock = threading.RLock()
+
+        # Product ids are strings; FAISS wants int64 labels (unique across shards)
+        self._labels: Dict[str, int] = {}
+        self._product_ids: Dict[int, str] = {}
+        self._shard_of: Dict[int, str] = {}
+        self._next_label = 0
+        self._products: Dict[str, ProductEntity] = {}
+
+        self._shards: Dict[str, AnnIndex] = {}
+        self._dirty: set = set()
+        # Identical concurrent lookups share one search + product resolution
+        self._flight: SingleFlight[List[ProductEntity]] = SingleFlight("visual_search")
+        self._vectors: Optional[EmbeddingStore] = None
+        if self.index_type == INDEX_IVFPQ and settings.VISUAL_INDEX_REFINE_FACTOR > 0:
+            self._vectors = EmbeddingStore(self.dim, CODEC_FLOAT16)
+        self._vectors_dirty = False
+        self.load()
+        self._index_initialized = True
+        logger.info(
+            f"Initialized VisualSearchEngine ({self.index_type}, {self.size} products, {len(self._shards)} shards)"
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self._labels)
+
     async def find_similar(
-        self, 
-        query_image: Image.Image, 
+        self,
+        query_image: Image.Image,
         category: str,
-        limit: int = 20
+        limit: int = 20,
+        include_related: bool = False
     ) -> List[ProductEntity]:
         """
         Find similar products to the query image
-        
+
         Args:
             query_image: PIL Image to search for
             category: Product category to filter by
             limit: Maximum number of results
-            
+            include_related: Also search related categories (see RELATED_CATEGORIES)
+
         Returns:
             List of similar Product entities
         """
-        # MVP: Return empty list (will be populated by e-commerce search)
-        # In production, this would:
-        # 1. Generate embedding from query image using CLIP
-        # 2. Search FAISS index for similar embeddings
-        # 3. Return top-k products
-        
-        logger.info(f"Visual search for category: {category}, limit: {limit}")
-        return []
-    
-    async def index_product(self, product_id: str, image: Image.Image, embedding: np.ndarray = None):
+        if self._embedder is None:
+            raise RuntimeError("VisualSearchEngine has no embedder configured")
+
+        embedding = await self._embedder(query_image)
+        key = (
+            hashlib.sha1(np.ascontiguousarray(embedding, dtype=np.float32).tobytes()).hexdigest(),
+            category, limit, include_related,
+        )
+        return await self._flight.do(key, lambda: self._find(embedding, category, limit, include_related))
+
+    async def _find(
+        self,
+        embedding: np.ndarray,
+        category: str,
+        limit: int,
+        include_related: bool,
+    ) -> List[ProductEntity]:
+        hits = self.search(embedding, limit, category, include_related)
+        logger.info(f"Visual search for category: {category}, limit: {limit}, hits: {len(hits)}")
+        return await self._resolve([product_id for product_id, _ in hits])
+
+    def search(
+        self,
+        embedding: np.ndarray,
+        limit: int = 20,
+        category: Optional[str] = None,
+        include_related: bool = False
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k products by cosine similarity
+
+        Args:
+            embedding: Query embedding
+            limit: Maximum number of results
+            category: Only search this category's shard
+            include_related: Also search shards of related categories
+
+        Returns:
+            List of (product_id, score), best first
+        """
+        query = _normalize(embedding)
+        categories = route_categories(category, include_related)
+        with self._lock:
+            shards = [self._shards[c] for c in (categories or self._shards) if c in self._shards]
+            fetch = limit * settings.VISUAL_INDEX_REFINE_FACTOR if self._vectors is not None else limit
+            hits = []
+            for shard in shards:
+                scores, labels = shard.search(query, fetch)
+                for score, label in zip(scores[0], labels[0]):
+                    # Labels removed since the shard was built have no product any more
+                    product_id = self._product_ids.get(int(label)) if label >= 0 else None
+                    if product_id is not None:
+                        hits.append((product_id, float(score)))
+            if self._vectors is not None and hits:
+                hits = self._refine(query[0], hits)
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:limit]
+
+    def embeddings_for(self, product_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Indexed embeddings of the given products (unknown ids are skipped)"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for product_id in product_ids:
+                label = self._labels.get(product_id)
+                if label is None:
+                    continue
+                if self._vectors is not None and product_id in self._vectors:
+                    found[product_id] = self._vectors.get([product_id])[0]
+                    continue
+                try:
+                    found[product_id] = self._shards[self._shard_of[label]].index.reconstruct(int(label))
+                except RuntimeError:
+                    # Index type without reconstruction support
+                    pass
+        return found
+
+    async def index_product(
+        self,
+        product_id: str,
+        image: Optional[Image.Image] = None,
+        embedding: np.ndarray = None,
+        category: Optional[str] = None,
+        product: Optional[ProductEntity] = None,
+    ):
         """
         Index a product image for similarity search
-        
+
         Args:
             product_id: Product identifier
             image: Product image
             embedding: Optional pre-computed embedding
+            category: Product category (defaults to product.category)
+            product: Optional entity, kept so results resolve without a lookup
+        """
+        if embedding is None:
+            if image is None or self._embedder is None:
+                raise ValueError("index_product needs an embedding or an image and an embedder")
+            embedding = await self._embedder(image)
+
+        category = category or (product.category if product else None)
+        self.add_embeddings([product_id], np.atleast_2d(embedding), [category])
+        if product is not None:
+            self._products[product_id] = product
+        logger.debug(f"Indexed product {product_id}")
+
+    def add_embeddings(
+        self,
+        product_ids: Sequence[str],
+        embeddings: np.ndarray,
+        categories: Sequence[Optional[str]],
+    ):
+        """Bulk add or replace products"""
+        vectors = _normalize(embeddings)
+        shard_names = [category or UNCATEGORIZED for category in categories]
+        with self._lock:
+            # Re-indexing a product replaces its previous vector
+            self._remove_labels([self._labels[pid] for pid in product_ids if pid in self._labels])
+            labels = np.arange(self._next_label, self._next_label + len(product_ids), dtype=np.int64)
+            self._next_label += len(product_ids)
+            for label, product_id, shard_name in zip(labels.tolist(), product_ids, shard_names):
+                self._labels[product_id] = label
+                self._product_ids[label] = product_id
+                self._shard_of[label] = shard_name
+
+            names = np.asarray(shard_names)
+            for shard_name in set(shard_names):
+                rows = np.flatnonzero(names == shard_name)
+                self._shard(shard_name).add(labels[rows], vectors[rows])
+                self._dirty.add(shard_name)
+            if self._vectors is not None:
+                self._vectors.add(product_ids, vectors)
+                self._vectors_dirty = True
+
+    def remove_product(self, product_id: str) -> bool:
+        """Delete a product from the index"""
+        with self._lock:
+            label = self._labels.get(product_id)
+            if label is None:
+                return False
+            self._remove_labels([label])
+            self._products.pop(product_id, None)
+            return True
+
+    def rebuild_shard(
+        self,
+        category: str,
+        product_ids: Optional[Sequence[str]] = None,
+        embeddings: Optional[np.ndarray] = None,
+    ):
+        """
+        Rebuild one category shard without touching the others
+
+        Args:
+            category: Shard to rebuild
+            product_ids: New full contents of the shard; when omitted the
+                shard is rebuilt from its own live vectors (compaction)
+            embeddings: Embeddings matching product_ids
+
+        Queries keep using the old shard while the new one is built; writes
+        to this shard during the rebuild are not carried over.
         """
-        # MVP: No-op
-        # In production, this would:
-        # 1. Generate embedding if not provided
-        # 2. Add to FAISS index
-        logger.debug(f"Indexing product {product_id} (MVP placeholder)")
+        shard_name = category or UNCATEGORIZED
+        with self._lock:
+            current = self._shards.get(shard_name)
+            if product_ids is None:
+                if current is None:
+                    return
+                labels, vectors = current.export()
+                if self._vectors is not None and len(labels):
+                    # Rebuild from the float16 copies rather than PQ reconstructions
+                    ids = [self._product_ids[label] for label in labels.tolist()]
+                    if all(pid in self._vectors for pid in ids):
+                        vectors = self._vectors.get(ids)
+            else:
+                # Reserve labels for the new contents; the old ones stay mapped
+                # until the swap so queries on the old shard still resolve
+                vectors = _normalize(embeddings)
+                labels = np.arange(self._next_label, self._next_label + len(product_ids), dtype=np.int64)
+                self._next_label += len(product_ids)
+
+        # Building is the slow part; queries keep using the old shard meanwhile
+        rebuilt = AnnIndex(self.dim, self.index_type)
+        if len(labels):
+            rebuilt.add(labels, vectors)
+
+        with self._lock:
+            if product_ids is not None:
+                # Drop the old contents and map the new labels, together with the swap
+                old = [label for label, name in self._shard_of.items() if name == shard_name]
+                old_ids = [self._product_ids.pop(label) for label in old]
+                for label, product_id in zip(old, old_ids):
+                    self._labels.pop(product_id, None)
+                    del self._shard_of[label]
+                for label, product_id in zip(labels.tolist(), product_ids):
+                    # Products can only live in one shard
+                    if product_id in self._labels:
+                        self._remove_labels([self._labels[product_id]])
+                    self._labels[product_id] = label
+                    self._product_ids[label] = product_id
+                    self._shard_of[label] = shard_name
+                if self._vectors is not None:
+                    self._vectors.remove(old_ids)
+                    self._vectors.add(product_ids, vectors)
+                    self._vectors_dirty = True
+            self._shards[shard_name] = rebuilt
+            self._dirty.add(shard_name)
+        logger.info(f"Rebuilt visual index shard '{shard_name}' with {len(labels)} products")
+
+    def snapshot(self):
+        """Write changed shards and their id mappings to disk"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty and not self._vectors_dirty:
+                return
+            os.makedirs(self.index_path, exist_ok=True)
+            for shard_name in dirty:
+                prefix = os.path.join(self.index_path, shard_name)
+                shard = self._shards.get(shard_name)
+                if shard is None:
+                    continue
+                shard.save(f"{prefix}.faiss")
+                labels = np.array(
+                    [label for label, name in self._shard_of.items() if name == shard_name], dtype=np.int64
+                )
+                tmp = f"{prefix}.meta.tmp.npz"
+                np.savez(
+                    tmp,
+                    labels=labels,
+                    product_ids=np.array([self._product_ids[l] for l in labels.tolist()], dtype=str),
+                    tombstones=np.fromiter(shard.tombstones, dtype=np.int64),
+                    index_type=np.array(self.index_type),
+                )
+                os.replace(tmp, f"{prefix}.meta.npz")
+            if self._vectors is not None and self._vectors_dirty:
+                self._vectors.save(os.path.join(self.index_path, VECTORS_DIR))
+                self._vectors_dirty = False
+        logger.info(f"Snapshotted {len(dirty)} visual index shards ({self.size} products) to {self.index_path}")
+
+    def load(self):
+        """Load the last snapshot of every shard, memory-mapping where possible"""
+        if not os.path.isdir(self.index_path):
+            return
+
+        with self._lock:
+            for filename in sorted(os.listdir(self.index_path)):
+                if not filename.endswith(".meta.npz") or filename.endswith(".meta.tmp.npz"):
+                    continue
+                shard_name = filename[:-len(".meta.npz")]
+                prefix = os.path.join(self.index_path, shard_name)
+                if not os.path.exists(f"{prefix}.faiss"):
+                    continue
+
+                meta = np.load(f"{prefix}.meta.npz")
+                if str(meta["index_type"]) != self.index_type:
+                    logger.warning(
+                        f"Shard '{shard_name}' is {meta['index_type']} but {self.index_type} is configured - skipping"
+                    )
+                    continue
+
+                shard = AnnIndex.load(f"{prefix}.faiss", self.dim, self.index_type, mmap=settings.VISUAL_INDEX_MMAP)
+                shard.tombstones = set(meta["tombstones"].tolist())
+                self._shards[shard_name] = shard
+                for label, product_id in zip(meta["labels"].tolist(), meta["product_ids"].tolist()):
+                    self._labels[product_id] = label
+                    self._product_ids[label] = product_id
+                    self._shard_of[label] = shard_name
+            self._next_label = max(self._product_ids, default=-1) + 1
+            # Tombstoned labels are still in the shard; never hand them out again
+            for shard in self._shards.values():
+                self._next_label = max([self._next_label, *(label + 1 for label in shard.tombstones)])
+
+            vectors_path = os.path.join(self.index_path, VECTORS_DIR)
+            if self._vectors is not None and os.path.exists(os.path.join(vectors_path, "meta.json")):
+                self._vectors = EmbeddingStore.load(vectors_path, mmap=settings.VISUAL_INDEX_MMAP)
+        if self._shards:
+            logger.info(f"Loaded visual index snapshot with {self.size} products in {len(self._shards)} shards")
+
+    async def run_snapshots(self, interval_s: Optional[float] = None):
+        """Periodically snapshot to disk (run as a background task)"""
+        interval_s = settings.VISUAL_INDEX_SNAPSHOT_INTERVAL_S if interval_s is None else interval_s
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                logger.error(f"Visual index snapshot failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "index_type": self.index_type,
+            "products": self.size,
+            "dirty_shards": len(self._dirty),
+            "shards": {
+                name: {
+                    "products": shard.size,
+                    "vectors": shard.index.ntotal,
+                    "tombstones": len(shard.tombstones),
+                    "trained": shard.trained,
+                }
+                for name, shard in self._shards.items()
+            },
+            "refine_vectors": self._vectors.memory_report() if self._vectors is not None else None,
+            "singleflight": self._flight.stats(),
+        }
+
+    def _shard(self, shard_name: str) -> AnnIndex:
+        if shard_name not in self._shards:
+            self._shards[shard_name] = AnnIndex(self.dim, self.index_type)
+        return self._shards[shard_name]
+
+    def _refine(self, query: np.ndarray, hits: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """Re-score approximate hits on the float16 vectors"""
+        known = [product_id for product_id, _ in hits if product_id in self._vectors]
+        if not known:
+            return hits
+        exact = dict(zip(known, (self._vectors.get(known) @ query).tolist()))
+        return [(product_id, exact.get(product_id, score)) for product_id, score in hits]
+
+    def _remove_labels(self, labels: List[int]):
+        by_shard: Dict[str, List[int]] = {}
+        removed_ids = []
+        for label in labels:
+            product_id = self._product_ids.pop(label, None)
+            shard_name = self._shard_of.pop(label, None)
+            if product_id is not None:
+                self._labels.pop(product_id, None)
+                removed_ids.append(product_id)
+            if shard_name is not None:
+                by_shard.setdefault(shard_name, []).append(label)
+        for shard_name, shard_labels in by_shard.items():
+            self._shards[shard_name].remove(shard_labels)
+            self._dirty.add(shard_name)
+        if self._vectors is not None and removed_ids:
+            self._vectors.remove(removed_ids)
+            self._vectors_dirty = True
 
+    async def _resolve(self, product_ids: List[str]) -> List[ProductEntity]:
+        """Turn ids into entities, keeping rank order"""
+        found = {pid: self._products[pid] for pid in product_ids if pid in self._products}
+        missing = [pid for pid in product_ids if pid not in found]
+        if missing and self._product_lookup is not None:
+            found.update(await self._product_lookup(missing))
+        return [found[pid] for pid in product_ids if pid in found]
@@ -1,6 +1,7 @@
 """Zalando API integration"""
 
-from typing import List
+from typing import List, Optional
+import httpx
 from loguru import logger
 
 from app.domain.entities.product import Product as ProductEntity
@@ -13,8 +14,11 @@ import uuid
 class ZalandoProvider(ProductProvider):
     """Zalando API provider"""
     
-    def __init__(self):
+    name = "zalando"
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         """Initialize Zalando provider"""
+        super().__init__(http_client)
         self.api_key = settings.ZALANDO_API_KEY
         
         if not self.api_key:
@@ -22,7 +26,7 @@ class ZalandoProvider(ProductProvider):
             self._mock_mode = True
         else:
             self._mock_mode = False
-            # TODO: Initialize Zalando API client
+            # Zalando API requests go through the shared self.http_client
     
     async def search_products(
         self, 
@@ -71,6 +75,7 @@ class ZalandoProvider(ProductProvider):
                 product_url=f"https://zalando.com/mock-product-{i+1}",
                 category=prediction.category.value,
                 attributes={
+                    "external_id": f"mock-{prediction.category.value}-{i+1}",
                     "color": prediction.color,
                     "pattern": prediction.pattern,
                     "brand": f"Brand{i+1}"
@@ -0,0 +1,212 @@
+"""
+Zero-shot garment classifier
+Scores the image embedding we already compute against precomputed CLIP text
+embeddings for every category, color and pattern prompt. Classification is one
+matmul plus a softmax per head; no extra model pass per request.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import yaml
+from loguru import logger
+
+from app.domain.entities.garment import GarmentCategory
+from app.core.config import settings
+from app.core.reloadable import ReloadableFile
+
+
+HEADS = ("category", "color", "pattern")
+DEFAULT_PROMPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "garment_prompts.yaml")
+
+
+@dataclass
+class ZeroShotResult:
+    """Best label and probability for each head"""
+    category: GarmentCategory
+    confidence: float
+    color: str
+    color_confidence: float
+    pattern: str
+    pattern_confidence: float
+
+
+@dataclass
+class PromptMatrix:
+    """Stacked text embeddings of all heads"""
+    labels: Dict[str, List[str]]
+    weights: np.ndarray  # (total_labels, dim), rows are normalized
+    offsets: Dict[str, slice]
+
+
+def encode_texts_with_clip(texts: List[str]) -> np.ndarray:
+    """Encode prompts with the CLIP text tower (normalized)"""
+    import torch
+    from transformers import CLIPModel, CLIPTokenizer
+
+    model = CLIPModel.from_pretrained(settings.CLIP_MODEL_NAME).eval()
+    tokenizer = CLIPTokenizer.from_pretrained(settings.CLIP_MODEL_NAME)
+    with torch.no_grad():
+        tokens = tokenizer(texts, padding=True, return_tensors="pt")
+        features = model.get_text_features(**tokens)
+        features /= features.norm(p=2, dim=-1, keepdim=True)
+    return features.numpy().astype(np.float32)
+
+
+def _prompt_spec(path: str) -> Dict[str, Dict[str, List[str]]]:
+    """Read the prompt file into {head: {"labels": [...], "templates": [...]}}"""
+    with open(path) as f:
+        raw = yaml.safe_load(f) or {}
+
+    category = raw.get("category", {})
+    names = category.get("names", {})
+    spec = {
+        "category": {
+            "labels": [c.value for c in GarmentCategory],
+            "texts": [names.get(c.value, c.value.replace("_", " ")) for c in GarmentCategory],
+            "templates": category.get("templates", ["a photo of a {label}."]),
+        }
+    }
+    for head in ("color", "pattern"):
+        section = raw.get(head, {})
+        labels = list(section.get("labels", []))
+        spec[head] = {
+            "labels": labels,
+            "texts": labels,
+            "templates": section.get("templates", ["a photo of a {label} garment."]),
+        }
+    return spec
+
+
+class ZeroShotClassifier:
+    """CLIP zero-shot classifier over a precomputed prompt matrix"""
+
+    def __init__(
+        self,
+        prompts_path: Optional[str] = None,
+        text_encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        logit_scale: Optional[float] = None,
+    ):
+        """
+        Initialize and build (or load) the prompt matrix
+
+        Args:
+            prompts_path: YAML prompt file (defaults to the bundled one)
+            text_encoder: Function mapping prompts to normalized embeddings,
+                only called when the cached matrix is missing or stale
+            logit_scale: CLIP temperature applied before the softmax
+        """
+        self.prompts_path = prompts_path or settings.GARMENT_PROMPTS_PATH or DEFAULT_PROMPTS_PATH
+        self.logit_scale = settings.ZERO_SHOT_LOGIT_SCALE if logit_scale is None else logit_scale
+        self._encode_texts = text_encoder or encode_texts_with_clip
+        # Encoding new prompts needs the text tower, so rebuild off the request path
+        self._matrix = ReloadableFile(
+            self.prompts_path,
+            self._build_matrix,
+            check_interval=settings.PROMPTS_RELOAD_INTERVAL_S,
+            background=True,
+        )
+
+    def reload(self):
+        """Re-read the prompt file and rebuild the matrix now"""
+        self._matrix.reload()
+
+    @property
+    def labels(self) -> Dict[str, List[str]]:
+        return self._matrix.value.labels
+
+    def classify(self, embedding: np.ndarray) -> ZeroShotResult:
+        """Classify one normalized image embedding"""
+        return self.classify_batch(np.asarray(embedding)[None, :])[0]
+
+    def classify_batch(self, embeddings: np.ndarray) -> List[ZeroShotResult]:
+        """
+        Classify a batch of normalized image embeddings
+
+        Args:
+            embeddings: Array of shape (N, dim)
+
+        Returns:
+            One result per embedding
+        """
+        matrix = self._matrix.value
+        logits = self.logit_scale * (np.asarray(embeddings, dtype=np.float32) @ matrix.weights.T)
+
+        best = {}
+        for head in HEADS:
+            head_logits = logits[:, matrix.offsets[head]]
+            if head_logits.shape[1] == 0:
+                best[head] = (np.zeros(len(logits), dtype=int), np.zeros(len(logits)))
+                continue
+            head_logits = head_logits - head_logits.max(axis=1, keepdims=True)
+            probs = np.exp(head_logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            index = probs.argmax(axis=1)
+            best[head] = (index, probs[np.arange(len(probs)), index])
+
+        results = []
+        for row in range(len(logits)):
+            def pick(head):
+                labels = matrix.labels[head]
+                index, prob = best[head]
+                return (labels[index[row]] if labels else None), float(prob[row])
+
+            category, confidence = pick("category")
+            color, color_confidence = pick("color")
+            pattern, pattern_confidence = pick("pattern")
+            results.append(ZeroShotResult(
+                category=GarmentCategory(category),
+                confidence=confidence,
+                color=color,
+                color_confidence=color_confidence,
+                pattern=pattern,
+                pattern_confidence=pattern_confidence,
+            ))
+        return results
+
+    def _build_matrix(self, path: str) -> PromptMatrix:
+        """Load the prompt matrix from the cache file, computing it if needed"""
+        spec = _prompt_spec(path)
+        fingerprint = hashlib.sha1(
+            json.dumps({"model": settings.CLIP_MODEL_NAME, "spec": spec}, sort_keys=True).encode()
+        ).hexdigest()[:16]
+        cache_path = os.path.join(settings.MODEL_CACHE_DIR, f"text_embeddings_{fingerprint}.npz")
+
+        if os.path.exists(cache_path):
+            weights = np.load(cache_path)["weights"]
+            logger.info(f"Loaded zero-shot prompt matrix from {cache_path}")
+        else:
+            weights = self._encode_spec(spec)
+            os.makedirs(settings.MODEL_CACHE_DIR, exist_ok=True)
+            np.savez(cache_path, weights=weights)
+            logger.info(f"Computed zero-shot prompt matrix ({len(weights)} labels) -> {cache_path}")
+
+        offsets, start = {}, 0
+        for head in HEADS:
+            offsets[head] = slice(start, start + len(spec[head]["labels"]))
+            start += len(spec[head]["labels"])
+        return PromptMatrix(
+            labels={head: spec[head]["labels"] for head in HEADS},
+            weights=weights,
+            offsets=offsets,
+        )
+
+    def _encode_spec(self, spec: Dict) -> np.ndarray:
+        """Embed every label with every template and average per label"""
+        texts, owners = [], []
+        row = 0
+        for head in HEADS:
+            for text in spec[head]["texts"]:
+                for template in spec[head]["templates"]:
+                    texts.append(template.format(label=text))
+                    owners.append(row)
+                row += 1
+
+        embeddings = self._encode_texts(texts)
+        weights = np.zeros((row, embeddings.shape[1]), dtype=np.float32)
+        np.add.at(weights, np.asarray(owners), embeddings)
+        weights /= np.maximum(np.linalg.norm(weights, axis=1, keepdims=True), 1e-12)
+        return weights